@@ -0,0 +1,104 @@
+"""
+Micro-benchmark dello scambio di libri tra processi e della ricerca negli snapshot
+
+Uso:
+    python benchmark.py            # tutti i benchmark
+    python benchmark.py pack       # solo quello indicato
+"""
+import pickle
+import sys
+import timeit
+from main import Book, Library, load_shared_books, pack_books, share_books, unpack_books
+
+
+def best_of(func, number: int = 3, repeat: int = 5) -> float:
+    """Restituisce il tempo migliore (in secondi) di una singola esecuzione di func."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(label: str, seconds: float, baseline: float = None) -> None:
+    """Stampa un risultato, con il rapporto rispetto al riferimento se indicato."""
+    ratio = f"  ({baseline / seconds:.2f}x)" if baseline else ""
+    print(f"  {label:<45} {seconds * 1000:10.3f} ms{ratio}")
+
+
+def make_books(count: int) -> list:
+    """Crea una lista di libri con titoli, autori e disponibilità diversi."""
+    books = []
+    for i in range(count):
+        book = Book(f"Titolo del libro numero {i}", f"Autore {i % 5000}", f"978{i:010d}")
+        book.available = i % 3 != 0
+        books.append(book)
+    return books
+
+
+def bench_pack(count: int = 200_000) -> None:
+    """pack_books/unpack_books contro pickle.dumps/pickle.loads."""
+    books = make_books(count)
+    print(f"Codifica e decodifica di {count} libri")
+    
+    pickled = pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL)
+    packed = pack_books(books)
+    print(f"  {'dimensione pickle':<45} {len(pickled) / 1e6:10.3f} MB")
+    print(f"  {'dimensione pack_books':<45} {len(packed) / 1e6:10.3f} MB  ({len(pickled) / len(packed):.2f}x)")
+    
+    baseline = best_of(lambda: pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL))
+    report("pickle.dumps", baseline)
+    report("pack_books", best_of(lambda: pack_books(books)), baseline)
+    
+    baseline = best_of(lambda: pickle.loads(pickled))
+    report("pickle.loads", baseline)
+    report("unpack_books", best_of(lambda: unpack_books(packed)), baseline)
+
+
+def bench_shared(count: int = 200_000) -> None:
+    """Passaggio dei libri tramite memoria condivisa contro una copia serializzata con pickle."""
+    books = make_books(count)
+    print(f"Consegna di {count} libri a un altro processo (andata e ritorno nello stesso processo)")
+    
+    def pickle_round_trip():
+        return pickle.loads(pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    def shared_round_trip():
+        segment = share_books(books)
+        try:
+            return load_shared_books(segment.name)
+        finally:
+            segment.close()
+            segment.unlink()
+    
+    baseline = best_of(pickle_round_trip)
+    report("pickle.dumps + pickle.loads", baseline)
+    report("share_books + load_shared_books", best_of(shared_round_trip), baseline)
+
+
+def bench_snapshot(count: int = 200_000) -> None:
+    """Ricerca per ISBN: Library contro LibrarySnapshot (e una scansione lineare dei record)."""
+    library = Library("Benchmark")
+    for book in make_books(count):
+        library.add_book(book)
+    snapshot = library.snapshot()
+    isbn = library.books[-1].isbn
+    print(f"Ricerca per ISBN dell'ultimo di {count} libri")
+    
+    def scan():
+        return next(book for book in snapshot.books if book.isbn == isbn)
+    
+    baseline = best_of(scan, number=1)
+    report("scansione lineare dei record", baseline)
+    report("Library.get_book_by_isbn", best_of(lambda: library.get_book_by_isbn(isbn), number=10_000), baseline)
+    report("LibrarySnapshot.get_book_by_isbn", best_of(lambda: snapshot.get_book_by_isbn(isbn), number=10_000),
+           baseline)
+
+
+BENCHMARKS = {
+    "pack": bench_pack,
+    "shared": bench_shared,
+    "snapshot": bench_snapshot,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
@@ -1,7 +1,13 @@
 """
 Sistema di gestione biblioteca semplificato
 """
-from typing import List, Optional, Dict
+from typing import Callable, Deque, Iterable, List, Mapping, Optional, Dict, NamedTuple, Sequence, Set, Tuple
+from collections import abc, deque
+from multiprocessing import shared_memory
+import hashlib
+import struct
+import threading
+import time
 
 
 class Book:
@@ -60,6 +66,25 @@ class Library:
         """Inizializza una nuova biblioteca."""
         self.name = name
         self.books: List[Book] = []
+        self._books_by_isbn: Dict[str, Book] = {}  # Indice per la ricerca in tempo costante
+        self._content_hashes: Dict[str, bytes] = {}  # isbn -> hash di titolo e autore, per la sincronizzazione
+        self._lock = threading.Lock()  # Serializza le scritture rispetto alla creazione degli snapshot
+        self._version = 0  # Incrementato a ogni modifica della collezione o della disponibilità
+        self._snapshot: Optional["LibrarySnapshot"] = None
+        # Record immutabili dei libri, nello stesso ordine di books: ogni scrittura sostituisce
+        # solo il record modificato, così creare uno snapshot costa O(1)
+        self._records = _RecordVector()
+        # isbn -> posizione in books e in _records. Le posizioni esistenti cambiano solo con le rimozioni
+        # di sync, che sostituiscono il dizionario: gli snapshot possono quindi condividerlo
+        self._positions: Dict[str, int] = {}
+        # Prenotazioni: per ogni ISBN una coda FIFO di lettori e un numero progressivo
+        # per lettore, così la posizione in coda si calcola in tempo costante
+        self._holds: Dict[str, Deque[str]] = {}
+        self._hold_tickets: Dict[str, Dict[str, int]] = {}
+        self._holds_issued: Dict[str, int] = {}
+        self._holds_served: Dict[str, int] = {}
+        self._ready_holds: Dict[str, str] = {}  # isbn -> lettore che deve ritirare il libro
+        self._listeners: List[Callable[["Library", List[str]], None]] = []
     
     def add_book(self, book: Book) -> bool:
         """
@@ -74,11 +99,18 @@ class Library:
         Raises:
             ValueError: Se un libro con lo stesso ISBN è già presente
         """
-        # Verifica che il libro non sia già presente tramite ISBN
-        if any(existing_book.isbn == book.isbn for existing_book in self.books):
-            raise ValueError(f"Un libro con ISBN {book.isbn} è già presente nella biblioteca")
-        
-        self.books.append(book)
+        with self._lock:
+            # Verifica che il libro non sia già presente tramite ISBN
+            if book.isbn in self._books_by_isbn:
+                raise ValueError(f"Un libro con ISBN {book.isbn} è già presente nella biblioteca")
+            
+            self._positions[book.isbn] = len(self.books)
+            self.books.append(book)
+            self._books_by_isbn[book.isbn] = book
+            self._content_hashes[book.isbn] = _content_hash(book.title, book.author)
+            self._records = self._records.append(_book_record(book))
+            self._version += 1
+        self._notify([book.isbn])
         return True
     
     def search_by_title(self, title: str) -> List[Book]:
@@ -115,10 +147,7 @@ class Library:
         Returns:
             Optional[Book]: Il libro trovato o None se non esiste
         """
-        for book in self.books:
-            if book.isbn == isbn:
-                return book
-        return None
+        return self._books_by_isbn.get(isbn)
     
     def borrow_book(self, isbn: str) -> bool:
         """
@@ -138,12 +167,19 @@ class Library:
         if not book:
             raise ValueError(f"Nessun libro trovato con ISBN {isbn}")
         
-        return book.borrow()
+        with self._lock:
+            result = book.borrow()
+            self._update_record(book)
+        self._notify([isbn])
+        return result
     
     def return_book(self, isbn: str) -> bool:
         """
         Restituisce un libro tramite ISBN.
         
+        Se il libro ha prenotazioni in coda, viene riservato al primo lettore
+        e compare tra le prenotazioni pronte per il ritiro.
+        
         Args:
             isbn: L'ISBN del libro da restituire
             
@@ -152,13 +188,111 @@ class Library:
             
         Raises:
             ValueError: Se il libro non esiste
-            RuntimeError: Se il libro non è in prestito
+            RuntimeError: Se il libro non è in prestito o è riservato e in attesa di ritiro
+        """
+        book = self.get_book_by_isbn(isbn)
+        if not book:
+            raise ValueError(f"Nessun libro trovato con ISBN {isbn}")
+        
+        with self._lock:
+            # Un libro riservato non è mai uscito dalla biblioteca: si chiude solo con il ritiro
+            if isbn in self._ready_holds:
+                raise RuntimeError(f"Il libro '{book.title}' è riservato a {self._ready_holds[isbn]} e in attesa di ritiro")
+            
+            result = book.return_book()
+            
+            # Se qualcuno è in attesa, il libro viene subito riservato al primo della coda
+            queue = self._holds.get(isbn)
+            if queue:
+                patron = queue.popleft()
+                del self._hold_tickets[isbn][patron]
+                self._holds_served[isbn] += 1
+                book.borrow()
+                self._ready_holds[isbn] = patron
+            
+            self._update_record(book)
+        self._notify([isbn])
+        return result
+    
+    def place_hold(self, isbn: str, patron: str) -> int:
+        """
+        Prenota un libro in prestito, mettendo il lettore in coda.
+        
+        Args:
+            isbn: L'ISBN del libro da prenotare
+            patron: L'identificativo del lettore
+            
+        Returns:
+            int: La posizione del lettore nella coda (a partire da 1)
+            
+        Raises:
+            ValueError: Se il libro non esiste o il lettore è già in coda
+            RuntimeError: Se il libro è disponibile e può essere preso in prestito subito
         """
         book = self.get_book_by_isbn(isbn)
         if not book:
             raise ValueError(f"Nessun libro trovato con ISBN {isbn}")
         
-        return book.return_book()
+        with self._lock:
+            if book.available:
+                raise RuntimeError(f"Il libro '{book.title}' è disponibile, non serve prenotarlo")
+            
+            tickets = self._hold_tickets.setdefault(isbn, {})
+            if patron in tickets:
+                raise ValueError(f"Il lettore {patron} è già in coda per il libro con ISBN {isbn}")
+            
+            ticket = self._holds_issued.get(isbn, 0)
+            self._holds_issued[isbn] = ticket + 1
+            self._holds_served.setdefault(isbn, 0)
+            tickets[patron] = ticket
+            self._holds.setdefault(isbn, deque()).append(patron)
+            return ticket - self._holds_served[isbn] + 1
+    
+    def get_hold_position(self, isbn: str, patron: str) -> Optional[int]:
+        """
+        Ottiene la posizione di un lettore nella coda di prenotazione di un libro.
+        
+        Args:
+            isbn: L'ISBN del libro
+            patron: L'identificativo del lettore
+            
+        Returns:
+            Optional[int]: La posizione (a partire da 1) o None se il lettore non è in coda
+        """
+        ticket = self._hold_tickets.get(isbn, {}).get(patron)
+        if ticket is None:
+            return None
+        return ticket - self._holds_served[isbn] + 1
+    
+    def get_ready_holds(self) -> Dict[str, str]:
+        """
+        Ottiene le prenotazioni pronte per il ritiro.
+        
+        Returns:
+            Dict[str, str]: Dizionario ISBN -> lettore a cui il libro è riservato
+        """
+        return dict(self._ready_holds)
+    
+    def pick_up_hold(self, isbn: str, patron: str) -> bool:
+        """
+        Registra il ritiro di un libro riservato: il prestito passa al lettore.
+        
+        Args:
+            isbn: L'ISBN del libro riservato
+            patron: L'identificativo del lettore che ritira il libro
+            
+        Returns:
+            bool: True se il ritiro è avvenuto con successo
+            
+        Raises:
+            ValueError: Se il libro non è riservato a quel lettore
+        """
+        with self._lock:
+            if self._ready_holds.get(isbn) != patron:
+                raise ValueError(f"Il libro con ISBN {isbn} non è riservato al lettore {patron}")
+            
+            del self._ready_holds[isbn]
+        return True
     
     def get_available_books(self) -> List[Book]:
         """
@@ -190,6 +324,647 @@ class Library:
             "available_books": len(self.get_available_books()),
             "borrowed_books": len(self.get_borrowed_books())
         }
+    
+    def add_listener(self, callback: Callable[["Library", List[str]], None]) -> None:
+        """
+        Registra una funzione chiamata dopo ogni modifica della collezione o della disponibilità.
+        
+        La funzione riceve la biblioteca e gli ISBN modificati; un ISBN non più presente
+        nella biblioteca indica un libro rimosso. Viene chiamata fuori dal lock, quindi
+        deve rileggere lo stato attuale invece di dedurlo dall'ordine delle notifiche.
+        
+        Args:
+            callback: La funzione da chiamare
+        """
+        with self._lock:
+            self._listeners.append(callback)
+    
+    def snapshot(self) -> "LibrarySnapshot":
+        """
+        Ottiene una vista immutabile della biblioteca nello stato attuale.
+        
+        I record dei libri sono mantenuti aggiornati a ogni scrittura, quindi creare
+        uno snapshot costa O(1) indipendentemente dalla dimensione della biblioteca;
+        se la biblioteca non è cambiata dall'ultima richiesta viene restituita la stessa
+        istanza. Le modifiche fatte direttamente sui libri (senza passare da Library)
+        non vengono rilevate.
+        
+        Returns:
+            LibrarySnapshot: Vista in sola lettura, consultabile senza lock
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+        
+        with self._lock:
+            snapshot = LibrarySnapshot(self.name, self._version, self._records, self._positions)
+            self._snapshot = snapshot
+        return snapshot
+    
+    def sync(self, feed: Iterable[Tuple[str, str, str]]) -> Dict[str, float]:
+        """
+        Sincronizza il catalogo con un feed esterno applicando solo le differenze.
+        
+        Il feed viene letto una sola volta e confrontato per ISBN e hash del contenuto
+        (titolo e autore). Le modifiche vengono applicate tutte insieme alla fine, solo
+        se il feed è valido. La disponibilità e le prenotazioni dei libri esistenti non
+        vengono toccate; i libri assenti dal feed ma ancora in prestito vengono mantenuti.
+        
+        Args:
+            feed: Sequenza (anche un generatore) di tuple (titolo, autore, ISBN)
+            
+        Returns:
+            Dict[str, float]: Numero di libri inseriti, aggiornati, rimossi, invariati e
+                mantenuti perché in prestito, più la durata della sincronizzazione in secondi
+            
+        Raises:
+            ValueError: Se un record del feed non è valido o un ISBN compare più volte
+        """
+        start = time.perf_counter()
+        seen: Set[str] = set()
+        inserts: List[Tuple[str, str, str]] = []
+        updates: List[Tuple[str, str, str]] = []
+        unchanged = 0
+        
+        # Prima fase: confronto del feed con il catalogo attuale
+        for title, author, isbn in feed:
+            if not title or not author or not isbn:
+                raise ValueError("Titolo, autore e ISBN non possono essere vuoti")
+            if isbn in seen:
+                raise ValueError(f"ISBN {isbn} duplicato nel feed")
+            seen.add(isbn)
+            
+            current_hash = self._content_hashes.get(isbn)
+            if current_hash is None:
+                inserts.append((title, author, isbn))
+            elif current_hash != _content_hash(title, author):
+                updates.append((title, author, isbn))
+            else:
+                unchanged += 1
+        
+        # Seconda fase: applicazione delle modifiche
+        removed = 0
+        retained = 0
+        with self._lock:
+            for title, author, isbn in inserts:
+                book = self._books_by_isbn.get(isbn)
+                if book is None:
+                    book = Book(title, author, isbn)
+                    self._positions[isbn] = len(self.books)
+                    self.books.append(book)
+                    self._books_by_isbn[isbn] = book
+                    self._records = self._records.append(_book_record(book))
+                else:
+                    # Aggiunto nel frattempo: lo trattiamo come un aggiornamento
+                    book.title, book.author = title, author
+                    self._update_record(book)
+                self._content_hashes[isbn] = _content_hash(title, author)
+            
+            for title, author, isbn in updates:
+                book = self._books_by_isbn[isbn]
+                book.title, book.author = title, author
+                self._content_hashes[isbn] = _content_hash(title, author)
+                self._update_record(book)
+            
+            stale = [isbn for isbn in self._books_by_isbn if isbn not in seen]
+            to_remove = set()
+            for isbn in stale:
+                if self._books_by_isbn[isbn].available:
+                    to_remove.add(isbn)
+                else:
+                    retained += 1
+            
+            if to_remove:
+                # Le rimozioni spostano le posizioni: i record vengono ricostruiti in blocco
+                self.books = [book for book in self.books if book.isbn not in to_remove]
+                for isbn in to_remove:
+                    del self._books_by_isbn[isbn]
+                    del self._content_hashes[isbn]
+                self._positions = {book.isbn: position for position, book in enumerate(self.books)}
+                self._records = _RecordVector.from_list([_book_record(book) for book in self.books])
+                removed = len(to_remove)
+            
+            self._version += 1
+        
+        changed = [isbn for _, _, isbn in inserts]
+        changed.extend(isbn for _, _, isbn in updates)
+        changed.extend(to_remove)
+        if changed:
+            self._notify(changed)
+        
+        return {
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "removed": removed,
+            "unchanged": unchanged,
+            "retained": retained,
+            "duration": time.perf_counter() - start
+        }
+    
+    def to_bytes(self) -> bytes:
+        """
+        Codifica i libri della biblioteca in formato binario compatto (vedi pack_books).
+        
+        Returns:
+            bytes: Il buffer con i libri codificati
+        """
+        with self._lock:
+            return pack_books(self.books)
+    
+    @classmethod
+    def from_bytes(cls, name: str, buffer) -> "Library":
+        """
+        Ricostruisce una biblioteca da un buffer prodotto da to_bytes.
+        
+        Args:
+            name: Il nome della nuova biblioteca
+            buffer: Un oggetto bytes-like con i libri codificati
+            
+        Returns:
+            Library: La biblioteca con i libri decodificati
+            
+        Raises:
+            ValueError: Se il buffer non è valido o contiene ISBN duplicati
+        """
+        library = cls(name)
+        for book in unpack_books(buffer):
+            library.add_book(book)
+        return library
+    
+    def _update_record(self, book: Book) -> None:
+        """Sostituisce il record di un libro con il suo stato attuale; va chiamato con il lock."""
+        self._records = self._records.set(self._positions[book.isbn], _book_record(book))
+        self._version += 1
+    
+    def _notify(self, isbns: List[str]) -> None:
+        """Avvisa le funzioni registrate con add_listener degli ISBN modificati."""
+        for callback in list(self._listeners):
+            callback(self, isbns)
+
+
+def _content_hash(title: str, author: str) -> bytes:
+    """Calcola l'hash del contenuto di un libro, usato per confrontarlo con un feed."""
+    return hashlib.blake2b(f"{title}\x1f{author}".encode("utf-8"), digest_size=16).digest()
+
+
+class BookRecord(NamedTuple):
+    """Copia immutabile dello stato di un libro in un dato istante."""
+    
+    title: str
+    author: str
+    isbn: str
+    available: bool
+
+
+def _book_record(book: Book) -> BookRecord:
+    """Crea il record immutabile con lo stato attuale di un libro."""
+    return BookRecord(book.title, book.author, book.isbn, book.available)
+
+
+_VECTOR_BITS = 5
+_VECTOR_WIDTH = 1 << _VECTOR_BITS
+_VECTOR_MASK = _VECTOR_WIDTH - 1
+
+
+class _RecordVector(abc.Sequence):
+    """
+    Sequenza immutabile con condivisione strutturale, usata per i record degli snapshot.
+    
+    Gli elementi sono le foglie di un albero di tuple con 32 figli per nodo: set e append
+    restituiscono un nuovo vettore copiando solo il percorso dalla radice alla foglia
+    (O(log32 n)), mentre il resto dell'albero resta condiviso con le versioni precedenti.
+    """
+    
+    __slots__ = ("_size", "_shift", "_root")
+    
+    def __init__(self, size: int = 0, shift: int = _VECTOR_BITS, root: tuple = ()):
+        self._size = size
+        self._shift = shift  # Bit dell'indice consumati sopra le foglie
+        self._root = root
+    
+    @classmethod
+    def from_list(cls, values: List) -> "_RecordVector":
+        """Costruisce un vettore da una lista in O(n), raggruppando le foglie dal basso."""
+        nodes = [tuple(values[i:i + _VECTOR_WIDTH]) for i in range(0, len(values), _VECTOR_WIDTH)]
+        shift = _VECTOR_BITS
+        while len(nodes) > _VECTOR_WIDTH:
+            nodes = [tuple(nodes[i:i + _VECTOR_WIDTH]) for i in range(0, len(nodes), _VECTOR_WIDTH)]
+            shift += _VECTOR_BITS
+        return cls(len(values), shift, tuple(nodes))
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Indice fuori dall'intervallo")
+        
+        node = self._root
+        level = self._shift
+        while level > 0:
+            node = node[(index >> level) & _VECTOR_MASK]
+            level -= _VECTOR_BITS
+        return node[index & _VECTOR_MASK]
+    
+    def __iter__(self):
+        return self._iter_node(self._root, self._shift)
+    
+    def set(self, index: int, value) -> "_RecordVector":
+        """Restituisce un nuovo vettore con l'elemento in posizione index sostituito."""
+        if not 0 <= index < self._size:
+            raise IndexError("Indice fuori dall'intervallo")
+        return _RecordVector(self._size, self._shift, self._assoc(self._root, self._shift, index, value))
+    
+    def append(self, value) -> "_RecordVector":
+        """Restituisce un nuovo vettore con value aggiunto in fondo."""
+        root, shift = self._root, self._shift
+        if self._size == 1 << (shift + _VECTOR_BITS):
+            # Albero pieno: si aggiunge un livello sopra la radice attuale
+            root, shift = (root,), shift + _VECTOR_BITS
+        return _RecordVector(self._size + 1, shift, self._push(root, shift, self._size, value))
+    
+    @classmethod
+    def _iter_node(cls, node: tuple, level: int):
+        if level == 0:
+            yield from node
+        else:
+            for child in node:
+                yield from cls._iter_node(child, level - _VECTOR_BITS)
+    
+    @classmethod
+    def _assoc(cls, node: tuple, level: int, index: int, value) -> tuple:
+        slot = (index >> level) & _VECTOR_MASK
+        child = value if level == 0 else cls._assoc(node[slot], level - _VECTOR_BITS, index, value)
+        return node[:slot] + (child,) + node[slot + 1:]
+    
+    @classmethod
+    def _push(cls, node: tuple, level: int, index: int, value) -> tuple:
+        if level == 0:
+            return node + (value,)
+        slot = (index >> level) & _VECTOR_MASK
+        if slot < len(node):
+            return node[:slot] + (cls._push(node[slot], level - _VECTOR_BITS, index, value),)
+        return node + (cls._push((), level - _VECTOR_BITS, index, value),)
+
+
+class LibrarySnapshot:
+    """Vista immutabile di una biblioteca in un dato istante."""
+    
+    def __init__(self, name: str, version: int, books: Sequence[BookRecord],
+                 positions: Optional[Mapping[str, int]] = None):
+        """
+        Inizializza uno snapshot.
+        
+        Args:
+            name: Il nome della biblioteca
+            version: La versione della biblioteca al momento dello snapshot
+            books: I libri della biblioteca in quel momento
+            positions: ISBN -> posizione in books; può contenere anche libri aggiunti dopo
+                lo snapshot (in fondo, oltre la fine di books). Se assente viene costruito da books
+        """
+        self.name = name
+        self.version = version
+        self.books = books
+        self._positions = positions if positions is not None else {
+            book.isbn: position for position, book in enumerate(books)}
+    
+    def search_by_title(self, title: str) -> List[BookRecord]:
+        """Cerca libri per titolo (o parte di esso)."""
+        return [book for book in self.books if title.lower() in book.title.lower()]
+    
+    def search_by_author(self, author: str) -> List[BookRecord]:
+        """Cerca libri per autore (o parte del nome)."""
+        return [book for book in self.books if author.lower() in book.author.lower()]
+    
+    def get_book_by_isbn(self, isbn: str) -> Optional[BookRecord]:
+        """Ottiene un libro tramite ISBN in tempo costante, o None se non esiste."""
+        position = self._positions.get(isbn)
+        if position is None or position >= len(self.books):
+            return None  # Libro sconosciuto o aggiunto dopo lo snapshot
+        return self.books[position]
+    
+    def get_available_books(self) -> List[BookRecord]:
+        """Ottiene tutti i libri disponibili al momento dello snapshot."""
+        return [book for book in self.books if book.available]
+    
+    def get_borrowed_books(self) -> List[BookRecord]:
+        """Ottiene tutti i libri in prestito al momento dello snapshot."""
+        return [book for book in self.books if not book.available]
+    
+    def get_statistics(self) -> Dict[str, int]:
+        """Ottiene le statistiche della biblioteca al momento dello snapshot."""
+        available = len(self.get_available_books())
+        return {
+            "total_books": len(self.books),
+            "available_books": available,
+            "borrowed_books": len(self.books) - available
+        }
+
+
+class LibraryNetwork:
+    """Catalogo federato di più sedi, ognuna gestita da una Library."""
+    
+    def __init__(self):
+        """Inizializza una rete di biblioteche vuota."""
+        self.branches: Dict[str, Library] = {}
+        self._lock = threading.Lock()
+        # Catalogo unificato su cui fare le ricerche: ISBN -> libro di ogni sede che lo possiede,
+        # così titolo e autore aggiornati in una sede qualunque (ad esempio da sync) sono cercabili
+        self._catalog: Dict[str, Dict[str, Book]] = {}
+        # Indice globale delle disponibilità: ISBN -> sedi in cui il libro è disponibile
+        self._availability: Dict[str, Set[str]] = {}
+    
+    def add_branch(self, library: Library) -> bool:
+        """
+        Aggiunge una sede alla rete e ne indicizza i libri.
+        
+        La rete si registra come listener della sede, così l'indice resta aggiornato
+        anche per le operazioni fatte direttamente sulla Library (prestiti, restituzioni,
+        nuovi libri, sync).
+        
+        Args:
+            library: La biblioteca della sede; il suo nome identifica la sede
+            
+        Returns:
+            bool: True se la sede è stata aggiunta con successo
+            
+        Raises:
+            ValueError: Se una sede con lo stesso nome è già presente
+        """
+        with self._lock:
+            if library.name in self.branches:
+                raise ValueError(f"La sede {library.name} è già presente nella rete")
+            
+            self.branches[library.name] = library
+            for book in library.books:
+                self._index_book(library.name, book)
+            library.add_listener(self._on_branch_change)
+        return True
+    
+    def add_book(self, branch: str, book: Book) -> bool:
+        """
+        Aggiunge un libro a una sede della rete.
+        
+        Args:
+            branch: Il nome della sede
+            book: Il libro da aggiungere
+            
+        Returns:
+            bool: True se il libro è stato aggiunto con successo
+            
+        Raises:
+            ValueError: Se la sede non esiste o il libro è già presente nella sede
+        """
+        return self._get_branch(branch).add_book(book)
+    
+    def borrow_book(self, branch: str, isbn: str) -> bool:
+        """
+        Prende in prestito un libro da una sede, aggiornando l'indice globale.
+        
+        Args:
+            branch: Il nome della sede
+            isbn: L'ISBN del libro da prendere in prestito
+            
+        Returns:
+            bool: True se il prestito è avvenuto con successo
+            
+        Raises:
+            ValueError: Se la sede o il libro non esistono
+            RuntimeError: Se il libro è già in prestito
+        """
+        return self._get_branch(branch).borrow_book(isbn)
+    
+    def return_book(self, branch: str, isbn: str) -> bool:
+        """
+        Restituisce un libro a una sede, aggiornando l'indice globale.
+        
+        Args:
+            branch: Il nome della sede
+            isbn: L'ISBN del libro da restituire
+            
+        Returns:
+            bool: True se la restituzione è avvenuta con successo
+            
+        Raises:
+            ValueError: Se la sede o il libro non esistono
+            RuntimeError: Se il libro non è in prestito
+        """
+        return self._get_branch(branch).return_book(isbn)
+    
+    def where_available(self, isbn: str) -> Set[str]:
+        """
+        Ottiene le sedi in cui un libro è attualmente disponibile.
+        
+        Args:
+            isbn: L'ISBN del libro
+            
+        Returns:
+            Set[str]: I nomi delle sedi (vuoto se il libro non è disponibile da nessuna parte)
+        """
+        return set(self._availability.get(isbn, ()))
+    
+    def search_by_title(self, title: str) -> List[Book]:
+        """
+        Cerca libri per titolo in tutta la rete, una sola volta per ISBN.
+        
+        Args:
+            title: Il titolo (o parte di esso) da cercare
+            
+        Returns:
+            List[Book]: Per ogni ISBN trovato, il libro della prima sede in cui il titolo corrisponde
+        """
+        title = title.lower()
+        return self._search(lambda book: title in book.title.lower())
+    
+    def search_by_author(self, author: str) -> List[Book]:
+        """
+        Cerca libri per autore in tutta la rete, una sola volta per ISBN.
+        
+        Args:
+            author: L'autore (o parte del nome) da cercare
+            
+        Returns:
+            List[Book]: Per ogni ISBN trovato, il libro della prima sede in cui l'autore corrisponde
+        """
+        author = author.lower()
+        return self._search(lambda book: author in book.author.lower())
+    
+    def _search(self, matches: Callable[[Book], bool]) -> List[Book]:
+        """Restituisce, per ogni ISBN, il primo libro delle sedi che soddisfa la condizione."""
+        with self._lock:
+            catalog = [list(books.values()) for books in self._catalog.values()]
+        results = []
+        for books in catalog:
+            for book in books:
+                if matches(book):
+                    results.append(book)
+                    break
+        return results
+    
+    def _get_branch(self, branch: str) -> Library:
+        """Restituisce la biblioteca di una sede o solleva ValueError se non esiste."""
+        library = self.branches.get(branch)
+        if library is None:
+            raise ValueError(f"Nessuna sede trovata con nome {branch}")
+        return library
+    
+    def _index_book(self, branch: str, book: Book) -> None:
+        """Aggiorna il catalogo unificato e l'indice delle disponibilità per un libro di una sede."""
+        self._catalog.setdefault(book.isbn, {})[branch] = book
+        branches = self._availability.setdefault(book.isbn, set())
+        if book.available:
+            branches.add(branch)
+        else:
+            branches.discard(branch)
+    
+    def _unindex_book(self, branch: str, isbn: str) -> None:
+        """Toglie dagli indici un libro rimosso da una sede."""
+        branches = self._availability.get(isbn)
+        if branches is not None:
+            branches.discard(branch)
+        
+        books = self._catalog.get(isbn, {})
+        books.pop(branch, None)
+        if not books:
+            # Nessuna sede ha più il libro
+            self._catalog.pop(isbn, None)
+            self._availability.pop(isbn, None)
+    
+    def _on_branch_change(self, library: Library, isbns: List[str]) -> None:
+        """Listener registrato su ogni sede: riallinea gli indici allo stato attuale dei libri."""
+        with self._lock:
+            for isbn in isbns:
+                book = library.get_book_by_isbn(isbn)
+                if book is None:
+                    self._unindex_book(library.name, isbn)
+                else:
+                    self._index_book(library.name, book)
+
+
+# Formato binario per lo scambio di libri tra processi:
+# un'intestazione con il numero di libri, poi per ogni libro le lunghezze
+# di titolo, autore e ISBN (in byte UTF-8), la disponibilità e i tre testi.
+_PACK_HEADER = struct.Struct("<I")
+_PACK_RECORD = struct.Struct("<HHH?")
+_PACK_MAX_FIELD = 0xFFFF
+
+
+def pack_books(books: Iterable[Book]) -> bytes:
+    """
+    Codifica una sequenza di libri in un buffer binario compatto, senza usare pickle.
+    
+    Args:
+        books: I libri da codificare
+        
+    Returns:
+        bytes: Il buffer con i libri codificati
+        
+    Raises:
+        ValueError: Se un campo supera la lunghezza massima codificabile
+    """
+    chunks = [b""]  # Segnaposto per l'intestazione
+    count = 0
+    for book in books:
+        title = book.title.encode("utf-8")
+        author = book.author.encode("utf-8")
+        isbn = book.isbn.encode("utf-8")
+        if max(len(title), len(author), len(isbn)) > _PACK_MAX_FIELD:
+            raise ValueError(f"Campo troppo lungo per il libro con ISBN {book.isbn}")
+        
+        chunks.append(_PACK_RECORD.pack(len(title), len(author), len(isbn), book.available))
+        chunks.append(title)
+        chunks.append(author)
+        chunks.append(isbn)
+        count += 1
+    
+    chunks[0] = _PACK_HEADER.pack(count)
+    return b"".join(chunks)
+
+
+def unpack_books(buffer) -> List[Book]:
+    """
+    Decodifica i libri da un buffer prodotto da pack_books.
+    
+    Il buffer viene letto tramite memoryview, quindi può essere anche la memoria
+    di un segmento condiviso (ad esempio SharedMemory.buf) senza copiarlo.
+    
+    Args:
+        buffer: Un oggetto bytes-like con i libri codificati
+        
+    Returns:
+        List[Book]: I libri decodificati, con la loro disponibilità
+        
+    Raises:
+        ValueError: Se il buffer è troncato o non valido
+    """
+    view = memoryview(buffer)
+    try:
+        (count,) = _PACK_HEADER.unpack_from(view, 0)
+        offset = _PACK_HEADER.size
+        books = []
+        for _ in range(count):
+            title_len, author_len, isbn_len, available = _PACK_RECORD.unpack_from(view, offset)
+            offset += _PACK_RECORD.size
+            end = offset + title_len + author_len + isbn_len
+            if end > len(view):
+                raise ValueError("Buffer dei libri troncato")
+            
+            title = str(view[offset:offset + title_len], "utf-8")
+            offset += title_len
+            author = str(view[offset:offset + author_len], "utf-8")
+            offset += author_len
+            isbn = str(view[offset:end], "utf-8")
+            offset = end
+            
+            book = Book(title, author, isbn)
+            book.available = available
+            books.append(book)
+    except struct.error as e:
+        raise ValueError(f"Buffer dei libri non valido: {e}") from e
+    finally:
+        view.release()
+    
+    return books
+
+
+def share_books(books: Iterable[Book]) -> shared_memory.SharedMemory:
+    """
+    Copia i libri codificati in un nuovo segmento di memoria condivisa.
+    
+    Il chiamante è responsabile di chiudere (close) e rimuovere (unlink) il segmento
+    quando i processi worker non ne hanno più bisogno.
+    
+    Args:
+        books: I libri da condividere
+        
+    Returns:
+        SharedMemory: Il segmento creato; il suo nome va passato ai worker
+    """
+    data = pack_books(books)
+    segment = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    segment.buf[:len(data)] = data
+    return segment
+
+
+def load_shared_books(name: str) -> List[Book]:
+    """
+    Legge i libri da un segmento di memoria condivisa creato con share_books.
+    
+    Args:
+        name: Il nome del segmento condiviso
+        
+    Returns:
+        List[Book]: I libri decodificati direttamente dalla memoria condivisa
+    """
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        return unpack_books(segment.buf)
+    finally:
+        segment.close()
 
 
 # Esempio di utilizzo
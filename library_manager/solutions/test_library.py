@@ -3,7 +3,7 @@ Test unitari per la classe Library
 """
 import unittest
 from unittest.mock import patch, MagicMock
-from main import Library, Book
+from main import Library, Book, BookRecord, share_books, load_shared_books
 
 
 class TestLibrary(unittest.TestCase):
@@ -231,6 +231,269 @@ class TestLibrary(unittest.TestCase):
         self.assertEqual(stats["total_books"], 3)
         self.assertEqual(stats["available_books"], 2)
         self.assertEqual(stats["borrowed_books"], 1)
+    
+    def test_snapshot_is_point_in_time(self):
+        """Verifica che lo snapshot non veda le modifiche successive alla sua creazione."""
+        # Aggiungiamo alcuni libri e creiamo uno snapshot
+        self.library.add_book(self.book1)
+        self.library.add_book(self.book2)
+        snapshot = self.library.snapshot()
+        
+        # Modifichiamo la biblioteca dopo lo snapshot
+        self.library.borrow_book("9788845292866")
+        self.library.add_book(self.book3)
+        
+        # Lo snapshot riflette ancora lo stato precedente
+        self.assertEqual(len(snapshot.books), 2)
+        self.assertTrue(snapshot.get_book_by_isbn("9788845292866").available)
+        self.assertEqual(snapshot.get_statistics()["borrowed_books"], 0)
+        
+        # Un nuovo snapshot vede invece lo stato aggiornato
+        stats = self.library.snapshot().get_statistics()
+        self.assertEqual(stats["total_books"], 3)
+        self.assertEqual(stats["borrowed_books"], 1)
+    
+    def test_snapshot_reused_until_change(self):
+        """Verifica che lo snapshot venga riutilizzato finché la biblioteca non cambia."""
+        self.library.add_book(self.book1)
+        
+        # Senza modifiche otteniamo la stessa istanza
+        first = self.library.snapshot()
+        self.assertIs(self.library.snapshot(), first)
+        
+        # Dopo un prestito viene creato un nuovo snapshot
+        self.library.borrow_book("9788845292866")
+        second = self.library.snapshot()
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second.search_by_author("eco")), 1)
+        self.assertEqual(second.get_borrowed_books()[0].isbn, "9788845292866")
+        
+        # I record dello snapshot sono immutabili
+        with self.assertRaises(AttributeError):
+            second.books[0].available = True
+    
+    def test_to_bytes_roundtrip(self):
+        """Verifica che la codifica binaria preservi libri e disponibilità."""
+        # Aggiungiamo alcuni libri e ne prestiamo uno
+        self.library.add_book(self.book1)
+        self.library.add_book(self.book2)
+        self.library.borrow_book("9788804668237")  # book2
+        
+        # Codifichiamo e ricostruiamo la biblioteca
+        data = self.library.to_bytes()
+        restored = Library.from_bytes("Copia", data)
+        
+        # Verifichiamo che i libri siano gli stessi, nello stesso stato
+        self.assertEqual(restored.name, "Copia")
+        self.assertEqual(len(restored.books), 2)
+        self.assertEqual(restored.get_book_by_isbn("9788845292866").title, "Il nome della rosa")
+        self.assertTrue(restored.get_book_by_isbn("9788845292866").available)
+        self.assertFalse(restored.get_book_by_isbn("9788804668237").available)
+    
+    def test_from_bytes_invalid_buffer(self):
+        """Verifica che un buffer troncato sollevi un'eccezione."""
+        self.library.add_book(self.book1)
+        data = self.library.to_bytes()
+        
+        with self.assertRaises(ValueError):
+            Library.from_bytes("Copia", data[:-5])
+    
+    def test_shared_books(self):
+        """Verifica che i libri possano essere letti da un segmento di memoria condivisa."""
+        # Creiamo il segmento condiviso
+        segment = share_books([self.book1, self.book3])
+        try:
+            # Un worker leggerebbe i libri tramite il nome del segmento
+            books = load_shared_books(segment.name)
+        finally:
+            segment.close()
+            segment.unlink()
+        
+        self.assertEqual([book.isbn for book in books], ["9788845292866", "9788830101531"])
+        self.assertEqual(books[1].author, "J.R.R. Tolkien")
+    
+    def test_snapshot_large_library_incremental(self):
+        """Verifica che gli snapshot restino coerenti su una biblioteca grande dopo scritture e sync."""
+        for i in range(1500):
+            self.library.add_book(Book(f"Titolo {i}", "Autore", f"isbn-{i}"))
+        before = self.library.snapshot()
+        
+        # Prestiti sparsi: ogni snapshot successivo vede solo le proprie modifiche
+        for i in range(0, 1500, 7):
+            self.library.borrow_book(f"isbn-{i}")
+        after = self.library.snapshot()
+        self.assertEqual(before.get_statistics()["borrowed_books"], 0)
+        self.assertEqual(after.get_statistics()["borrowed_books"], len(range(0, 1500, 7)))
+        self.assertEqual([book.isbn for book in after.books], [book.isbn for book in self.library.books])
+        self.assertFalse(after.books[7].available)
+        self.assertTrue(after.books[-1].available)
+        
+        # Una sync che rimuove libri disponibili ricostruisce i record nel nuovo ordine
+        self.library.sync((f"Titolo {i}", "Autore", f"isbn-{i}") for i in range(0, 1500, 2))
+        synced = self.library.snapshot()
+        self.assertEqual(
+            list(synced.books),
+            [BookRecord(book.title, book.author, book.isbn, book.available) for book in self.library.books]
+        )
+        self.assertEqual(len(after.books), 1500)
+        
+        # Le scritture successive alla sync aggiornano il record giusto
+        self.library.return_book("isbn-14")
+        self.assertTrue(self.library.snapshot().get_book_by_isbn("isbn-14").available)
+        self.assertFalse(synced.get_book_by_isbn("isbn-14").available)
+    
+    def test_snapshot_lookup_by_isbn_across_changes(self):
+        """Verifica che la ricerca per ISBN di uno snapshot resti corretta dopo aggiunte e rimozioni."""
+        for i in range(10):
+            self.library.add_book(Book(f"Titolo {i}", "Autore", f"isbn-{i}"))
+        before = self.library.snapshot()
+        
+        # Un libro aggiunto dopo lo snapshot non è visibile nello snapshot
+        self.library.add_book(Book("Nuovo", "Autore", "isbn-new"))
+        self.assertIsNone(before.get_book_by_isbn("isbn-new"))
+        self.assertEqual(self.library.snapshot().get_book_by_isbn("isbn-new").title, "Nuovo")
+        
+        # Una sync che rimuove libri sposta le posizioni solo negli snapshot successivi
+        self.library.sync([("Titolo 9", "Autore", "isbn-9"), ("Nuovo", "Autore", "isbn-new")])
+        after = self.library.snapshot()
+        self.assertEqual(after.get_book_by_isbn("isbn-9").isbn, "isbn-9")
+        self.assertIsNone(after.get_book_by_isbn("isbn-0"))
+        for i in range(10):
+            self.assertEqual(before.get_book_by_isbn(f"isbn-{i}").title, f"Titolo {i}")
+        self.assertIsNone(before.get_book_by_isbn("isbn-missing"))
+    
+    def test_place_hold_queue_positions(self):
+        """Verifica che le prenotazioni formino una coda FIFO con posizioni corrette."""
+        # Prendiamo in prestito un libro
+        self.library.add_book(self.book1)
+        self.library.borrow_book("9788845292866")
+        
+        # Due lettori lo prenotano
+        self.assertEqual(self.library.place_hold("9788845292866", "anna"), 1)
+        self.assertEqual(self.library.place_hold("9788845292866", "luca"), 2)
+        
+        self.assertEqual(self.library.get_hold_position("9788845292866", "luca"), 2)
+        self.assertIsNone(self.library.get_hold_position("9788845292866", "marco"))
+        
+        # Lo stesso lettore non può prenotare due volte
+        with self.assertRaises(ValueError):
+            self.library.place_hold("9788845292866", "anna")
+    
+    def test_place_hold_available_book(self):
+        """Verifica che non si possa prenotare un libro disponibile o inesistente."""
+        self.library.add_book(self.book1)
+        
+        with self.assertRaises(RuntimeError):
+            self.library.place_hold("9788845292866", "anna")
+        
+        with self.assertRaises(ValueError):
+            self.library.place_hold("ISBN-inesistente", "anna")
+    
+    def test_return_book_assigns_next_hold(self):
+        """Verifica che la restituzione riservi il libro al primo lettore in coda."""
+        self.library.add_book(self.book1)
+        self.library.borrow_book("9788845292866")
+        self.library.place_hold("9788845292866", "anna")
+        self.library.place_hold("9788845292866", "luca")
+        
+        # Alla restituzione il libro viene riservato ad anna e resta non disponibile
+        self.library.return_book("9788845292866")
+        self.assertFalse(self.book1.available)
+        self.assertEqual(self.library.get_ready_holds(), {"9788845292866": "anna"})
+        self.assertIsNone(self.library.get_hold_position("9788845292866", "anna"))
+        self.assertEqual(self.library.get_hold_position("9788845292866", "luca"), 1)
+        
+        # Solo anna può ritirare il libro
+        with self.assertRaises(ValueError):
+            self.library.pick_up_hold("9788845292866", "luca")
+        self.assertTrue(self.library.pick_up_hold("9788845292866", "anna"))
+        self.assertEqual(self.library.get_ready_holds(), {})
+        
+        # Alla restituzione successiva tocca a luca
+        self.library.return_book("9788845292866")
+        self.assertEqual(self.library.get_ready_holds(), {"9788845292866": "luca"})
+        
+        # Senza altre prenotazioni il libro torna disponibile
+        self.library.pick_up_hold("9788845292866", "luca")
+        self.library.return_book("9788845292866")
+        self.assertTrue(self.book1.available)
+    
+    def test_return_book_rejected_while_hold_ready(self):
+        """Verifica che un libro riservato e non ancora ritirato non possa essere restituito."""
+        self.library.add_book(self.book1)
+        self.library.borrow_book("9788845292866")
+        self.library.place_hold("9788845292866", "anna")
+        self.library.place_hold("9788845292866", "luca")
+        self.library.return_book("9788845292866")
+        
+        # Una seconda restituzione non deve saltare il ritiro di anna
+        with self.assertRaises(RuntimeError):
+            self.library.return_book("9788845292866")
+        self.assertEqual(self.library.get_ready_holds(), {"9788845292866": "anna"})
+        self.assertEqual(self.library.get_hold_position("9788845292866", "luca"), 1)
+        self.assertFalse(self.book1.available)
+        
+        # Dopo il ritiro la restituzione torna possibile
+        self.library.pick_up_hold("9788845292866", "anna")
+        self.assertTrue(self.library.return_book("9788845292866"))
+        self.assertEqual(self.library.get_ready_holds(), {"9788845292866": "luca"})
+    
+    def test_sync_applies_only_changes(self):
+        """Verifica che la sincronizzazione applichi inserimenti, aggiornamenti e rimozioni."""
+        self.library.add_book(self.book1)
+        self.library.add_book(self.book2)
+        self.library.add_book(self.book3)
+        
+        # book1 invariato, book2 aggiornato, book3 rimosso, un libro nuovo inserito
+        feed = iter([
+            ("Il nome della rosa", "Umberto Eco", "9788845292866"),
+            ("1984 (nuova edizione)", "George Orwell", "9788804668237"),
+            ("Harry Potter", "J.K. Rowling", "9788867158188"),
+        ])
+        report = self.library.sync(feed)
+        
+        self.assertEqual(report["inserted"], 1)
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(report["removed"], 1)
+        self.assertEqual(report["unchanged"], 1)
+        self.assertGreaterEqual(report["duration"], 0)
+        
+        # Il libro aggiornato è lo stesso oggetto, con il nuovo titolo
+        self.assertIs(self.library.get_book_by_isbn("9788804668237"), self.book2)
+        self.assertEqual(self.book2.title, "1984 (nuova edizione)")
+        self.assertIsNone(self.library.get_book_by_isbn("9788830101531"))
+        self.assertEqual(len(self.library.books), 3)
+    
+    def test_sync_keeps_borrow_state(self):
+        """Verifica che la sincronizzazione non alteri i prestiti in corso."""
+        self.library.add_book(self.book1)
+        self.library.add_book(self.book2)
+        self.library.borrow_book("9788845292866")  # book1
+        self.library.borrow_book("9788804668237")  # book2
+        
+        # book1 viene aggiornato, book2 non compare più nel feed
+        report = self.library.sync([("Il nome della rosa", "U. Eco", "9788845292866")])
+        
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(report["removed"], 0)
+        self.assertEqual(report["retained"], 1)
+        self.assertFalse(self.book1.available)
+        self.assertIs(self.library.get_book_by_isbn("9788804668237"), self.book2)
+    
+    def test_sync_invalid_feed(self):
+        """Verifica che un feed non valido non modifichi il catalogo."""
+        self.library.add_book(self.book1)
+        
+        feed = [
+            ("Harry Potter", "J.K. Rowling", "9788867158188"),
+            ("Harry Potter", "J.K. Rowling", "9788867158188"),  # ISBN duplicato
+        ]
+        with self.assertRaises(ValueError):
+            self.library.sync(feed)
+        
+        # Nessuna modifica è stata applicata
+        self.assertEqual(len(self.library.books), 1)
+        self.assertIsNone(self.library.get_book_by_isbn("9788867158188"))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,124 @@
+"""
+Test unitari per la classe LibraryNetwork
+"""
+import unittest
+from main import LibraryNetwork, Library, Book
+
+
+class TestLibraryNetwork(unittest.TestCase):
+    """Test per la classe LibraryNetwork."""
+    
+    def setUp(self):
+        """Inizializza una rete con due sedi che condividono alcuni titoli."""
+        self.centro = Library("Centro")
+        self.nord = Library("Nord")
+        
+        # Lo stesso titolo è presente in entrambe le sedi
+        self.centro.add_book(Book("Il nome della rosa", "Umberto Eco", "9788845292866"))
+        self.centro.add_book(Book("1984", "George Orwell", "9788804668237"))
+        self.nord.add_book(Book("Il nome della rosa", "Umberto Eco", "9788845292866"))
+        
+        self.network = LibraryNetwork()
+        self.network.add_branch(self.centro)
+        self.network.add_branch(self.nord)
+    
+    def test_add_branch_duplicate(self):
+        """Verifica che aggiungere due sedi con lo stesso nome sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            self.network.add_branch(Library("Centro"))
+    
+    def test_where_available(self):
+        """Verifica che l'indice globale segua prestiti e restituzioni."""
+        self.assertEqual(self.network.where_available("9788845292866"), {"Centro", "Nord"})
+        
+        # Dopo un prestito la sede non compare più
+        self.network.borrow_book("Centro", "9788845292866")
+        self.assertEqual(self.network.where_available("9788845292866"), {"Nord"})
+        
+        # Dopo la restituzione la sede torna disponibile
+        self.network.return_book("Centro", "9788845292866")
+        self.assertEqual(self.network.where_available("9788845292866"), {"Centro", "Nord"})
+        
+        # Un ISBN sconosciuto non è disponibile da nessuna parte
+        self.assertEqual(self.network.where_available("ISBN-inesistente"), set())
+    
+    def test_return_book_with_hold(self):
+        """Verifica che un libro riservato a una prenotazione non risulti disponibile."""
+        self.network.borrow_book("Nord", "9788845292866")
+        self.nord.place_hold("9788845292866", "anna")
+        
+        # Il libro restituito viene riservato ad anna, quindi resta non disponibile
+        self.network.return_book("Nord", "9788845292866")
+        self.assertEqual(self.network.where_available("9788845292866"), {"Centro"})
+    
+    def test_add_book(self):
+        """Verifica che un libro aggiunto tramite la rete venga indicizzato."""
+        self.network.add_book("Nord", Book("1984", "George Orwell", "9788804668237"))
+        self.assertEqual(self.network.where_available("9788804668237"), {"Centro", "Nord"})
+        
+        # Sede inesistente
+        with self.assertRaises(ValueError):
+            self.network.add_book("Sud", Book("1984", "George Orwell", "9788804668237"))
+    
+    def test_search_deduplicates_isbn(self):
+        """Verifica che la ricerca restituisca un solo risultato per ISBN."""
+        results = self.network.search_by_title("rosa")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].isbn, "9788845292866")
+        
+        results = self.network.search_by_author("orwell")
+        self.assertEqual(len(results), 1)
+    
+    def test_borrow_unknown_branch(self):
+        """Verifica che operare su una sede inesistente sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            self.network.borrow_book("Sud", "9788845292866")
+    
+    def test_index_follows_direct_branch_operations(self):
+        """Verifica che l'indice segua anche le operazioni fatte direttamente sulla sede."""
+        # Prestito e restituzione senza passare dalla rete
+        self.centro.borrow_book("9788845292866")
+        self.assertEqual(self.network.where_available("9788845292866"), {"Nord"})
+        self.centro.return_book("9788845292866")
+        self.assertEqual(self.network.where_available("9788845292866"), {"Centro", "Nord"})
+        
+        # Un libro aggiunto alla sede compare nelle ricerche della rete
+        self.nord.add_book(Book("Il Gattopardo", "Giuseppe Tomasi di Lampedusa", "9788807881329"))
+        self.assertEqual(self.network.where_available("9788807881329"), {"Nord"})
+        self.assertEqual(len(self.network.search_by_author("lampedusa")), 1)
+    
+    def test_index_follows_sync(self):
+        """Verifica che le rimozioni e gli inserimenti fatti da sync aggiornino l'indice."""
+        # Centro rimuove "Il nome della rosa" e "1984" e inserisce un libro nuovo
+        self.centro.sync([("Il Gattopardo", "Giuseppe Tomasi di Lampedusa", "9788807881329")])
+        
+        # "1984" era solo a Centro: sparisce dalla rete
+        self.assertEqual(self.network.where_available("9788804668237"), set())
+        self.assertEqual(self.network.search_by_author("orwell"), [])
+        
+        # "Il nome della rosa" resta disponibile a Nord e cercabile tramite il libro di Nord
+        self.assertEqual(self.network.where_available("9788845292866"), {"Nord"})
+        results = self.network.search_by_title("rosa")
+        self.assertEqual(len(results), 1)
+        self.assertIs(results[0], self.nord.get_book_by_isbn("9788845292866"))
+        
+        self.assertEqual(self.network.where_available("9788807881329"), {"Centro"})
+    
+    
+    def test_search_sees_updates_from_any_branch(self):
+        """Verifica che titolo e autore aggiornati da sync in una sede qualunque siano cercabili nella rete."""
+        # Nord aggiorna il titolo di un libro indicizzato per primo da Centro
+        self.nord.sync([("Il nome della rosa (edizione illustrata)", "Umberto Eco", "9788845292866")])
+        
+        results = self.network.search_by_title("illustrata")
+        self.assertEqual(len(results), 1)
+        self.assertIs(results[0], self.nord.get_book_by_isbn("9788845292866"))
+        
+        # La ricerca resta una per ISBN e trova ancora il titolo originale di Centro
+        results = self.network.search_by_title("rosa")
+        self.assertEqual(len(results), 1)
+        self.assertIs(results[0], self.centro.get_book_by_isbn("9788845292866"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Micro-benchmark delle ottimizzazioni del carrello
+
+Uso:
+    python benchmark.py            # tutti i benchmark
+    python benchmark.py money      # solo quello indicato
+"""
+import sys
+import timeit
+import tracemalloc
+import main
+from main import OrderRecord, PriceEngine, Product, ProductCatalog, ShoppingCart, discount_cents, from_cents
+
+
+def best_of(func, number: int = 5, repeat: int = 5) -> float:
+    """Restituisce il tempo migliore (in secondi) di una singola esecuzione di func."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(label: str, seconds: float, baseline: float = None) -> None:
+    """Stampa un risultato, con il rapporto rispetto al riferimento se indicato."""
+    ratio = f"  ({baseline / seconds:.2f}x)" if baseline else ""
+    print(f"  {label:<45} {seconds * 1000:10.3f} ms{ratio}")
+
+
+def bench_money(lines: int = 50_000, percent: float = 12.5) -> None:
+    """Totale di un carrello grande: float arrotondati contro centesimi interi."""
+    print(f"Totale di un carrello da {lines} righe con sconto del {percent}%")
+    products = [Product(f"p{i}", f"Articolo {i}", 0.1 + (i % 997) * 0.37, 1000) for i in range(lines)]
+    float_lines = [(product.price, 1 + i % 5) for i, product in enumerate(products)]
+    cents_lines = [(product.price_cents, quantity) for product, (_, quantity) in zip(products, float_lines)]
+    
+    # Percorso float (come prima dei centesimi): somma dei prezzi e round finale
+    def float_total():
+        return round(sum(price * quantity for price, quantity in float_lines) * (1 - percent / 100), 2)
+    
+    # Percorso intero: somma esatta in centesimi e un solo arrotondamento in Decimal
+    def cents_total():
+        return discount_cents(sum(price * quantity for price, quantity in cents_lines), percent)
+    
+    cart = ShoppingCart()
+    for product, (_, quantity) in zip(products, float_lines):
+        cart.add_product(product, quantity)
+    cart.apply_discount(percent)
+    
+    baseline = best_of(float_total)
+    report("float: somma e round", baseline)
+    report("centesimi: somma intera e Decimal", best_of(cents_total), baseline)
+    report("centesimi: ShoppingCart.get_total_cents", best_of(cart.get_total_cents, number=1000), baseline)
+    print(f"  differenza tra i due totali: {abs(float_total() * 100 - cents_total()):.0f} centesimi")
+
+
+
+def bench_pricing(lines: int = 50_000, catalog_size: int = 1_000_000) -> None:
+    """PriceEngine in puro Python contro NumPy: totale di un carrello e riprezzamento del catalogo."""
+    engines = [("puro Python", PriceEngine(use_numpy=False))]
+    if main.np is not None:
+        engines.append(("NumPy", PriceEngine(use_numpy=True)))
+    else:
+        print("  NumPy non è installato: solo il percorso in puro Python")
+    
+    print(f"Totale ricalcolato di un carrello da {lines} righe")
+    cart = ShoppingCart()
+    for i in range(lines):
+        cart.add_product(Product(f"p{i}", f"Articolo {i}", 0.99 + (i % 997) * 1.37, 1000), 1 + i % 5)
+    baseline = None
+    for label, engine in engines:
+        seconds = best_of(lambda: engine.cart_total_cents(cart))
+        # Nessun guadagno atteso: le colonne del carrello si raccolgono in Python a ogni chiamata
+        report(f"cart_total_cents, {label}", seconds, baseline)
+        baseline = baseline or seconds
+    
+    print(f"Riprezzamento di un catalogo da {catalog_size} prodotti")
+    catalog = ProductCatalog()
+    for i in range(catalog_size):
+        catalog.add_product(f"p{i}", "Articolo", 0.99 + (i % 997) * 1.37, 10)
+    baseline = None
+    for label, engine in engines:
+        # Sconto dello 0%: i prezzi non cambiano e ogni ripetizione misura lo stesso lavoro
+        seconds = best_of(lambda: engine.reprice_catalog(catalog, 0), number=1, repeat=3)
+        report(f"reprice_catalog, {label}", seconds, baseline)
+        baseline = baseline or seconds
+
+
+def allocated(build) -> int:
+    """Restituisce i byte ancora allocati dagli oggetti creati da build."""
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_orders(count: int = 100_000, customers: int = 1_000) -> None:
+    """Memoria e lettura degli ordini: dizionari contro OrderRecord."""
+    print(f"{count} ordini da 1-3 righe di {customers} clienti")
+    names = [f"Articolo {i}" for i in range(500)]
+    users = [{"name": f"Cliente {i}", "email": f"cliente{i}@example.com", "address": f"Via Roma {i}"}
+             for i in range(customers)]
+    
+    def fields(number):
+        lines = [(f"p{(number + j) % 500}", names[(number + j) % 500], 1 + j) for j in range(1 + number % 3)]
+        total_cents = 999 + number % 10_000
+        payment = {"success": True, "transaction_id": f"txn_{number:06d}", "amount": from_cents(total_cents),
+                   "amount_cents": total_cents, "timestamp": 1.7e9 + number}
+        return lines, total_cents, payment
+    
+    # Gli input (nomi, pagamenti) si creano prima di misurare, come se arrivassero dal checkout
+    inputs = [fields(number) for number in range(count)]
+    
+    def dicts():
+        return [{"order_id": f"order_{number}", "user_details": users[number % customers],
+                 "items": [(name, quantity) for _, name, quantity in lines],
+                 "product_ids": [product_id for product_id, _, _ in lines],
+                 "total_amount": from_cents(total_cents), "total_cents": total_cents, "payment": payment,
+                 "status": "completed", "timestamp": 1.7e9 + number}
+                for number, (lines, total_cents, payment) in enumerate(inputs)]
+    
+    def records():
+        return [OrderRecord(f"order_{number}", users[number % customers],
+                            [(name, quantity) for _, name, quantity in lines], total_cents, payment, 1.7e9 + number,
+                            product_ids=[product_id for product_id, _, _ in lines])
+                for number, (lines, total_cents, payment) in enumerate(inputs)]
+    
+    # I pagamenti sono già allocati: si contano a parte, perché i dizionari li trattengono e gli OrderRecord no
+    payments = sys.getsizeof(inputs[0][2]) * count
+    dict_size = allocated(dicts) + payments
+    record_size = allocated(records)
+    print(f"  {'dizionari (pagamenti inclusi)':<45} {dict_size / count:10.0f} B/ordine")
+    print(f"  {'OrderRecord':<45} {record_size / count:10.0f} B/ordine  ({dict_size / record_size:.2f}x)")
+    
+    orders = records()
+    plain = dicts()
+    baseline = best_of(lambda: [order["items"] for order in plain], number=3)
+    report("lettura di items, dizionari", baseline)
+    report("lettura di items, OrderRecord", best_of(lambda: [order["items"] for order in orders], number=3), baseline)
+
+
+BENCHMARKS = {
+    "money": bench_money,
+    "pricing": bench_pricing,
+    "orders": bench_orders,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
@@ -1,25 +1,127 @@
 """
 Sistema di carrello per acquisti online
 """
-from typing import Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+import asyncio
+import bisect
+import csv
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
 import time
 import random
 
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: senza, PriceEngine calcola in puro Python
+    np = None
+
+
+def to_cents(amount: Union[float, Decimal, str]) -> int:
+    """
+    Converte un importo in euro in centesimi interi, arrotondando al centesimo più vicino.
+    
+    Args:
+        amount: L'importo in euro
+        
+    Returns:
+        int: L'importo in centesimi
+    """
+    # str() evita di ereditare l'errore di rappresentazione binaria del float (es. 0.285 -> 0.28499...)
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> float:
+    """
+    Converte un importo in centesimi interi in euro.
+    
+    Args:
+        cents: L'importo in centesimi
+        
+    Returns:
+        float: L'importo in euro
+    """
+    return cents / 100
+
+
+def discount_cents(cents: int, percent: float) -> int:
+    """
+    Applica uno sconto percentuale a un importo in centesimi, calcolando in Decimal.
+    
+    Args:
+        cents: L'importo in centesimi
+        percent: La percentuale di sconto
+        
+    Returns:
+        int: L'importo scontato, arrotondato al centesimo più vicino
+    """
+    discounted = Decimal(cents) * (100 - Decimal(str(percent))) / 100
+    return int(discounted.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _price_cents(price: Union[float, Decimal, str]) -> int:
+    """Converte un prezzo in centesimi, verificando che dopo l'arrotondamento resti positivo."""
+    price_cents = to_cents(price)
+    # Si controlla il valore convertito: un prezzo sotto il mezzo centesimo diventerebbe 0
+    if price_cents <= 0:
+        raise ValueError("Il prezzo deve essere maggiore di zero")
+    return price_cents
+
 
 class Product:
     """Rappresenta un prodotto acquistabile."""
     
-    def __init__(self, product_id: str, name: str, price: float, stock: int = 10):
+    # Niente __dict__ per istanza: milioni di prodotti occupano molta meno memoria
+    __slots__ = ("product_id", "name", "_price_cents", "stock", "category")
+    
+    # Cresce a ogni cambio di prezzo di un qualunque prodotto: i carrelli aperti lo confrontano
+    # con quello del loro ultimo calcolo per sapere se devono ricalcolare i totali
+    price_version = 0
+    
+    def __init__(self, product_id: str, name: str, price: float, stock: int = 10, category: Optional[str] = None):
         """Inizializza un nuovo prodotto."""
-        if price <= 0:
-            raise ValueError("Il prezzo deve essere maggiore di zero")
+        price_cents = _price_cents(price)
         if stock < 0:
             raise ValueError("La disponibilità non può essere negativa")
         
         self.product_id = product_id
         self.name = name
-        self.price = price
+        self._price_cents = price_cents
         self.stock = stock
+        self.category = category
+    
+    @property
+    def price_cents(self) -> int:
+        """Il prezzo in centesimi interi."""
+        return self._price_cents
+    
+    @price_cents.setter
+    def price_cents(self, price_cents: int) -> None:
+        """Aggiorna il prezzo in centesimi, segnalando il cambio ai carrelli aperti."""
+        self._price_cents = price_cents
+        Product.price_version += 1
+    
+    @property
+    def price(self) -> float:
+        """Il prezzo in euro, ricavato da quello in centesimi."""
+        return from_cents(self.price_cents)
+    
+    @price.setter
+    def price(self, price: float) -> None:
+        """Imposta il prezzo in euro, conservandolo in centesimi interi."""
+        self.price_cents = _price_cents(price)
     
     def is_available(self, quantity: int = 1) -> bool:
         """
@@ -72,316 +174,2748 @@ class Product:
         return self.stock
 
 
-class ShoppingCart:
-    """Gestisce un carrello della spesa."""
+class CatalogProduct(Product):
+    """Prodotto di un ProductCatalog: un riferimento leggero ai dati conservati negli array del catalogo."""
     
-    def __init__(self):
-        """Inizializza un nuovo carrello vuoto."""
-        self.items: Dict[str, Tuple[Product, int]] = {}  # product_id -> (product, quantity)
-        self.discount_percent = 0
+    __slots__ = ("_catalog", "_position")
     
-    def add_product(self, product: Product, quantity: int = 1) -> bool:
+    def __init__(self, catalog: "ProductCatalog", position: int):
         """
-        Aggiunge un prodotto al carrello.
+        Inizializza un riferimento a un prodotto del catalogo.
         
         Args:
-            product: Il prodotto da aggiungere
-            quantity: La quantità da aggiungere
+            catalog: Il catalogo che contiene il prodotto
+            position: La posizione del prodotto negli array del catalogo
+        """
+        self._catalog = catalog
+        self._position = position
+    
+    @property
+    def product_id(self) -> str:
+        """L'ID del prodotto."""
+        return self._catalog._product_ids[self._position]
+    
+    @property
+    def name(self) -> str:
+        """Il nome del prodotto."""
+        return self._catalog._names[self._position]
+    
+    @property
+    def category(self) -> Optional[str]:
+        """La categoria del prodotto."""
+        return self._catalog._categories[self._position]
+    
+    @property
+    def price_cents(self) -> int:
+        """Il prezzo in centesimi, letto dall'array dei prezzi."""
+        return self._catalog._prices[self._position]
+    
+    @price_cents.setter
+    def price_cents(self, price_cents: int) -> None:
+        """Aggiorna il prezzo in centesimi nell'array dei prezzi, segnalando il cambio ai carrelli aperti."""
+        self._catalog._prices[self._position] = price_cents
+        Product.price_version += 1
+    
+    @property
+    def stock(self) -> int:
+        """Lo stock, letto dall'array delle disponibilità."""
+        return self._catalog._stock[self._position]
+    
+    @stock.setter
+    def stock(self, stock: int) -> None:
+        """Aggiorna lo stock nell'array delle disponibilità, mantenendo allineati indici e notifiche."""
+        self._catalog._update_stock({self._position: stock})
+    
+    def reserve(self, quantity: int = 1) -> bool:
+        """
+        Riserva una quantità del prodotto, controllando e aggiornando lo stock sotto il lock del catalogo.
+        
+        A differenza di Product.reserve non è una lettura seguita da una scrittura, quindi
+        non può vendere più dello stock insieme a operazioni concorrenti come reserve_many.
+        
+        Args:
+            quantity: La quantità da riservare
             
         Returns:
-            bool: True se il prodotto è stato aggiunto con successo
+            bool: True se la riserva è andata a buon fine
             
         Raises:
-            ValueError: Se la quantità è negativa o zero
-            ValueError: Se il prodotto non è disponibile nella quantità richiesta
+            ValueError: Se la quantità richiesta non è disponibile
         """
-        if quantity <= 0:
-            raise ValueError("La quantità deve essere positiva")
-        
-        if not product.is_available(quantity):
-            raise ValueError(f"Quantità {quantity} non disponibile per {product.name}")
-        
-        if product.product_id in self.items:
-            current_product, current_quantity = self.items[product.product_id]
-            self.items[product.product_id] = (current_product, current_quantity + quantity)
-        else:
-            self.items[product.product_id] = (product, quantity)
-        
+        self._catalog._adjust_stock(self._position, -quantity)
         return True
     
-    def remove_product(self, product_id: str, quantity: int = 1) -> bool:
+    def restock(self, quantity: int) -> int:
         """
-        Rimuove un prodotto dal carrello.
+        Incrementa lo stock del prodotto sotto il lock del catalogo.
         
         Args:
-            product_id: L'ID del prodotto da rimuovere
-            quantity: La quantità da rimuovere
+            quantity: La quantità da aggiungere allo stock
             
         Returns:
-            bool: True se il prodotto è stato rimosso con successo
+            int: Il nuovo livello di stock
             
         Raises:
-            ValueError: Se il prodotto non è nel carrello
-            ValueError: Se la quantità è maggiore di quella nel carrello
+            ValueError: Se la quantità è negativa
         """
-        if product_id not in self.items:
-            raise ValueError(f"Prodotto con ID {product_id} non presente nel carrello")
-        
-        current_product, current_quantity = self.items[product_id]
-        
-        if quantity <= 0:
-            raise ValueError("La quantità da rimuovere deve essere positiva")
-        
-        if quantity > current_quantity:
-            raise ValueError(f"Quantità da rimuovere ({quantity}) maggiore di quella nel carrello ({current_quantity})")
-        
-        if quantity == current_quantity:
-            # Rimuovi completamente il prodotto
-            del self.items[product_id]
-        else:
-            # Riduci la quantità
-            self.items[product_id] = (current_product, current_quantity - quantity)
-        
-        return True
+        if quantity < 0:
+            raise ValueError("La quantità di restock deve essere positiva")
+        return self._catalog._adjust_stock(self._position, quantity)
     
-    def get_total(self) -> float:
+    def __eq__(self, other: object) -> bool:
+        """Due riferimenti sono uguali se indicano lo stesso prodotto dello stesso catalogo."""
+        if not isinstance(other, CatalogProduct):
+            return NotImplemented
+        return self._catalog is other._catalog and self._position == other._position
+    
+    def __hash__(self) -> int:
+        """Hash coerente con __eq__."""
+        return hash((id(self._catalog), self._position))
+
+
+class ProductCatalog:
+    """Catalogo compatto: prezzi e stock di tutti i prodotti in array tipizzati, indicizzati per ID."""
+    
+    def __init__(self, low_stock_limit: Optional[int] = None):
         """
-        Calcola il totale del carrello.
+        Inizializza un catalogo vuoto.
         
-        Returns:
-            float: Il totale del carrello
+        Args:
+            low_stock_limit: Se indicato, i prodotti con stock inferiore a questo valore
+                vengono tenuti in un indice ordinato per stock (vedi get_low_stock)
+                
+        Raises:
+            ValueError: Se il limite non è positivo
         """
-        total = sum(product.price * quantity for product, quantity in self.items.values())
-        
-        # Applica lo sconto se presente
-        if self.discount_percent > 0:
-            total = total * (1 - self.discount_percent / 100)
+        if low_stock_limit is not None and low_stock_limit <= 0:
+            raise ValueError("Il limite di scorta bassa deve essere positivo")
         
-        return round(total, 2)
+        self._positions: Dict[str, int] = {}  # product_id -> posizione negli array
+        self._product_ids: List[str] = []
+        self._names: List[str] = []
+        self._categories: List[Optional[str]] = []
+        self._prices = array("q")  # Prezzi in centesimi
+        self._stock = array("q")
+        self._lock = threading.Lock()  # Rende atomiche le operazioni in blocco e gli aggiornamenti degli indici
+        self.low_stock_limit = low_stock_limit
+        # Solo i prodotti sotto il limite, come coppie (stock, posizione) ordinate
+        self._low_stock: List[Tuple[int, int]] = []
+        self._thresholds: List[int] = []  # Soglie osservate, ordinate
+        self._listeners: Dict[int, List[Callable[[CatalogProduct, int, int], None]]] = {}
     
-    def apply_discount(self, percent: float) -> bool:
+    def __len__(self) -> int:
+        """Restituisce il numero di prodotti nel catalogo."""
+        return len(self._product_ids)
+    
+    def __contains__(self, product_id: str) -> bool:
+        """Verifica se un prodotto è nel catalogo."""
+        return product_id in self._positions
+    
+    def __iter__(self) -> Iterator[CatalogProduct]:
+        """Scorre i prodotti del catalogo nell'ordine di inserimento."""
+        return (CatalogProduct(self, position) for position in range(len(self._product_ids)))
+    
+    def add_product(self, product_id: str, name: str, price: float, stock: int = 10,
+                    category: Optional[str] = None) -> CatalogProduct:
         """
-        Applica uno sconto percentuale al carrello.
+        Aggiunge un prodotto al catalogo.
         
         Args:
-            percent: La percentuale di sconto (0-100)
+            product_id: L'ID del prodotto
+            name: Il nome del prodotto
+            price: Il prezzo in euro
+            stock: La disponibilità iniziale
+            category: La categoria del prodotto
             
         Returns:
-            bool: True se lo sconto è stato applicato con successo
+            CatalogProduct: Il prodotto aggiunto
             
         Raises:
-            ValueError: Se la percentuale non è valida
+            ValueError: Se il prodotto è già presente o se prezzo o disponibilità non sono validi
         """
-        if percent < 0 or percent > 100:
-            raise ValueError("La percentuale di sconto deve essere compresa tra 0 e 100")
+        if product_id in self._positions:
+            raise ValueError(f"Prodotto con ID {product_id} già presente nel catalogo")
+        price_cents = _price_cents(price)
+        if stock < 0:
+            raise ValueError("La disponibilità non può essere negativa")
         
-        self.discount_percent = percent
-        return True
+        # Gli ID internati sono condivisi con i carrelli e gli indici che li usano come chiave
+        product_id = sys.intern(product_id)
+        # Sotto lock anche gli append: PriceEngine.reprice_catalog lavora su una vista degli array
+        with self._lock:
+            position = len(self._product_ids)
+            self._positions[product_id] = position
+            self._product_ids.append(product_id)
+            self._names.append(name)
+            self._categories.append(sys.intern(category) if category is not None else None)
+            self._prices.append(price_cents)
+            self._stock.append(stock)
+            if self.low_stock_limit is not None and stock < self.low_stock_limit:
+                bisect.insort(self._low_stock, (stock, position))
+        return CatalogProduct(self, position)
     
-    def clear(self) -> bool:
+    def get_product(self, product_id: str) -> Optional[CatalogProduct]:
         """
-        Svuota il carrello.
+        Cerca un prodotto per ID.
         
+        Args:
+            product_id: L'ID del prodotto
+            
         Returns:
-            bool: True se il carrello è stato svuotato con successo
+            Optional[CatalogProduct]: Il prodotto o None se non è nel catalogo
         """
-        self.items.clear()
-        self.discount_percent = 0
-        return True
+        position = self._positions.get(product_id)
+        return CatalogProduct(self, position) if position is not None else None
     
-    def get_item_count(self) -> int:
+    def restock_many(self, quantities: Dict[str, int]) -> Dict[str, str]:
         """
-        Ottiene il numero totale di articoli nel carrello.
+        Rifornisce più prodotti in un'unica operazione "tutto o niente".
         
+        Args:
+            quantities: product_id -> quantità da aggiungere allo stock
+            
         Returns:
-            int: Il numero totale di articoli
-        """
-        return sum(quantity for _, quantity in self.items.values())
-    
-    def checkout(self) -> List[Tuple[Product, int]]:
+            Dict[str, str]: product_id -> motivo del rifiuto, per ogni prodotto non valido;
+                se il dizionario non è vuoto nessuno stock è stato modificato
         """
-        Prepara il checkout del carrello.
-        
-        Returns:
-            List[Tuple[Product, int]]: Lista di prodotti e quantità
+        with self._lock:
+            entries, failures = self._resolve(quantities)
+            if failures:
+                return failures
             
-        Raises:
-            ValueError: Se il carrello è vuoto
-        """
-        if not self.items:
-            raise ValueError("Impossibile completare il checkout: il carrello è vuoto")
-        
-        # Verifica che tutti i prodotti siano ancora disponibili
-        for product, quantity in self.items.values():
-            if not product.is_available(quantity):
-                raise ValueError(f"Prodotto {product.name} non più disponibile nella quantità richiesta")
-        
-        # Crea la lista di checkout
-        checkout_list = [(product, quantity) for product, quantity in self.items.values()]
+            stock = self._stock
+            events = self._set_stock({position: stock[position] + quantity for _, position, quantity in entries})
         
-        return checkout_list
-
-
-class PaymentProcessor:
-    """Gestisce l'elaborazione dei pagamenti."""
+        self._notify(events)
+        return {}
     
-    def __init__(self, api_key: str = "test_key"):
+    def reserve_many(self, quantities: Dict[str, int]) -> Dict[str, str]:
         """
-        Inizializza un nuovo processore di pagamenti.
+        Riserva più prodotti in un'unica operazione "tutto o niente".
         
         Args:
-            api_key: La chiave API per il servizio di pagamento
+            quantities: product_id -> quantità da togliere dallo stock
+            
+        Returns:
+            Dict[str, str]: product_id -> motivo del rifiuto, per ogni prodotto non valido
+                o non disponibile; se il dizionario non è vuoto nessuno stock è stato modificato
         """
-        self.api_key = api_key
+        with self._lock:
+            entries, failures = self._resolve(quantities)
+            stock = self._stock
+            for product_id, position, quantity in entries:
+                if stock[position] < quantity:
+                    failures[product_id] = f"Quantità non disponibile (richiesti {quantity}, disponibili {stock[position]})"
+            if failures:
+                return failures
+            
+            events = self._set_stock({position: stock[position] - quantity for _, position, quantity in entries})
+        
+        self._notify(events)
+        return {}
     
-    def process_payment(self, amount: float, payment_details: Dict) -> Dict:
+    def get_low_stock(self, below: int) -> List[CatalogProduct]:
         """
-        Elabora un pagamento.
+        Trova i prodotti con stock inferiore a una soglia, in tempo proporzionale al loro numero.
         
         Args:
-            amount: L'importo da pagare
-            payment_details: I dettagli del pagamento
+            below: La soglia (al massimo low_stock_limit)
             
         Returns:
-            Dict: Risultato del pagamento
+            List[CatalogProduct]: I prodotti trovati, dallo stock più basso
             
         Raises:
-            ValueError: Se i dettagli di pagamento non sono validi
-            RuntimeError: Se il pagamento fallisce
+            ValueError: Se il catalogo non ha un indice di scorta bassa o la soglia lo supera
         """
-        # Verifica che i dettagli di pagamento siano validi
-        required_fields = ["card_number", "expiry", "cvv"]
-        for field in required_fields:
-            if field not in payment_details:
-                raise ValueError(f"Campo obbligatorio mancante: {field}")
+        if self.low_stock_limit is None or below > self.low_stock_limit:
+            raise ValueError("La soglia supera il limite dell'indice di scorta bassa")
         
-        # Simulazione di chiamata API a un servizio di pagamento
-        # In un'implementazione reale, qui ci sarebbe una chiamata HTTP a un gateway di pagamento
-        print(f"Elaborazione pagamento di €{amount:.2f}...")
+        with self._lock:
+            end = bisect.bisect_left(self._low_stock, (below, -1))
+            positions = [position for _, position in self._low_stock[:end]]
+        return [CatalogProduct(self, position) for position in positions]
+    
+    def add_threshold_listener(self, threshold: int, callback: Callable[[CatalogProduct, int, int], None]) -> None:
+        """
+        Registra una funzione da chiamare quando lo stock di un prodotto attraversa una soglia.
         
-        # Simulazione di latenza di rete
-        time.sleep(0.5)
+        La soglia è attraversata quando lo stock scende sotto di essa o torna a raggiungerla;
+        la funzione riceve il prodotto, lo stock precedente e quello nuovo.
         
-        # Simulazione di risposta (90% di successo, 10% di fallimento)
-        if random.random() < 0.9:
-            return {
-                "success": True,
-                "transaction_id": f"txn_{random.randint(100000, 999999)}",
-                "amount": amount,
-                "timestamp": time.time()
-            }
-        else:
-            raise RuntimeError("Pagamento fallito: la transazione è stata rifiutata")
+        Args:
+            threshold: La soglia di stock
+            callback: La funzione da chiamare
+        """
+        with self._lock:
+            if threshold not in self._listeners:
+                bisect.insort(self._thresholds, threshold)
+            self._listeners.setdefault(threshold, []).append(callback)
     
-    def refund_payment(self, transaction_id: str) -> Dict:
+    def _update_stock(self, new_stock: Dict[int, int]) -> None:
+        """Imposta lo stock di alcune posizioni e notifica le soglie attraversate."""
+        with self._lock:
+            events = self._set_stock(new_stock)
+        self._notify(events)
+    
+    def _adjust_stock(self, position: int, delta: int) -> int:
         """
-        Effettua il rimborso di un pagamento.
+        Somma delta allo stock di una posizione in modo atomico e notifica le soglie attraversate.
         
-        Args:
-            transaction_id: ID della transazione da rimborsare
-            
         Returns:
-            Dict: Risultato del rimborso
+            int: Il nuovo livello di stock
             
         Raises:
-            ValueError: Se l'ID della transazione non è valido
-            RuntimeError: Se il rimborso fallisce
+            ValueError: Se lo stock scenderebbe sotto zero (in tal caso non viene modificato)
         """
-        if not transaction_id.startswith("txn_"):
-            raise ValueError("ID transazione non valido")
-        
-        # Simulazione di chiamata API per il rimborso
-        print(f"Elaborazione rimborso per la transazione {transaction_id}...")
-        
-        # Simulazione di latenza di rete
-        time.sleep(0.5)
+        with self._lock:
+            stock = self._stock[position] + delta
+            if stock < 0:
+                raise ValueError(f"Quantità non disponibile per {self._names[position]}")
+            events = self._set_stock({position: stock})
+        self._notify(events)
+        return stock
+    
+    def _set_stock(self, new_stock: Dict[int, int]) -> List[Tuple[Callable, int, int, int]]:
+        """
+        Imposta lo stock di alcune posizioni aggiornando l'indice di scorta bassa (con il lock acquisito).
         
-        # Simulazione di risposta (95% di successo, 5% di fallimento)
-        if random.random() < 0.95:
-            return {
-                "success": True,
-                "refund_id": f"ref_{random.randint(100000, 999999)}",
-                "transaction_id": transaction_id,
-                "timestamp": time.time()
-            }
-        else:
-            raise RuntimeError("Rimborso fallito: impossibile elaborare la richiesta")
+        Returns:
+            List[Tuple[Callable, int, int, int]]: Le notifiche da inviare, come
+                (funzione, posizione, stock precedente, stock nuovo)
+        """
+        events = []
+        for position, stock in new_stock.items():
+            old = self._stock[position]
+            self._stock[position] = stock
+            if old == stock:
+                continue
+            
+            if self.low_stock_limit is not None:
+                if old < self.low_stock_limit:
+                    del self._low_stock[bisect.bisect_left(self._low_stock, (old, position))]
+                if stock < self.low_stock_limit:
+                    bisect.insort(self._low_stock, (stock, position))
+            
+            # Soglie t con min < t <= max: solo quelle attraversate, trovate per bisezione
+            start = bisect.bisect_right(self._thresholds, min(old, stock))
+            end = bisect.bisect_right(self._thresholds, max(old, stock))
+            for threshold in self._thresholds[start:end]:
+                events.extend((callback, position, old, stock) for callback in self._listeners[threshold])
+        return events
+    
+    def _notify(self, events: List[Tuple[Callable, int, int, int]]) -> None:
+        """Chiama le funzioni registrate, fuori dal lock del catalogo."""
+        for callback, position, old, stock in events:
+            callback(CatalogProduct(self, position), old, stock)
+    
+    def _resolve(self, quantities: Dict[str, int]) -> Tuple[List[Tuple[str, int, int]], Dict[str, str]]:
+        """Converte gli ID di un'operazione in blocco in (ID, posizione, quantità), raccogliendo gli errori."""
+        entries: List[Tuple[str, int, int]] = []
+        failures: Dict[str, str] = {}
+        for product_id, quantity in quantities.items():
+            position = self._positions.get(product_id)
+            if position is None:
+                failures[product_id] = "Prodotto non presente nel catalogo"
+            elif quantity <= 0:
+                failures[product_id] = "La quantità deve essere positiva"
+            else:
+                entries.append((product_id, position, quantity))
+        return entries, failures
 
 
-class OrderService:
-    """Gestisce il processo di ordine completo."""
+class Promotion(ABC):
+    """
+    Regola promozionale applicata a un gruppo di prodotti (per ID o per categoria).
+    
+    Classe astratta: ogni regola concreta deve implementare discount_cents.
+    """
     
-    def __init__(self, payment_processor: PaymentProcessor):
+    def __init__(self, name: str, product_ids: Optional[Iterable[str]] = None, category: Optional[str] = None):
         """
-        Inizializza un nuovo servizio ordini.
+        Inizializza una nuova promozione.
         
         Args:
-            payment_processor: Il processore di pagamenti da utilizzare
+            name: Il nome della promozione, mostrato da explain
+            product_ids: Gli ID dei prodotti a cui si applica
+            category: La categoria di prodotti a cui si applica
+            
+        Raises:
+            ValueError: Se non sono indicati né prodotti né categoria
         """
-        self.payment_processor = payment_processor
-        self.orders: List[Dict] = []
+        if not product_ids and category is None:
+            raise ValueError("Una promozione deve indicare dei prodotti o una categoria")
+        
+        self.name = name
+        self.product_ids: Set[str] = set(product_ids or ())
+        self.category = category
     
-    def place_order(self, cart: ShoppingCart, user_details: Dict, payment_details: Dict) -> Dict:
+    def applies_to(self, product: Product) -> bool:
         """
-        Effettua un ordine.
+        Verifica se la promozione si applica a un prodotto.
         
         Args:
-            cart: Il carrello della spesa
-            user_details: Dettagli dell'utente
-            payment_details: Dettagli del pagamento
+            product: Il prodotto
             
         Returns:
-            Dict: Dettagli dell'ordine completato
+            bool: True se il prodotto fa parte del gruppo della promozione
+        """
+        return product.product_id in self.product_ids or (
+            self.category is not None and product.category == self.category)
+    
+    @abstractmethod
+    def discount_cents(self, lines: Iterable[Tuple[Product, int]]) -> int:
+        """
+        Calcola lo sconto (in centesimi) sulle righe del carrello a cui si applica la promozione.
+        
+        Args:
+            lines: Prodotti e quantità del gruppo della promozione
             
-        Raises:
-            ValueError: Se il carrello è vuoto o i dettagli non sono validi
-            RuntimeError: Se il pagamento fallisce
+        Returns:
+            int: Lo sconto in centesimi
         """
-        # Verifica che il carrello non sia vuoto
-        if cart.get_item_count() == 0:
-            raise ValueError("Impossibile completare l'ordine: il carrello è vuoto")
+    
+    def line_discounts(self, lines: Iterable[Tuple[Product, int]]) -> Dict[str, int]:
+        """
+        Ripartisce lo sconto della promozione tra i prodotti del gruppo.
         
-        # Verifica che i dettagli dell'utente siano validi
-        required_user_fields = ["name", "email", "address"]
-        for field in required_user_fields:
-            if field not in user_details:
-                raise ValueError(f"Campo utente obbligatorio mancante: {field}")
+        Di default lo sconto calcolato da discount_cents viene diviso in proporzione al
+        subtotale di ogni riga, assegnando i centesimi di resto alle righe con la parte
+        frazionaria più alta, così la somma coincide esattamente con lo sconto.
+        
+        Args:
+            lines: Prodotti e quantità del gruppo della promozione
+            
+        Returns:
+            Dict[str, int]: ID del prodotto -> sconto in centesimi (solo i prodotti scontati)
+        """
+        lines = list(lines)
+        total = self.discount_cents(lines)
+        subtotals = [product.price_cents * quantity for product, quantity in lines]
+        base = sum(subtotals)
+        if total <= 0 or base <= 0:
+            return {}
+        
+        shares: Dict[str, int] = {}
+        remainders = []
+        for (product, _), subtotal in zip(lines, subtotals):
+            share, remainder = divmod(total * subtotal, base)
+            shares[product.product_id] = share
+            remainders.append((remainder, product.product_id))
+        for _, product_id in sorted(remainders, reverse=True)[:total - sum(shares.values())]:
+            shares[product_id] += 1
+        return {product_id: share for product_id, share in shares.items() if share > 0}
+
+
+class PercentagePromotion(Promotion):
+    """Sconto percentuale su uno o più prodotti o su una categoria."""
+    
+    def __init__(self, name: str, percent: float, product_ids: Optional[Iterable[str]] = None,
+                 category: Optional[str] = None):
+        """
+        Inizializza una nuova promozione percentuale.
+        
+        Args:
+            name: Il nome della promozione
+            percent: La percentuale di sconto (0-100)
+            product_ids: Gli ID dei prodotti a cui si applica
+            category: La categoria di prodotti a cui si applica
+            
+        Raises:
+            ValueError: Se la percentuale non è valida
+        """
+        super().__init__(name, product_ids, category)
+        if percent < 0 or percent > 100:
+            raise ValueError("La percentuale di sconto deve essere compresa tra 0 e 100")
+        self.percent = percent
+    
+    def discount_cents(self, lines: Iterable[Tuple[Product, int]]) -> int:
+        """Sconta la percentuale sul subtotale del gruppo."""
+        subtotal = sum(product.price_cents * quantity for product, quantity in lines)
+        return subtotal - discount_cents(subtotal, self.percent)
+
+
+class BuyXGetYPromotion(Promotion):
+    """Promozione "prendi X, paghi meno": ogni buy + get unità dello stesso prodotto, get sono gratis."""
+    
+    def __init__(self, name: str, buy: int, get: int, product_ids: Optional[Iterable[str]] = None,
+                 category: Optional[str] = None):
+        """
+        Inizializza una nuova promozione "compra X, ricevi Y".
+        
+        Args:
+            name: Il nome della promozione
+            buy: Le unità da pagare
+            get: Le unità gratuite ogni buy unità pagate
+            product_ids: Gli ID dei prodotti a cui si applica
+            category: La categoria di prodotti a cui si applica
+            
+        Raises:
+            ValueError: Se le quantità non sono positive
+        """
+        super().__init__(name, product_ids, category)
+        if buy <= 0 or get <= 0:
+            raise ValueError("Le quantità della promozione devono essere positive")
+        self.buy = buy
+        self.get = get
+    
+    def discount_cents(self, lines: Iterable[Tuple[Product, int]]) -> int:
+        """Sconta le unità gratuite di ogni prodotto del gruppo."""
+        return sum(self.line_discounts(lines).values())
+    
+    def line_discounts(self, lines: Iterable[Tuple[Product, int]]) -> Dict[str, int]:
+        """Lo sconto di ogni prodotto sono le sue unità gratuite."""
+        discounts = {product.product_id: product.price_cents * (quantity // (self.buy + self.get)) * self.get
+                     for product, quantity in lines}
+        return {product_id: discount for product_id, discount in discounts.items() if discount > 0}
+
+
+class TieredPromotion(Promotion):
+    """Sconto a scaglioni: la percentuale dipende dalla quantità totale acquistata nel gruppo."""
+    
+    def __init__(self, name: str, tiers: Iterable[Tuple[int, float]], product_ids: Optional[Iterable[str]] = None,
+                 category: Optional[str] = None):
+        """
+        Inizializza una nuova promozione a scaglioni.
+        
+        Args:
+            name: Il nome della promozione
+            tiers: Coppie (quantità minima, percentuale di sconto)
+            product_ids: Gli ID dei prodotti a cui si applica
+            category: La categoria di prodotti a cui si applica
+            
+        Raises:
+            ValueError: Se gli scaglioni sono vuoti o non validi
+        """
+        super().__init__(name, product_ids, category)
+        self.tiers = sorted(tiers, reverse=True)  # Dallo scaglione più alto
+        if not self.tiers or any(min_quantity <= 0 or not 0 <= percent <= 100
+                                 for min_quantity, percent in self.tiers):
+            raise ValueError("Gli scaglioni devono avere quantità positive e percentuali tra 0 e 100")
+    
+    def discount_cents(self, lines: Iterable[Tuple[Product, int]]) -> int:
+        """Sconta sul subtotale del gruppo la percentuale dello scaglione raggiunto."""
+        lines = list(lines)
+        total_quantity = sum(quantity for _, quantity in lines)
+        for min_quantity, percent in self.tiers:
+            if total_quantity >= min_quantity:
+                subtotal = sum(product.price_cents * quantity for product, quantity in lines)
+                return subtotal - discount_cents(subtotal, percent)
+        return 0
+
+
+class PromotionEngine:
+    """Indicizza le promozioni per prodotto e categoria, per valutare solo quelle interessate da una modifica."""
+    
+    def __init__(self, promotions: Iterable[Promotion]):
+        """
+        Inizializza un nuovo motore delle promozioni.
+        
+        Args:
+            promotions: Le promozioni attive
+        """
+        self.promotions = list(promotions)
+        # Indici precalcolati: product_id o categoria -> posizioni delle promozioni
+        self._by_product: Dict[str, List[int]] = {}
+        self._by_category: Dict[str, List[int]] = {}
+        for index, promotion in enumerate(self.promotions):
+            for product_id in promotion.product_ids:
+                self._by_product.setdefault(product_id, []).append(index)
+            if promotion.category is not None:
+                self._by_category.setdefault(promotion.category, []).append(index)
+    
+    def rules_for(self, product: Product) -> List[int]:
+        """
+        Trova le promozioni che si applicano a un prodotto.
+        
+        Args:
+            product: Il prodotto
+            
+        Returns:
+            List[int]: Le posizioni delle promozioni, senza ripetizioni
+        """
+        rules = self._by_product.get(product.product_id, [])
+        if product.category is not None and product.category in self._by_category:
+            rules = list(dict.fromkeys(rules + self._by_category[product.category]))
+        return rules
+    
+    def create_state(self) -> "AppliedPromotions":
+        """
+        Crea lo stato delle promozioni per un nuovo carrello.
+        
+        Returns:
+            AppliedPromotions: Lo stato, vuoto
+        """
+        return AppliedPromotions(self)
+
+
+class AppliedPromotions:
+    """
+    Promozioni applicate a un carrello, aggiornate in modo incrementale a ogni modifica.
+    
+    Le promozioni si sommano, ma lo sconto complessivo di ogni riga non può superarne
+    il subtotale: un prodotto può diventare gratuito, non avere un prezzo negativo.
+    """
+    
+    def __init__(self, engine: PromotionEngine):
+        """
+        Inizializza lo stato delle promozioni di un carrello vuoto.
+        
+        Args:
+            engine: Il motore delle promozioni
+        """
+        self.engine = engine
+        self.discount_cents = 0  # Somma degli sconti applicati, già limitati riga per riga
+        self._lines: Dict[int, Dict[str, Tuple[Product, int]]] = {}  # promozione -> righe interessate
+        self._discounts: Dict[int, int] = {}  # promozione -> sconto attuale in centesimi
+        self._line_discounts: Dict[int, Dict[str, int]] = {}  # promozione -> sconto per prodotto
+        self._product_discounts: Dict[str, int] = {}  # prodotto -> somma degli sconti delle promozioni
+        self._subtotals: Dict[str, int] = {}  # prodotto -> subtotale della riga
+        self._applied: Dict[str, int] = {}  # prodotto -> sconto applicato (al più il subtotale)
+    
+    def update(self, product: Product, quantity: int) -> None:
+        """
+        Aggiorna le promozioni dopo che la quantità di un prodotto nel carrello è cambiata.
+        
+        Vengono ricalcolate solo le promozioni che si applicano al prodotto, e il limite
+        per riga solo per i prodotti di quelle promozioni.
+        
+        Args:
+            product: Il prodotto modificato
+            quantity: La nuova quantità nel carrello (0 se il prodotto è stato rimosso)
+        """
+        rules = self.engine.rules_for(product)
+        if not rules:
+            return
+        
+        touched = {product.product_id}
+        if quantity > 0:
+            self._subtotals[product.product_id] = product.price_cents * quantity
+        else:
+            self._subtotals.pop(product.product_id, None)
+        
+        for index in rules:
+            lines = self._lines.setdefault(index, {})
+            if quantity > 0:
+                lines[product.product_id] = (product, quantity)
+            else:
+                lines.pop(product.product_id, None)
+            
+            old = self._line_discounts.get(index, {})
+            new = self.engine.promotions[index].line_discounts(lines.values()) if lines else {}
+            for product_id in old.keys() | new.keys():
+                self._product_discounts[product_id] = (
+                    self._product_discounts.get(product_id, 0) + new.get(product_id, 0) - old.get(product_id, 0))
+                touched.add(product_id)
+            self._line_discounts[index] = new
+            self._discounts[index] = sum(new.values())
+        
+        # Lo sconto applicato a ogni riga è la somma delle promozioni, ma non oltre il subtotale
+        for product_id in touched:
+            applied = min(self._product_discounts.get(product_id, 0), self._subtotals.get(product_id, 0))
+            self.discount_cents += applied - self._applied.get(product_id, 0)
+            if applied:
+                self._applied[product_id] = applied
+            else:
+                self._applied.pop(product_id, None)
+            if not self._product_discounts.get(product_id):
+                self._product_discounts.pop(product_id, None)
+    
+    def explain(self) -> List[Dict]:
+        """
+        Descrive le promozioni applicate.
+        
+        Returns:
+            List[Dict]: Per ogni promozione con uno sconto, il nome, lo sconto in centesimi
+                calcolato dalla regola (prima del limite per riga) e gli ID dei prodotti interessati
+        """
+        return [
+            {
+                "promotion": self.engine.promotions[index].name,
+                "discount_cents": discount,
+                "product_ids": list(self._lines[index])
+            }
+            for index, discount in sorted(self._discounts.items())
+            if discount > 0
+        ]
+    
+    def clear(self) -> None:
+        """Azzera le promozioni, come per un carrello vuoto."""
+        self.discount_cents = 0
+        self._lines.clear()
+        self._discounts.clear()
+        self._line_discounts.clear()
+        self._product_discounts.clear()
+        self._subtotals.clear()
+        self._applied.clear()
+
+
+class ShoppingCart:
+    """Gestisce un carrello della spesa."""
+    
+    def __init__(self, promotion_engine: Optional[PromotionEngine] = None):
+        """
+        Inizializza un nuovo carrello vuoto.
+        
+        Args:
+            promotion_engine: Il motore delle promozioni da applicare al carrello
+        """
+        self.items: Dict[str, Tuple[Product, int]] = {}  # product_id -> (product, quantity)
+        self.discount_percent = 0
+        self.promotions = promotion_engine.create_state() if promotion_engine is not None else None
+        # Totali aggiornati a ogni modifica, così get_total e get_item_count non scorrono le righe;
+        # il subtotale è in centesimi interi, quindi non accumula errori di arrotondamento
+        self._subtotal_cents = 0
+        self._item_count = 0
+        # Versione dei prezzi (vedi Product.price_version) con cui sono stati calcolati i totali
+        self._price_version = Product.price_version
+    
+    def add_product(self, product: Product, quantity: int = 1) -> bool:
+        """
+        Aggiunge un prodotto al carrello.
+        
+        Args:
+            product: Il prodotto da aggiungere
+            quantity: La quantità da aggiungere
+            
+        Returns:
+            bool: True se il prodotto è stato aggiunto con successo
+            
+        Raises:
+            ValueError: Se la quantità è negativa o zero
+            ValueError: Se il prodotto non è disponibile nella quantità richiesta
+        """
+        if quantity <= 0:
+            raise ValueError("La quantità deve essere positiva")
+        
+        if not product.is_available(quantity):
+            raise ValueError(f"Quantità {quantity} non disponibile per {product.name}")
+        
+        self._refresh_prices()
+        if product.product_id in self.items:
+            current_product, current_quantity = self.items[product.product_id]
+            self.items[product.product_id] = (current_product, current_quantity + quantity)
+        else:
+            self.items[product.product_id] = (product, quantity)
+        
+        self._subtotal_cents += product.price_cents * quantity
+        self._item_count += quantity
+        if self.promotions is not None:
+            self.promotions.update(*self.items[product.product_id])
+        return True
+    
+    def remove_product(self, product_id: str, quantity: int = 1) -> bool:
+        """
+        Rimuove un prodotto dal carrello.
+        
+        Args:
+            product_id: L'ID del prodotto da rimuovere
+            quantity: La quantità da rimuovere
+            
+        Returns:
+            bool: True se il prodotto è stato rimosso con successo
+            
+        Raises:
+            ValueError: Se il prodotto non è nel carrello
+            ValueError: Se la quantità è maggiore di quella nel carrello
+        """
+        if product_id not in self.items:
+            raise ValueError(f"Prodotto con ID {product_id} non presente nel carrello")
+        
+        current_product, current_quantity = self.items[product_id]
+        
+        if quantity <= 0:
+            raise ValueError("La quantità da rimuovere deve essere positiva")
+        
+        if quantity > current_quantity:
+            raise ValueError(f"Quantità da rimuovere ({quantity}) maggiore di quella nel carrello ({current_quantity})")
+        
+        self._refresh_prices()
+        if quantity == current_quantity:
+            # Rimuovi completamente il prodotto
+            del self.items[product_id]
+        else:
+            # Riduci la quantità
+            self.items[product_id] = (current_product, current_quantity - quantity)
+        
+        self._subtotal_cents -= current_product.price_cents * quantity
+        self._item_count -= quantity
+        if self.promotions is not None:
+            self.promotions.update(current_product, current_quantity - quantity)
+        return True
+    
+    def get_total(self) -> float:
+        """
+        Calcola il totale del carrello.
+        
+        Returns:
+            float: Il totale del carrello, ricavato da quello esatto in centesimi
+        """
+        return from_cents(self.get_total_cents())
+    
+    def get_total_cents(self) -> int:
+        """
+        Calcola in tempo costante il totale del carrello in centesimi interi.
+        
+        Il subtotale e gli sconti delle promozioni sono aggiornati a ogni modifica del
+        carrello, con i prezzi attuali dei prodotti: se un prezzo è cambiato dall'ultimo
+        calcolo vengono ricalcolati una volta scorrendo le righe. Lo sconto percentuale
+        del carrello si applica dopo le promozioni, in Decimal e arrotondato al centesimo
+        più vicino.
+        
+        Returns:
+            int: Il totale del carrello in centesimi
+        """
+        self._refresh_prices()
+        total = self._subtotal_cents
+        if self.promotions is not None:
+            total = max(total - self.promotions.discount_cents, 0)
+        
+        # Applica lo sconto se presente
+        if self.discount_percent > 0:
+            total = discount_cents(total, self.discount_percent)
+        
+        return total
+    
+    def apply_discount(self, percent: float) -> bool:
+        """
+        Applica uno sconto percentuale al carrello.
+        
+        Args:
+            percent: La percentuale di sconto (0-100)
+            
+        Returns:
+            bool: True se lo sconto è stato applicato con successo
+            
+        Raises:
+            ValueError: Se la percentuale non è valida
+        """
+        if percent < 0 or percent > 100:
+            raise ValueError("La percentuale di sconto deve essere compresa tra 0 e 100")
+        
+        self.discount_percent = percent
+        return True
+    
+    def clear(self) -> bool:
+        """
+        Svuota il carrello.
+        
+        Returns:
+            bool: True se il carrello è stato svuotato con successo
+        """
+        self.items.clear()
+        self.discount_percent = 0
+        self._subtotal_cents = 0
+        self._item_count = 0
+        if self.promotions is not None:
+            self.promotions.clear()
+        return True
+    
+    def _refresh_prices(self) -> None:
+        """Ricalcola subtotale e promozioni con i prezzi attuali, se un prezzo è cambiato dall'ultimo calcolo."""
+        version = Product.price_version
+        if version == self._price_version:
+            return
+        # La versione si legge prima dei prezzi: un cambio concorrente verrà visto al calcolo successivo
+        self._price_version = version
+        self._subtotal_cents = sum(product.price_cents * quantity for product, quantity in self.items.values())
+        if self.promotions is not None:
+            self.promotions.clear()
+            for product, quantity in self.items.values():
+                self.promotions.update(product, quantity)
+    
+    def explain_promotions(self) -> List[Dict]:
+        """
+        Descrive le promozioni applicate al carrello.
+        
+        Returns:
+            List[Dict]: Nome, sconto in centesimi e prodotti interessati di ogni promozione applicata
+        """
+        return self.promotions.explain() if self.promotions is not None else []
+    
+    def get_item_count(self) -> int:
+        """
+        Ottiene il numero totale di articoli nel carrello.
+        
+        Returns:
+            int: Il numero totale di articoli
+        """
+        return self._item_count
+    
+    def checkout(self) -> List[Tuple[Product, int]]:
+        """
+        Prepara il checkout del carrello.
+        
+        Returns:
+            List[Tuple[Product, int]]: Lista di prodotti e quantità
+            
+        Raises:
+            ValueError: Se il carrello è vuoto
+        """
+        if not self.items:
+            raise ValueError("Impossibile completare il checkout: il carrello è vuoto")
+        
+        # Verifica che tutti i prodotti siano ancora disponibili
+        for product, quantity in self.items.values():
+            if not product.is_available(quantity):
+                raise ValueError(f"Prodotto {product.name} non più disponibile nella quantità richiesta")
+        
+        # Crea la lista di checkout
+        checkout_list = [(product, quantity) for product, quantity in self.items.values()]
+        
+        return checkout_list
+
+
+class PriceEngine:
+    """
+    Calcola prezzi e totali su molte righe o prodotti alla volta, con NumPy se disponibile.
+    
+    NumPy conviene solo per reprice e reprice_catalog, che lavorano direttamente sull'array
+    dei prezzi del catalogo. Per i totali del carrello le colonne di prezzi e quantità vanno
+    raccolte in Python da cart.items a ogni chiamata, e quella raccolta costa quanto il calcolo:
+    con o senza NumPy i tempi sono praticamente gli stessi (vedi benchmark.py pricing).
+    """
+    
+    def __init__(self, use_numpy: Optional[bool] = None):
+        """
+        Inizializza un nuovo motore dei prezzi.
+        
+        Args:
+            use_numpy: True per usare NumPy, False per il calcolo in puro Python,
+                None (default) per usare NumPy solo se è installato
+                
+        Raises:
+            ImportError: Se è richiesto NumPy ma non è installato
+        """
+        if use_numpy and np is None:
+            raise ImportError("NumPy non è installato")
+        
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+    
+    def line_totals_cents(self, cart: ShoppingCart) -> List[int]:
+        """
+        Calcola il totale in centesimi di ogni riga del carrello.
+        
+        Le colonne vengono raccolte da cart.items a ogni chiamata: NumPy non accelera
+        questo metodo in modo apprezzabile.
+        
+        Args:
+            cart: Il carrello della spesa
+            
+        Returns:
+            List[int]: I totali delle righe, nell'ordine di cart.items
+        """
+        prices, quantities = self._columns(cart)
+        if self.use_numpy:
+            return (np.array(prices, dtype=np.int64) * np.array(quantities, dtype=np.int64)).tolist()
+        return [price * quantity for price, quantity in zip(prices, quantities)]
+    
+    def cart_total_cents(self, cart: ShoppingCart) -> int:
+        """
+        Ricalcola da zero il totale in centesimi del carrello, sconto incluso.
+        
+        Il risultato coincide con ShoppingCart.get_total_cents; lo sconto delle promozioni
+        è quello già calcolato dal carrello. Come per line_totals_cents, il costo è dominato
+        dalla raccolta delle colonne da cart.items e NumPy non lo riduce in modo apprezzabile.
+        
+        Args:
+            cart: Il carrello della spesa
+            
+        Returns:
+            int: Il totale del carrello in centesimi
+        """
+        prices, quantities = self._columns(cart)
+        if self.use_numpy:
+            total = int(np.dot(np.array(prices, dtype=np.int64), np.array(quantities, dtype=np.int64)))
+        else:
+            total = sum(price * quantity for price, quantity in zip(prices, quantities))
+        
+        if cart.promotions is not None:
+            total = max(total - cart.promotions.discount_cents, 0)
+        if cart.discount_percent > 0:
+            total = discount_cents(total, cart.discount_percent)
+        return total
+    
+    def reprice(self, products: List[Product], percent: float) -> None:
+        """
+        Applica uno sconto percentuale al prezzo di tutti i prodotti indicati in un solo passaggio.
+        
+        I nuovi prezzi sono arrotondati al centesimo più vicino, come gli sconti del carrello.
+        Se i prodotti sono tutti dello stesso ProductCatalog, con NumPy il calcolo avviene
+        direttamente sull'array dei prezzi del catalogo (vedi reprice_catalog).
+        
+        I carrelli già aperti usano i nuovi prezzi: al primo calcolo successivo ricalcolano
+        subtotale e promozioni (vedi ShoppingCart.get_total_cents).
+        
+        Args:
+            products: I prodotti da riprezzare
+            percent: La percentuale di sconto, con al massimo due decimali (0-100, escluso 100)
+            
+        Raises:
+            ValueError: Se la percentuale non è valida
+        """
+        factor = self._factor(percent)
+        catalog = self._shared_catalog(products)
+        if self.use_numpy and catalog is not None:
+            positions = np.fromiter((product._position for product in products), dtype=np.intp, count=len(products))
+            with catalog._lock:
+                prices = np.frombuffer(catalog._prices, dtype=np.int64)
+                prices[positions] = self._discounted(prices[positions], factor)
+                del prices  # Finché la vista esiste l'array del catalogo non può crescere
+            return
+        
+        if self.use_numpy:
+            prices = np.fromiter((product.price_cents for product in products), dtype=np.int64, count=len(products))
+            new_prices = ((prices * factor + 5000) // 10000).tolist()
+        else:
+            new_prices = [(product.price_cents * factor + 5000) // 10000 for product in products]
+        
+        for product, price_cents in zip(products, new_prices):
+            # Un prezzo non può scendere a zero
+            product.price_cents = max(price_cents, 1)
+    
+    def reprice_catalog(self, catalog: "ProductCatalog", percent: float, category: Optional[str] = None) -> int:
+        """
+        Applica uno sconto percentuale ai prezzi di un intero catalogo (o di una sua categoria).
+        
+        Con NumPy l'array dei prezzi del catalogo viene letto e aggiornato in posto tramite
+        np.frombuffer, senza creare un oggetto per prodotto. Arrotondamento, prezzo minimo
+        ed effetto sui carrelli aperti sono gli stessi di reprice.
+        
+        Args:
+            catalog: Il catalogo da riprezzare
+            percent: La percentuale di sconto, con al massimo due decimali (0-100, escluso 100)
+            category: Se indicata, solo i prodotti di questa categoria
+            
+        Returns:
+            int: Il numero di prodotti riprezzati
+            
+        Raises:
+            ValueError: Se la percentuale non è valida
+        """
+        factor = self._factor(percent)
+        with catalog._lock:
+            if category is None:
+                selected = range(len(catalog._prices))
+            else:
+                selected = [position for position, product_category in enumerate(catalog._categories)
+                            if product_category == category]
+            
+            if self.use_numpy:
+                prices = np.frombuffer(catalog._prices, dtype=np.int64)
+                if category is None:
+                    prices[:] = self._discounted(prices, factor)
+                else:
+                    positions = np.array(selected, dtype=np.intp)
+                    prices[positions] = self._discounted(prices[positions], factor)
+                del prices  # Finché la vista esiste l'array del catalogo non può crescere
+            else:
+                for position in selected:
+                    catalog._prices[position] = max((catalog._prices[position] * factor + 5000) // 10000, 1)
+        Product.price_version += 1
+        return len(selected)
+    
+    def _factor(self, percent: float) -> int:
+        """Converte una percentuale di sconto nel fattore intero (in punti base) da applicare ai prezzi."""
+        basis_points = Decimal(str(percent)) * 100
+        if not 0 <= basis_points < 10000 or basis_points != basis_points.to_integral_value():
+            raise ValueError("La percentuale deve essere compresa tra 0 e 100 (escluso) con al massimo due decimali")
+        # Aritmetica intera: (prezzo * (10000 - bp) + 5000) // 10000 arrotonda a metà per eccesso
+        return 10000 - int(basis_points)
+    
+    @staticmethod
+    def _discounted(prices, factor: int):
+        """Applica il fattore a un array NumPy di prezzi, senza scendere sotto un centesimo."""
+        return np.maximum((prices * factor + 5000) // 10000, 1)
+    
+    @staticmethod
+    def _shared_catalog(products: List[Product]) -> Optional["ProductCatalog"]:
+        """Restituisce il catalogo comune se tutti i prodotti sono CatalogProduct dello stesso catalogo."""
+        if not products or not isinstance(products[0], CatalogProduct):
+            return None
+        catalog = products[0]._catalog
+        if all(isinstance(product, CatalogProduct) and product._catalog is catalog for product in products):
+            return catalog
+        return None
+    
+    def _columns(self, cart: ShoppingCart) -> Tuple[List[int], List[int]]:
+        """
+        Estrae dal carrello le colonne dei prezzi in centesimi e delle quantità.
+        
+        Le colonne non sono tenute nel carrello perché i prezzi si leggono dai prodotti,
+        che possono essere riprezzati in qualsiasi momento (vedi reprice).
+        """
+        prices = [product.price_cents for product, _ in cart.items.values()]
+        quantities = [quantity for _, quantity in cart.items.values()]
+        return prices, quantities
+
+
+class PaymentProcessor:
+    """Gestisce l'elaborazione dei pagamenti."""
+    
+    def __init__(self, api_key: str = "test_key"):
+        """
+        Inizializza un nuovo processore di pagamenti.
+        
+        Args:
+            api_key: La chiave API per il servizio di pagamento
+        """
+        self.api_key = api_key
+    
+    def process_payment(self, amount_cents: int, payment_details: Dict) -> Dict:
+        """
+        Elabora un pagamento.
+        
+        Args:
+            amount_cents: L'importo da pagare, in centesimi interi
+            payment_details: I dettagli del pagamento
+            
+        Returns:
+            Dict: Risultato del pagamento
+            
+        Raises:
+            ValueError: Se l'importo o i dettagli di pagamento non sono validi
+            RuntimeError: Se il pagamento fallisce
+        """
+        self._validate_amount(amount_cents)
+        self._validate_payment_details(payment_details)
+        
+        # Simulazione di chiamata API a un servizio di pagamento
+        # In un'implementazione reale, qui ci sarebbe una chiamata HTTP a un gateway di pagamento
+        print(f"Elaborazione pagamento di €{from_cents(amount_cents):.2f}...")
+        
+        # Simulazione di latenza di rete
+        time.sleep(0.5)
+        
+        return self._payment_response(amount_cents)
+    
+    def process_payments(self, batch: List[Tuple[int, Dict]]) -> List[Dict]:
+        """
+        Elabora più pagamenti con un'unica chiamata al gateway.
+        
+        A differenza di process_payment, un pagamento fallito non solleva eccezioni:
+        ogni elemento ha il proprio risultato, con "success" a False e un messaggio
+        in "error" in caso di fallimento; se i dettagli del pagamento non sono validi
+        il risultato ha anche "invalid" a True (dove process_payment solleverebbe ValueError).
+        
+        Args:
+            batch: Lista di coppie (importo in centesimi interi, dettagli del pagamento)
+            
+        Returns:
+            List[Dict]: Un risultato per ogni pagamento, nello stesso ordine del lotto
+        """
+        results: List[Optional[Dict]] = []
+        valid = 0
+        for amount_cents, payment_details in batch:
+            try:
+                self._validate_amount(amount_cents)
+                self._validate_payment_details(payment_details)
+            except ValueError as e:
+                results.append({"success": False, "error": str(e), "invalid": True, "amount_cents": amount_cents})
+            else:
+                results.append(None)
+                valid += 1
+        
+        if valid:
+            # Simulazione di una sola chiamata API per tutto il lotto
+            print(f"Elaborazione di {valid} pagamenti in un unico lotto...")
+            
+            # Simulazione di latenza di rete, pagata una sola volta
+            time.sleep(0.5)
+        
+        for index, (amount_cents, _) in enumerate(batch):
+            if results[index] is None:
+                try:
+                    results[index] = self._payment_response(amount_cents)
+                except RuntimeError as e:
+                    results[index] = {"success": False, "error": str(e), "amount_cents": amount_cents}
+        
+        return results
+    
+    async def process_payment_async(self, amount_cents: int, payment_details: Dict) -> Dict:
+        """
+        Elabora un pagamento senza bloccare l'event loop durante la latenza di rete.
+        
+        Args:
+            amount_cents: L'importo da pagare, in centesimi interi
+            payment_details: I dettagli del pagamento
+            
+        Returns:
+            Dict: Risultato del pagamento
+            
+        Raises:
+            ValueError: Se l'importo o i dettagli di pagamento non sono validi
+            RuntimeError: Se il pagamento fallisce
+        """
+        self._validate_amount(amount_cents)
+        self._validate_payment_details(payment_details)
+        
+        print(f"Elaborazione pagamento di €{from_cents(amount_cents):.2f}...")
+        
+        # Simulazione di latenza di rete: mentre si attende, l'event loop serve altri pagamenti
+        await asyncio.sleep(0.5)
+        
+        return self._payment_response(amount_cents)
+    
+    def refund_payment(self, transaction_id: str) -> Dict:
+        """
+        Effettua il rimborso di un pagamento.
+        
+        Args:
+            transaction_id: ID della transazione da rimborsare
+            
+        Returns:
+            Dict: Risultato del rimborso
+            
+        Raises:
+            ValueError: Se l'ID della transazione non è valido
+            RuntimeError: Se il rimborso fallisce
+        """
+        if not transaction_id.startswith("txn_"):
+            raise ValueError("ID transazione non valido")
+        
+        # Simulazione di chiamata API per il rimborso
+        print(f"Elaborazione rimborso per la transazione {transaction_id}...")
+        
+        # Simulazione di latenza di rete
+        time.sleep(0.5)
+        
+        return self._refund_response(transaction_id)
+    
+    async def refund_payment_async(self, transaction_id: str) -> Dict:
+        """
+        Effettua il rimborso di un pagamento senza bloccare l'event loop.
+        
+        Args:
+            transaction_id: ID della transazione da rimborsare
+            
+        Returns:
+            Dict: Risultato del rimborso
+            
+        Raises:
+            ValueError: Se l'ID della transazione non è valido
+            RuntimeError: Se il rimborso fallisce
+        """
+        if not transaction_id.startswith("txn_"):
+            raise ValueError("ID transazione non valido")
+        
+        print(f"Elaborazione rimborso per la transazione {transaction_id}...")
+        
+        # Simulazione di latenza di rete
+        await asyncio.sleep(0.5)
+        
+        return self._refund_response(transaction_id)
+    
+    def _validate_amount(self, amount_cents: int) -> None:
+        """Verifica che l'importo sia un numero intero positivo di centesimi."""
+        if isinstance(amount_cents, bool) or not isinstance(amount_cents, int) or amount_cents <= 0:
+            raise ValueError(f"L'importo deve essere un numero intero positivo di centesimi: {amount_cents!r}")
+    
+    def _validate_payment_details(self, payment_details: Dict) -> None:
+        """Verifica che i dettagli di pagamento contengano tutti i campi obbligatori."""
+        required_fields = ["card_number", "expiry", "cvv"]
+        for field in required_fields:
+            if field not in payment_details:
+                raise ValueError(f"Campo obbligatorio mancante: {field}")
+    
+    def _payment_response(self, amount_cents: int) -> Dict:
+        """Simula la risposta del gateway a un pagamento (90% di successo, 10% di fallimento)."""
+        if random.random() < 0.9:
+            return {
+                "success": True,
+                "transaction_id": f"txn_{random.randint(100000, 999999)}",
+                "amount": from_cents(amount_cents),
+                "amount_cents": amount_cents,
+                "timestamp": time.time()
+            }
+        else:
+            raise RuntimeError("Pagamento fallito: la transazione è stata rifiutata")
+    
+    def _refund_response(self, transaction_id: str) -> Dict:
+        """Simula la risposta del gateway a un rimborso (95% di successo, 5% di fallimento)."""
+        if random.random() < 0.95:
+            return {
+                "success": True,
+                "refund_id": f"ref_{random.randint(100000, 999999)}",
+                "transaction_id": transaction_id,
+                "timestamp": time.time()
+            }
+        else:
+            raise RuntimeError("Rimborso fallito: impossibile elaborare la richiesta")
+
+
+class PaymentBatcher:
+    """Raggruppa i pagamenti richiesti in una breve finestra temporale in un unico lotto."""
+    
+    def __init__(self, payment_processor: PaymentProcessor, window: float = 0.05, max_batch_size: int = 100):
+        """
+        Inizializza un nuovo raggruppatore di pagamenti.
+        
+        Args:
+            payment_processor: Il processore di pagamenti da utilizzare
+            window: Attesa massima (in secondi) per raccogliere altri pagamenti nel lotto
+            max_batch_size: Numero massimo di pagamenti per lotto
+            
+        Raises:
+            ValueError: Se la finestra è negativa o la dimensione del lotto non è positiva
+        """
+        if window < 0:
+            raise ValueError("La finestra di raggruppamento non può essere negativa")
+        if max_batch_size <= 0:
+            raise ValueError("La dimensione del lotto deve essere positiva")
+        
+        self.payment_processor = payment_processor
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._condition = threading.Condition()
+        self._pending: List[Dict] = []
+        self._collecting = False  # True mentre un thread sta raccogliendo il prossimo lotto
+    
+    def submit(self, amount_cents: int, payment_details: Dict) -> Dict:
+        """
+        Accoda un pagamento e attende il risultato del lotto in cui viene inviato.
+        
+        Il primo thread che trova la coda libera raccoglie i pagamenti per al più
+        `window` secondi (o finché il lotto è pieno) e li invia con process_payments.
+        
+        Args:
+            amount_cents: L'importo da pagare, in centesimi interi
+            payment_details: I dettagli del pagamento
+            
+        Returns:
+            Dict: Risultato del pagamento
+            
+        Raises:
+            ValueError: Se l'importo o i dettagli di pagamento non sono validi
+            RuntimeError: Se il pagamento fallisce
+        """
+        entry = {"amount_cents": amount_cents, "payment_details": payment_details, "result": None}
+        with self._condition:
+            self._pending.append(entry)
+            self._condition.notify_all()
+            while entry["result"] is None:
+                if self._collecting:
+                    self._condition.wait()
+                    continue
+                
+                # Nessuno sta raccogliendo: questo thread prepara il prossimo lotto
+                self._collecting = True
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:len(batch)]
+                # Mentre questo lotto viene inviato, un altro thread può già raccogliere il successivo
+                self._collecting = False
+                self._condition.notify_all()
+                
+                self._condition.release()
+                try:
+                    results = self._send(batch)
+                finally:
+                    self._condition.acquire()
+                
+                for batch_entry, result in zip(batch, results):
+                    batch_entry["result"] = result
+                self._condition.notify_all()
+        
+        result = entry["result"]
+        if result.get("invalid"):
+            # Errore del chiamante, come per process_payment
+            raise ValueError(result["error"])
+        if not result["success"]:
+            raise RuntimeError(result.get("error", "Pagamento fallito"))
+        return result
+    
+    def _send(self, batch: List[Dict]) -> List[Dict]:
+        """Invia un lotto al processore; un errore del gateway fa fallire tutti i pagamenti del lotto."""
+        try:
+            return self.payment_processor.process_payments(
+                [(entry["amount_cents"], entry["payment_details"]) for entry in batch]
+            )
+        except Exception as e:
+            return [{"success": False, "error": str(e), "amount_cents": entry["amount_cents"]} for entry in batch]
+
+
+class PaymentTimeoutError(RuntimeError):
+    """Il gateway non ha risposto in tempo: l'esito della chiamata non è noto al momento dell'errore."""
+
+
+class ResilientPaymentProcessor:
+    """Protegge un PaymentProcessor con timeout, tentativi ripetuti, circuit breaker e limite di concorrenza."""
+    
+    def __init__(self, payment_processor: PaymentProcessor, timeout: float = 2.0, max_retries: int = 3,
+                 base_delay: float = 0.1, max_delay: float = 2.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, max_concurrency: int = 10,
+                 on_late_payment: Optional[Callable[[Dict], None]] = None):
+        """
+        Inizializza un nuovo processore di pagamenti resiliente.
+        
+        Args:
+            payment_processor: Il processore di pagamenti da proteggere
+            timeout: Tempo massimo (in secondi) per ogni chiamata al gateway
+            max_retries: Numero massimo di nuovi tentativi dopo un fallimento
+            base_delay: Attesa di base (in secondi) prima del primo nuovo tentativo
+            max_delay: Attesa massima (in secondi) tra due tentativi
+            failure_threshold: Fallimenti consecutivi dopo i quali il circuito si apre
+            reset_timeout: Tempo (in secondi) dopo il quale un circuito aperto prova una nuova chiamata
+            max_concurrency: Numero massimo di chiamate contemporanee; le altre vengono rifiutate subito
+            on_late_payment: Chiamata con il risultato di un pagamento riuscito dopo il suo timeout, per
+                la riconciliazione (default: il pagamento viene rimborsato)
+            
+        Raises:
+            ValueError: Se uno dei parametri non è valido
+        """
+        if timeout <= 0 or reset_timeout <= 0:
+            raise ValueError("Timeout e tempo di reset devono essere positivi")
+        if max_retries < 0 or base_delay < 0 or max_delay < 0:
+            raise ValueError("Tentativi e attese non possono essere negativi")
+        if failure_threshold <= 0 or max_concurrency <= 0:
+            raise ValueError("Soglia di fallimenti e concorrenza devono essere positive")
+        
+        self.payment_processor = payment_processor
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_concurrency = max_concurrency
+        self.on_late_payment = on_late_payment if on_late_payment is not None else self._refund_late_payment
+        self.unrefunded_payments: List[Dict] = []  # Pagamenti arrivati dopo il timeout e non rimborsati
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._state = "closed"  # closed, open o half_open
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._latency_samples = 0
+        self._metrics = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "late_payments": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0
+        }
+    
+    def process_payment(self, amount_cents: int, payment_details: Dict) -> Dict:
+        """
+        Elabora un pagamento tramite il processore protetto.
+        
+        Un pagamento andato in timeout non viene ripetuto, perché il gateway
+        potrebbe averlo comunque addebitato: se l'addebito arriva dopo il timeout
+        viene passato a on_late_payment, che per default lo rimborsa.
+        
+        Args:
+            amount_cents: L'importo da pagare, in centesimi interi
+            payment_details: I dettagli del pagamento
+            
+        Returns:
+            Dict: Risultato del pagamento
+            
+        Raises:
+            ValueError: Se l'importo o i dettagli di pagamento non sono validi
+            PaymentTimeoutError: Se il gateway non risponde in tempo
+            RuntimeError: Se il pagamento fallisce o viene rifiutato dal circuit breaker
+        """
+        return self._call(self.payment_processor.process_payment, amount_cents, payment_details,
+                          late_result=self._late_payment)
+    
+    def process_payments(self, batch: List[Tuple[int, Dict]]) -> List[Dict]:
+        """
+        Elabora un lotto di pagamenti tramite il processore protetto (senza nuovi tentativi).
+        
+        Args:
+            batch: Lista di coppie (importo in centesimi interi, dettagli del pagamento)
+            
+        Returns:
+            List[Dict]: Un risultato per ogni pagamento, nello stesso ordine del lotto
+            
+        Raises:
+            RuntimeError: Se il gateway non risponde o la chiamata viene rifiutata
+        """
+        return self._call(self.payment_processor.process_payments, batch, retry=False)
+    
+    def refund_payment(self, transaction_id: str) -> Dict:
+        """
+        Effettua un rimborso tramite il processore protetto.
+        
+        Args:
+            transaction_id: ID della transazione da rimborsare
+            
+        Returns:
+            Dict: Risultato del rimborso
+            
+        Raises:
+            ValueError: Se l'ID della transazione non è valido
+            RuntimeError: Se il rimborso fallisce, va in timeout o viene rifiutato dal circuit breaker
+        """
+        return self._call(self.payment_processor.refund_payment, transaction_id)
+    
+    def get_metrics(self) -> Dict:
+        """
+        Ottiene le metriche delle chiamate al gateway.
+        
+        Returns:
+            Dict: Chiamate, successi, fallimenti, nuovi tentativi, timeout, chiamate rifiutate,
+                pagamenti riusciti dopo il timeout, stato del circuit breaker e latenza media e massima (in secondi)
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["breaker_state"] = self._state
+            samples = self._latency_samples
+        total_latency = metrics.pop("total_latency")
+        metrics["avg_latency"] = total_latency / samples if samples else 0.0
+        return metrics
+    
+    def _late_payment(self, result: Dict) -> None:
+        """Gestisce il risultato di un pagamento arrivato dopo il timeout: un addebito riuscito va riconciliato."""
+        if not result or not result.get("success"):
+            return
+        with self._lock:
+            self._metrics["late_payments"] += 1
+        self.on_late_payment(result)
+    
+    def _refund_late_payment(self, result: Dict) -> None:
+        """Rimborsa un pagamento arrivato dopo il timeout; se il rimborso fallisce lo tiene in unrefunded_payments."""
+        try:
+            self.payment_processor.refund_payment(result["transaction_id"])
+        except Exception:
+            with self._lock:
+                self.unrefunded_payments.append(result)
+    
+    def _call(self, func, *args, retry: bool = True, late_result: Optional[Callable[[Dict], None]] = None):
+        """Esegue una chiamata al gateway applicando tutte le protezioni."""
+        # Limite di concorrenza: se il gateway è lento si rifiuta subito invece di accodare thread.
+        # Uno slot corrisponde a un thread del pool, quindi una chiamata accettata non resta mai in coda
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics["rejected"] += 1
+            raise RuntimeError("Troppe richieste in corso verso il gateway dei pagamenti")
+        
+        timed_out = False
+        try:
+            attempt = 0
+            while True:
+                self._check_breaker()
+                try:
+                    return self._call_once(func, *args, late_result=late_result)
+                except FuturesTimeoutError:
+                    # Lo slot verrà liberato da _call_once quando la chiamata al gateway terminerà
+                    timed_out = True
+                    raise PaymentTimeoutError("Timeout del gateway dei pagamenti: esito sconosciuto") from None
+                except RuntimeError:
+                    if not retry or attempt >= self.max_retries:
+                        raise
+                
+                attempt += 1
+                with self._lock:
+                    self._metrics["retries"] += 1
+                # Backoff esponenziale con jitter, per non far ripartire tutti i client insieme
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                time.sleep(random.uniform(0, delay))
+        finally:
+            if not timed_out:
+                self._slots.release()
+    
+    def _call_once(self, func, *args, late_result: Optional[Callable[[Dict], None]] = None):
+        """
+        Esegue un singolo tentativo con timeout, aggiornando metriche e circuit breaker.
+        
+        In caso di timeout la chiamata viene annullata se non è ancora partita; altrimenti
+        il gateway potrebbe ancora completarla, quindi lo slot di concorrenza del chiamante
+        resta occupato e viene liberato solo quando la chiamata termina davvero, dopo aver
+        passato a late_result il risultato arrivato in ritardo.
+        """
+        with self._lock:
+            self._metrics["calls"] += 1
+        
+        start = time.monotonic()
+        future = self._executor.submit(func, *args)
+        try:
+            result = future.result(timeout=self.timeout)
+        except ValueError:
+            # Errore del chiamante, non del gateway: non conta per il circuit breaker
+            self._record_latency(start)
+            with self._lock:
+                if self._state == "half_open":
+                    # La prova non dice nulla sul gateway: la prossima chiamata potrà riprovare
+                    self._state = "open"
+            raise
+        except FuturesTimeoutError:
+            def finished(done: Future) -> None:
+                try:
+                    if late_result is not None and not done.cancelled() and done.exception() is None:
+                        late_result(done.result())
+                finally:
+                    self._slots.release()
+            
+            future.cancel()
+            future.add_done_callback(finished)
+            self._record_failure(start, timeout=True)
+            raise
+        except Exception:
+            self._record_failure(start)
+            raise
+        
+        self._record_latency(start)
+        with self._lock:
+            self._metrics["successes"] += 1
+            self._consecutive_failures = 0
+            self._state = "closed"
+        return result
+    
+    def _check_breaker(self) -> None:
+        """Solleva RuntimeError se il circuito è aperto; dopo il tempo di reset lascia passare una prova."""
+        with self._lock:
+            if self._state == "closed":
+                return
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+                return
+            self._metrics["rejected"] += 1
+        raise RuntimeError("Circuito aperto: il gateway dei pagamenti non è disponibile")
+    
+    def _record_latency(self, start: float) -> None:
+        """Registra la latenza di una chiamata completata."""
+        latency = time.monotonic() - start
+        with self._lock:
+            self._latency_samples += 1
+            self._metrics["total_latency"] += latency
+            self._metrics["max_latency"] = max(self._metrics["max_latency"], latency)
+    
+    def _record_failure(self, start: float, timeout: bool = False) -> None:
+        """Registra un fallimento e apre il circuito se necessario."""
+        self._record_latency(start)
+        with self._lock:
+            self._metrics["failures"] += 1
+            if timeout:
+                self._metrics["timeouts"] += 1
+            self._consecutive_failures += 1
+            if self._state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Limita il numero di chiamate al secondo con un token bucket, condivisibile tra più thread."""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Inizializza un nuovo limitatore.
+        
+        Args:
+            rate: Numero massimo di chiamate al secondo (la quota del gateway)
+            burst: Numero di chiamate consentite di seguito dopo un periodo di inattività
+                (default: una chiamata, o rate se maggiore)
+                
+        Raises:
+            ValueError: Se rate o burst non sono positivi
+        """
+        if rate <= 0:
+            raise ValueError("Il numero di chiamate al secondo deve essere positivo")
+        if burst is not None and burst <= 0:
+            raise ValueError("Il burst deve essere positivo")
+        
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Attende, se necessario, finché una nuova chiamata rientra nella quota."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            
+            # L'attesa avviene fuori dal lock, così gli altri thread possono ricalcolare la quota
+            time.sleep(wait_time)
+
+
+class StockReservationManager:
+    """Riserva temporaneamente lo stock dei prodotti durante il checkout."""
+    
+    def __init__(self, ttl: float = 900.0, inventory: Optional["SQLiteStore"] = None):
+        """
+        Inizializza un nuovo gestore delle prenotazioni di stock.
+        
+        Args:
+            ttl: Durata predefinita (in secondi) di una prenotazione non confermata
+            inventory: Inventario condiviso su cui riservare lo stock (ad esempio tra più
+                processi); se assente lo stock viene riservato sui prodotti in memoria
+        """
+        if ttl <= 0:
+            raise ValueError("La durata della prenotazione deve essere positiva")
+        
+        self.ttl = ttl
+        self.inventory = inventory
+        self._locks: Dict[str, threading.Lock] = {}  # Un lock per prodotto: SKU diversi non si bloccano a vicenda
+        self._locks_guard = threading.Lock()
+        self._holds: Dict[str, Tuple[List[Tuple[Product, int]], float]] = {}  # id -> (articoli, scadenza)
+        self._holds_guard = threading.Lock()
+        self._next_id = itertools.count(1)
+    
+    def hold(self, items: List[Tuple[Product, int]], ttl: Optional[float] = None) -> str:
+        """
+        Riserva atomicamente lo stock per una lista di prodotti.
+        
+        O tutte le quantità vengono riservate, o nessuna.
+        
+        Args:
+            items: Lista di prodotti e quantità da riservare
+            ttl: Durata della prenotazione in secondi (default: quella del gestore)
+            
+        Returns:
+            str: L'ID della prenotazione, da confermare con commit o annullare con release
+            
+        Raises:
+            ValueError: Se uno dei prodotti non è disponibile nella quantità richiesta
+        """
+        self.release_expired()
+        items = self._merge_items(items)
+        
+        if self.inventory is not None:
+            if not self.inventory.reserve(items):
+                raise ValueError("Quantità non disponibile per uno o più prodotti")
+        else:
+            with self._locked(product for product, _ in items):
+                for product, quantity in items:
+                    if not product.is_available(quantity):
+                        raise ValueError(f"Quantità non disponibile per {product.name}")
+                # I lock del gestore non fermano chi modifica il catalogo direttamente (ad esempio
+                # reserve_many): per i CatalogProduct decide reserve, atomico sul catalogo, e se
+                # lo stock è sparito nel frattempo le quantità già riservate vengono restituite
+                reserved: List[Tuple[Product, int]] = []
+                try:
+                    for product, quantity in items:
+                        product.reserve(quantity)
+                        reserved.append((product, quantity))
+                except ValueError:
+                    for product, quantity in reserved:
+                        product.restock(quantity)
+                    raise
+        
+        reservation_id = f"hold_{next(self._next_id)}"
+        with self._holds_guard:
+            self._holds[reservation_id] = (items, time.monotonic() + (ttl if ttl is not None else self.ttl))
+        return reservation_id
+    
+    def commit(self, reservation_id: str) -> bool:
+        """
+        Conferma una prenotazione: lo stock riservato resta definitivamente venduto.
+        
+        Args:
+            reservation_id: L'ID della prenotazione
+            
+        Returns:
+            bool: True se la prenotazione è stata confermata, False se era già scaduta o annullata
+        """
+        with self._holds_guard:
+            return self._holds.pop(reservation_id, None) is not None
+    
+    def release(self, reservation_id: str) -> bool:
+        """
+        Annulla una prenotazione restituendo lo stock riservato.
+        
+        Args:
+            reservation_id: L'ID della prenotazione
+            
+        Returns:
+            bool: True se lo stock è stato restituito, False se la prenotazione non esiste più
+        """
+        with self._holds_guard:
+            hold = self._holds.pop(reservation_id, None)
+        if hold is None:
+            return False
+        
+        self._restock(hold[0])
+        return True
+    
+    def release_expired(self) -> int:
+        """
+        Annulla tutte le prenotazioni scadute.
+        
+        Returns:
+            int: Il numero di prenotazioni annullate
+        """
+        now = time.monotonic()
+        with self._holds_guard:
+            expired = [reservation_id for reservation_id, (_, expires_at) in self._holds.items() if expires_at <= now]
+            holds = [self._holds.pop(reservation_id) for reservation_id in expired]
+        
+        for items, _ in holds:
+            self._restock(items)
+        return len(holds)
+    
+    def restock(self, items: List[Tuple[Product, int]]) -> None:
+        """
+        Restituisce allo stock, in un'unica operazione, le quantità di più prodotti (ad esempio di ordini annullati).
+        
+        Args:
+            items: Lista di prodotti e quantità da restituire (anche con prodotti ripetuti)
+            
+        Raises:
+            ValueError: Se una quantità non è positiva
+        """
+        if items:
+            self._restock(self._merge_items(items))
+    
+    def _restock(self, items: List[Tuple[Product, int]]) -> None:
+        """Restituisce allo stock le quantità indicate, sotto i lock dei prodotti."""
+        if self.inventory is not None:
+            self.inventory.restock(items)
+            return
+        with self._locked(product for product, _ in items):
+            for product, quantity in items:
+                product.restock(quantity)
+    
+    def _merge_items(self, items: List[Tuple[Product, int]]) -> List[Tuple[Product, int]]:
+        """Somma le quantità dello stesso prodotto e ordina per ID (ordine fisso dei lock)."""
+        merged: Dict[str, Tuple[Product, int]] = {}
+        for product, quantity in items:
+            if quantity <= 0:
+                raise ValueError("La quantità deve essere positiva")
+            current = merged.get(product.product_id)
+            merged[product.product_id] = (product, quantity + (current[1] if current else 0))
+        return [merged[product_id] for product_id in sorted(merged)]
+    
+    def _lock_for(self, product: Product) -> threading.Lock:
+        """Restituisce il lock associato a un prodotto, creandolo se necessario."""
+        lock = self._locks.get(product.product_id)
+        if lock is None:
+            with self._locks_guard:
+                lock = self._locks.setdefault(product.product_id, threading.Lock())
+        return lock
+    
+    @contextmanager
+    def _locked(self, products):
+        """Acquisisce i lock dei prodotti in ordine di ID, per evitare deadlock."""
+        locks = []
+        for product in sorted(set(products), key=lambda product: product.product_id):
+            lock = self._lock_for(product)
+            if lock not in locks:
+                locks.append(lock)
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+class IdempotencyCache:
+    """Cache limitata e con scadenza che associa le chiavi di idempotenza agli ordini completati."""
+    
+    def __init__(self, max_size: int = 10000, ttl: float = 86400.0):
+        """
+        Inizializza una nuova cache di idempotenza.
+        
+        Args:
+            max_size: Numero massimo di chiavi conservate (le meno recenti vengono scartate)
+            ttl: Durata (in secondi) per cui una chiave resta valida
+            
+        Raises:
+            ValueError: Se la dimensione o la durata non sono positive
+        """
+        if max_size <= 0:
+            raise ValueError("La dimensione della cache deve essere positiva")
+        if ttl <= 0:
+            raise ValueError("La durata delle chiavi deve essere positiva")
+        
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()  # chiave -> (ordine, scadenza)
+        self._in_flight: Set[str] = set()
+        self._condition = threading.Condition()
+    
+    def claim(self, key: str) -> Optional[Dict]:
+        """
+        Cerca l'ordine associato a una chiave, oppure la riserva per il chiamante.
+        
+        Se un'altra richiesta con la stessa chiave è in corso, attende che termini.
+        
+        Args:
+            key: La chiave di idempotenza
+            
+        Returns:
+            Optional[Dict]: L'ordine già completato, oppure None se il chiamante deve
+                elaborare la richiesta e poi chiamare complete
+        """
+        with self._condition:
+            while True:
+                order = self._lookup(key)
+                if order is not None:
+                    return order
+                if key not in self._in_flight:
+                    self._in_flight.add(key)
+                    return None
+                self._condition.wait()
+    
+    def complete(self, key: str, order: Optional[Dict] = None) -> None:
+        """
+        Rilascia una chiave riservata con claim, memorizzando l'ordine se completato.
+        
+        Se l'ordine è None (richiesta fallita) la chiave torna libera e una richiesta
+        in attesa potrà riprovare.
+        
+        Args:
+            key: La chiave di idempotenza
+            order: L'ordine completato, o None se la richiesta è fallita
+        """
+        with self._condition:
+            self._in_flight.discard(key)
+            if order is not None:
+                self._entries[key] = (order, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            self._condition.notify_all()
+    
+    def _lookup(self, key: str) -> Optional[Dict]:
+        """Restituisce l'ordine associato alla chiave se non è scaduto."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        order, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return order
+
+
+class OrderJournal:
+    """Giornale persistente append-only degli ordini, diviso in segmenti JSONL."""
+    
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, fsync_every: int = 100):
+        """
+        Apre (o crea) un giornale degli ordini e ricostruisce l'indice dei segmenti esistenti.
+        
+        Args:
+            directory: La cartella che contiene i segmenti
+            segment_size: Dimensione (in byte) oltre la quale si passa a un nuovo segmento
+            fsync_every: Numero di scritture dopo cui i dati vengono forzati su disco
+            
+        Raises:
+            ValueError: Se la dimensione dei segmenti o la frequenza di fsync non sono positive
+        """
+        if segment_size <= 0 or fsync_every <= 0:
+            raise ValueError("Dimensione dei segmenti e frequenza di fsync devono essere positive")
+        
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_every = fsync_every
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int]] = {}  # order_id -> (segmento, offset) dell'ultima versione
+        self._unsynced = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(
+            int(name[len("orders-"):-len(".jsonl")])
+            for name in os.listdir(directory)
+            if name.startswith("orders-") and name.endswith(".jsonl")
+        )
+        for segment in segments:
+            self._load_segment(segment)
+        
+        self._segment = segments[-1] if segments else 1
+        self._file = open(self._segment_path(self._segment), "ab")
+    
+    def __len__(self) -> int:
+        """Restituisce il numero di ordini distinti nel giornale."""
+        return len(self._index)
+    
+    def append(self, order: Dict) -> None:
+        """
+        Aggiunge un ordine (o una sua nuova versione) in fondo al giornale.
+        
+        Args:
+            order: L'ordine da salvare; deve essere serializzabile in JSON
+        """
+        line = json.dumps(dict(order), separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            offset = self._file.tell()
+            if offset > 0 and offset + len(line) > self.segment_size:
+                self._rotate()
+                offset = 0
+            
+            self._file.write(line)
+            self._index[order["order_id"]] = (self._segment, offset)
+            
+            # fsync a lotti: un solo accesso al disco ogni fsync_every scritture
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+    
+    def read(self, order_id: str) -> Optional[Dict]:
+        """
+        Legge l'ultima versione di un ordine dal disco.
+        
+        Args:
+            order_id: L'ID dell'ordine
+            
+        Returns:
+            Optional[Dict]: L'ordine o None se non è nel giornale
+        """
+        with self._lock:
+            position = self._index.get(order_id)
+            if position is None:
+                return None
+            segment, offset = position
+            if segment == self._segment:
+                self._file.flush()  # L'ordine potrebbe essere ancora nel buffer di scrittura
+        
+        with open(self._segment_path(segment), "rb") as segment_file:
+            segment_file.seek(offset)
+            return json.loads(segment_file.readline())
+    
+    def iter_orders(self) -> Iterator[Dict]:
+        """
+        Scorre l'ultima versione di tutti gli ordini, leggendo ogni segmento una sola volta dall'inizio alla fine.
+        
+        Gli ordini arrivano nell'ordine in cui è stata scritta la loro ultima versione: un ordine
+        aggiornato (ad esempio annullato) arriva dopo quelli aggiunti prima dell'aggiornamento.
+        Le versioni superate vengono saltate senza decodificarle.
+        
+        Yields:
+            Dict: Gli ordini letti dal disco uno alla volta
+        """
+        with self._lock:
+            latest: Dict[int, Set[int]] = {}  # segmento -> offset delle ultime versioni
+            for segment, offset in self._index.values():
+                latest.setdefault(segment, set()).add(offset)
+            self._file.flush()
+        
+        for segment in sorted(latest):
+            offsets = latest[segment]
+            with open(self._segment_path(segment), "rb") as segment_file:
+                offset = 0
+                for line in segment_file:
+                    if offset in offsets:
+                        yield json.loads(line)
+                    offset += len(line)
+    
+    def sync(self) -> None:
+        """Forza su disco tutte le scritture in sospeso."""
+        with self._lock:
+            self._sync()
+    
+    def close(self) -> None:
+        """Forza su disco le scritture in sospeso e chiude il segmento corrente."""
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+    
+    def _segment_path(self, segment: int) -> str:
+        """Restituisce il percorso del file di un segmento."""
+        return os.path.join(self.directory, f"orders-{segment:06d}.jsonl")
+    
+    def _load_segment(self, segment: int) -> None:
+        """Indicizza gli ordini di un segmento; una riga finale incompleta (scrittura interrotta) viene scartata."""
+        path = self._segment_path(segment)
+        with open(path, "rb") as segment_file:
+            offset = 0
+            for line in segment_file:
+                if not line.endswith(b"\n"):
+                    break
+                self._index[json.loads(line)["order_id"]] = (segment, offset)
+                offset += len(line)
+        
+        if offset < os.path.getsize(path):
+            with open(path, "r+b") as segment_file:
+                segment_file.truncate(offset)
+    
+    def _rotate(self) -> None:
+        """Chiude il segmento corrente e ne apre uno nuovo."""
+        self._sync()
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "ab")
+    
+    def _sync(self) -> None:
+        """Svuota il buffer e chiama fsync sul segmento corrente."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+
+class SQLiteStore:
+    """Archivio SQLite di prodotti e ordini, condivisibile tra più processi."""
+    
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            price_cents INTEGER NOT NULL,
+            stock INTEGER NOT NULL CHECK (stock >= 0)
+        );
+        CREATE TABLE IF NOT EXISTS orders (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL UNIQUE,
+            email TEXT,
+            status TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_email ON orders (email, seq);
+        CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, seq);
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+    
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 30.0):
+        """
+        Apre (o crea) un archivio SQLite.
+        
+        Args:
+            path: Il percorso del file del database
+            pool_size: Numero di connessioni tenute aperte e riutilizzate
+            timeout: Tempo massimo (in secondi) di attesa di un lock tenuto da un altro processo
+            
+        Raises:
+            ValueError: Se la dimensione del pool non è positiva
+        """
+        if pool_size <= 0:
+            raise ValueError("La dimensione del pool deve essere positiva")
+        
+        self.path = path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            # Transazioni gestite esplicitamente (BEGIN IMMEDIATE) anziché dal modulo sqlite3
+            connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")  # I lettori non bloccano chi scrive
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._pool.put(connection)
+        
+        with self._connection() as connection:
+            connection.executescript(self._SCHEMA)
+    
+    def __len__(self) -> int:
+        """Restituisce il numero di ordini salvati."""
+        with self._connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    
+    def register_product(self, product: Product) -> int:
+        """
+        Aggiunge un prodotto all'inventario condiviso, se non è già presente.
+        
+        Se il prodotto esiste già (ad esempio registrato da un altro processo), lo stock
+        locale viene allineato a quello condiviso.
+        
+        Args:
+            product: Il prodotto da registrare
+            
+        Returns:
+            int: Lo stock condiviso del prodotto
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO products (product_id, name, price_cents, stock) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (product_id) DO NOTHING",
+                (product.product_id, product.name, product.price_cents, product.stock)
+            )
+            product.stock = self._stock(connection, product.product_id)
+        return product.stock
+    
+    def get_stock(self, product_id: str) -> Optional[int]:
+        """
+        Restituisce lo stock condiviso di un prodotto.
+        
+        Args:
+            product_id: L'ID del prodotto
+            
+        Returns:
+            Optional[int]: Lo stock, o None se il prodotto non è registrato
+        """
+        with self._connection() as connection:
+            return self._stock(connection, product_id)
+    
+    def reserve(self, items: List[Tuple[Product, int]]) -> bool:
+        """
+        Decrementa atomicamente lo stock di una lista di prodotti.
+        
+        O tutte le quantità vengono riservate, o nessuna. Ogni decremento è un
+        `UPDATE ... WHERE stock >= ?`, quindi processi diversi non possono vendere
+        la stessa merce due volte.
+        
+        Args:
+            items: Lista di prodotti e quantità da riservare
+            
+        Returns:
+            bool: True se lo stock è stato riservato, False se uno dei prodotti non è disponibile
+        """
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for product, quantity in items:
+                    cursor = connection.execute(
+                        "UPDATE products SET stock = stock - ? WHERE product_id = ? AND stock >= ?",
+                        (quantity, product.product_id, quantity)
+                    )
+                    if cursor.rowcount == 0:
+                        # Stock insufficiente: si annullano anche i decrementi già fatti
+                        connection.execute("ROLLBACK")
+                        return False
+                self._refresh(connection, items)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        return True
+    
+    def restock(self, items: List[Tuple[Product, int]]) -> None:
+        """
+        Restituisce allo stock condiviso le quantità indicate.
+        
+        Args:
+            items: Lista di prodotti e quantità da restituire
+        """
+        with self._transaction() as connection:
+            for product, quantity in items:
+                connection.execute(
+                    "UPDATE products SET stock = stock + ? WHERE product_id = ?",
+                    (quantity, product.product_id)
+                )
+            self._refresh(connection, items)
+    
+    def next_order_number(self) -> int:
+        """
+        Assegna il prossimo numero d'ordine, unico tra tutti i processi che usano l'archivio.
+        
+        Returns:
+            int: Il numero d'ordine
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO counters (name, value) VALUES ('orders', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+            )
+            return connection.execute("SELECT value FROM counters WHERE name = 'orders'").fetchone()[0]
+    
+    def append(self, order: Dict) -> None:
+        """
+        Salva un ordine, o ne aggiorna la versione salvata.
+        
+        Args:
+            order: L'ordine da salvare; deve essere serializzabile in JSON
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO orders (order_id, email, status, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (order_id) DO UPDATE SET status = excluded.status, data = excluded.data",
+                (order["order_id"], order["user_details"].get("email"), order["status"], json.dumps(dict(order)))
+            )
+    
+    def claim_cancellation(self, order_id: str) -> bool:
+        """
+        Segna atomicamente un ordine completato come in annullamento.
+        
+        È un `UPDATE ... WHERE status = 'completed'`, quindi tra tutti i processi che
+        usano l'archivio un solo annullamento può rimborsare lo stesso ordine. L'ordine
+        passa ad annullato quando ne viene salvata la nuova versione con append.
+        
+        Args:
+            order_id: L'ID dell'ordine
+            
+        Returns:
+            bool: True se l'annullamento è stato assegnato al chiamante, False se l'ordine
+                non è salvato, è già annullato o è in annullamento altrove
+        """
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "UPDATE orders SET status = 'cancelling' WHERE order_id = ? AND status = 'completed'",
+                (order_id,)
+            )
+        return cursor.rowcount == 1
+    
+    def release_cancellation(self, order_id: str) -> None:
+        """
+        Riporta a completato un ordine il cui annullamento non è andato a buon fine.
+        
+        Args:
+            order_id: L'ID dell'ordine
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE orders SET status = 'completed' WHERE order_id = ? AND status = 'cancelling'",
+                (order_id,)
+            )
+    
+    def read(self, order_id: str) -> Optional[Dict]:
+        """
+        Legge un ordine salvato.
+        
+        Args:
+            order_id: L'ID dell'ordine
+            
+        Returns:
+            Optional[Dict]: L'ordine o None se non è stato salvato
+        """
+        with self._connection() as connection:
+            row = connection.execute("SELECT data FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def find_orders(self, email: Optional[str] = None, status: Optional[str] = None) -> List[Dict]:
+        """
+        Cerca gli ordini di un cliente e/o con un certo stato, nell'ordine in cui sono stati salvati.
+        
+        Args:
+            email: L'email del cliente
+            status: Lo stato degli ordini
+            
+        Returns:
+            List[Dict]: Gli ordini trovati
+        """
+        conditions, params = [], []
+        if email is not None:
+            conditions.append("email = ?")
+            params.append(email)
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        with self._connection() as connection:
+            rows = connection.execute(f"SELECT data FROM orders {where} ORDER BY seq", params).fetchall()
+        return [json.loads(data) for data, in rows]
+    
+    def iter_orders(self) -> Iterator[Dict]:
+        """
+        Scorre tutti gli ordini salvati, nell'ordine in cui sono stati aggiunti.
+        
+        Yields:
+            Dict: Gli ordini
+        """
+        yield from self.find_orders()
+    
+    def close(self) -> None:
+        """Chiude tutte le connessioni del pool."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+    
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Prende in prestito una connessione dal pool e la restituisce al termine."""
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Esegue un blocco in una transazione che acquisisce subito il lock di scrittura."""
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+    
+    def _stock(self, connection: sqlite3.Connection, product_id: str) -> Optional[int]:
+        """Legge lo stock di un prodotto con la connessione indicata."""
+        row = connection.execute("SELECT stock FROM products WHERE product_id = ?", (product_id,)).fetchone()
+        return row[0] if row is not None else None
+    
+    def _refresh(self, connection: sqlite3.Connection, items: List[Tuple[Product, int]]) -> None:
+        """Allinea lo stock locale dei prodotti a quello condiviso."""
+        for product, _ in items:
+            stock = self._stock(connection, product.product_id)
+            if stock is not None:
+                product.stock = stock
+
+
+class OrderRecord(Mapping):
+    """Ordine in forma compatta, leggibile come un dizionario in sola lettura (tranne stato e rimborso)."""
+    
+    __slots__ = ("order_id", "user_details", "_items", "total_cents", "_transaction_id", "_payment_timestamp",
+                 "_payment", "status", "timestamp", "refund")
+    
+    _KEYS = ("order_id", "user_details", "items", "product_ids", "total_amount", "total_cents", "payment", "status",
+             "timestamp")
+    
+    def __init__(self, order_id: str, user_details: Dict, items: Iterable[Tuple[str, int]], total_cents: int,
+                 payment: Dict, timestamp: float, status: str = "completed", product_ids: Iterable[str] = ()):
+        """
+        Inizializza un nuovo ordine.
+        
+        Args:
+            order_id: L'ID dell'ordine
+            user_details: Dettagli dell'utente (condivisibili tra più ordini dello stesso cliente)
+            items: Coppie (nome del prodotto, quantità)
+            total_cents: Il totale in centesimi
+            payment: Il risultato del pagamento
+            timestamp: Il momento dell'ordine
+            status: Lo stato dell'ordine
+            product_ids: Gli ID dei prodotti, nello stesso ordine di items
+        """
+        items = list(items)
+        product_ids = list(product_ids) or [None] * len(items)
+        self.order_id = order_id
+        self.user_details = user_details
+        # Righe in un'unica tupla piatta (ID, nome, quantità, ...): ID e nomi internati sono condivisi tra gli
+        # ordini, così come le quantità piccole, quindi un ordine piccolo occupa un solo oggetto
+        self._items = tuple(itertools.chain.from_iterable(
+            (product_id and sys.intern(product_id), sys.intern(name), quantity)
+            for product_id, (name, quantity) in zip(product_ids, items)))
+        self.total_cents = total_cents
+        # Il pagamento restituito da PaymentProcessor si ricostruisce da ID e momento della transazione e dal totale;
+        # un pagamento con una forma diversa viene tenuto così com'è
+        if self._is_standard_payment(payment, total_cents):
+            self._transaction_id = payment["transaction_id"]
+            self._payment_timestamp = payment["timestamp"]
+            self._payment: Optional[Dict] = None
+        else:
+            self._transaction_id = self._payment_timestamp = None
+            self._payment = payment
+        self.status = status
+        self.timestamp = timestamp
+        self.refund: Optional[Dict] = None
+    
+    @staticmethod
+    def _is_standard_payment(payment: Dict, total_cents: int) -> bool:
+        """Indica se il pagamento ha la forma prodotta da PaymentProcessor per il totale indicato."""
+        return (payment.keys() == {"success", "transaction_id", "amount", "amount_cents", "timestamp"}
+                and payment["success"] is True and payment["amount_cents"] == total_cents
+                and payment["amount"] == from_cents(total_cents))
+    
+    @property
+    def payment(self) -> Dict:
+        """Il risultato del pagamento."""
+        if self._payment is not None:
+            return self._payment
+        return {
+            "success": True,
+            "transaction_id": self._transaction_id,
+            "amount": from_cents(self.total_cents),
+            "amount_cents": self.total_cents,
+            "timestamp": self._payment_timestamp
+        }
+    
+    def __getitem__(self, key: str):
+        """Restituisce un campo dell'ordine, come per il dizionario che sostituisce."""
+        if key == "items":
+            return list(zip(self._items[1::3], self._items[2::3]))
+        if key == "product_ids":
+            return list(self._items[::3]) if self._items[:1] != (None,) else []
+        if key == "total_amount":
+            return from_cents(self.total_cents)
+        if key in self._KEYS or (key == "refund" and self.refund is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+    
+    def __setitem__(self, key: str, value) -> None:
+        """
+        Aggiorna lo stato o il rimborso dell'ordine.
+        
+        Raises:
+            KeyError: Se il campo non è modificabile
+        """
+        if key not in ("status", "refund"):
+            raise KeyError(f"Campo dell'ordine non modificabile: {key}")
+        setattr(self, key, value)
+    
+    def __iter__(self) -> Iterator[str]:
+        """Scorre i nomi dei campi presenti."""
+        yield from self._KEYS
+        if self.refund is not None:
+            yield "refund"
+    
+    def __len__(self) -> int:
+        """Restituisce il numero di campi presenti."""
+        return len(self._KEYS) + (self.refund is not None)
+    
+    def __repr__(self) -> str:
+        """Rappresenta l'ordine come il dizionario equivalente."""
+        return f"OrderRecord({dict(self)!r})"
+
+
+class OrderAnalytics:
+    """Statistiche sugli ordini aggiornate a ogni ordine e annullamento, senza scorrere lo storico."""
+    
+    def __init__(self):
+        """Inizializza statistiche vuote."""
+        self._revenue_by_hour: Dict[int, int] = {}  # inizio dell'ora (epoch) -> incasso netto in centesimi
+        self._quantities: Counter = Counter()  # nome del prodotto -> quantità venduta
+        self._orders = 0
+        self._cancelled = 0
+        self._lock = threading.Lock()
+    
+    def record_order(self, order: Dict) -> None:
+        """
+        Aggiunge un ordine completato alle statistiche.
         
-        # Preparare il checkout
-        checkout_items = cart.checkout()
-        total_amount = cart.get_total()
+        Args:
+            order: L'ordine
+        """
+        with self._lock:
+            hour = self._hour(order)
+            self._revenue_by_hour[hour] = self._revenue_by_hour.get(hour, 0) + order["total_cents"]
+            for name, quantity in order["items"]:
+                self._quantities[name] += quantity
+            self._orders += 1
+    
+    def record_cancellation(self, order: Dict) -> None:
+        """
+        Toglie dalle statistiche un ordine annullato (l'incasso viene stornato dall'ora dell'ordine).
         
-        # Elabora il pagamento
-        payment_result = self.payment_processor.process_payment(total_amount, payment_details)
+        Args:
+            order: L'ordine annullato
+        """
+        with self._lock:
+            hour = self._hour(order)
+            self._revenue_by_hour[hour] = self._revenue_by_hour.get(hour, 0) - order["total_cents"]
+            for name, quantity in order["items"]:
+                self._quantities[name] -= quantity
+            self._cancelled += 1
+    
+    def revenue_by_hour(self) -> Dict[int, int]:
+        """
+        Restituisce l'incasso netto per ora.
         
-        # Se il pagamento ha avuto successo, riduci lo stock e crea l'ordine
-        if payment_result["success"]:
-            # Riduci lo stock dei prodotti
-            for product, quantity in checkout_items:
-                product.reserve(quantity)
+        Returns:
+            Dict[int, int]: Inizio dell'ora (timestamp epoch) -> incasso in centesimi, in ordine di tempo
+        """
+        with self._lock:
+            return dict(sorted(self._revenue_by_hour.items()))
+    
+    def top_products(self, n: int = 10) -> List[Tuple[str, int]]:
+        """
+        Restituisce i prodotti più venduti (al netto degli annullamenti).
+        
+        Args:
+            n: Il numero di prodotti da restituire
             
-            # Crea l'ordine
-            order = {
-                "order_id": f"order_{len(self.orders) + 1}",
-                "user_details": user_details,
-                "items": [(product.name, quantity) for product, quantity in checkout_items],
-                "total_amount": total_amount,
-                "payment": payment_result,
-                "status": "completed",
-                "timestamp": time.time()
-            }
+        Returns:
+            List[Tuple[str, int]]: Coppie (nome del prodotto, quantità), dalla più venduta
+        """
+        with self._lock:
+            return [(name, quantity) for name, quantity in self._quantities.most_common(n) if quantity > 0]
+    
+    def cancellation_rate(self) -> float:
+        """
+        Restituisce la frazione di ordini annullati.
+        
+        Returns:
+            float: Ordini annullati / ordini effettuati (0 se non ci sono ordini)
+        """
+        with self._lock:
+            return self._cancelled / self._orders if self._orders else 0.0
+    
+    def _hour(self, order: Dict) -> int:
+        """Restituisce l'inizio dell'ora in cui è stato effettuato un ordine."""
+        return int(order["timestamp"]) // 3600 * 3600
+
+
+class OrderService:
+    """Gestisce il processo di ordine completo."""
+    
+    def __init__(self, payment_processor: PaymentProcessor, reservations: Optional[StockReservationManager] = None,
+                 batch_window: Optional[float] = None, idempotency_cache: Optional[IdempotencyCache] = None,
+                 journal: Optional[OrderJournal] = None, max_cached_orders: Optional[int] = None,
+                 store: Optional[SQLiteStore] = None):
+        """
+        Inizializza un nuovo servizio ordini.
+        
+        Args:
+            payment_processor: Il processore di pagamenti da utilizzare
+            reservations: Il gestore delle prenotazioni di stock (condivisibile tra più servizi)
+            batch_window: Se indicata, i pagamenti degli ordini effettuati entro questa finestra
+                (in secondi) vengono inviati al gateway in un unico lotto
+            idempotency_cache: La cache delle chiavi di idempotenza (default: una nuova cache)
+            journal: Il giornale su cui salvare gli ordini; se presente, gli ordini già
+                salvati vengono indicizzati all'avvio e letti dal disco quando servono
+            max_cached_orders: Numero massimo di ordini recenti tenuti in memoria
+                (richiede un giornale o un archivio da cui rileggere quelli più vecchi)
+            store: L'archivio SQLite su cui salvare gli ordini, condiviso con altri processi:
+                numerazione e ricerche per cliente o stato vengono fatte sull'archivio.
+                Per condividere anche l'inventario, passare un gestore delle prenotazioni
+                creato con lo stesso archivio
             
-            # Aggiungi l'ordine alla lista degli ordini
-            self.orders.append(order)
+        Raises:
+            ValueError: Se vengono indicati sia un giornale che un archivio, o se
+                max_cached_orders è indicato senza nessuno dei due o non è positivo
+        """
+        if journal is not None and store is not None:
+            raise ValueError("Indicare un giornale o un archivio, non entrambi")
+        if max_cached_orders is not None and ((journal is None and store is None) or max_cached_orders <= 0):
+            raise ValueError("max_cached_orders richiede un giornale o un archivio e deve essere positivo")
+        
+        self.payment_processor = payment_processor
+        self.reservations = reservations if reservations is not None else StockReservationManager()
+        self.payment_batcher = PaymentBatcher(payment_processor, batch_window) if batch_window is not None else None
+        self.idempotency_cache = idempotency_cache if idempotency_cache is not None else IdempotencyCache()
+        self.orders: List[Dict] = []
+        self._orders_lock = threading.Lock()  # Protegge la lista degli ordini e gli indici
+        # Indici per la ricerca degli ordini in tempo costante
+        self._orders_by_id: Dict[str, Dict] = {}
+        self._order_ids_by_email: Dict[str, List[str]] = {}
+        self._order_ids_by_status: Dict[str, Dict[str, None]] = {}  # Usato come insieme ordinato
+        self._order_ids_by_time: List[Tuple[float, str]] = []  # (timestamp, order_id), ordinato
+        self.analytics = OrderAnalytics()
+        self._customers: Dict[Tuple, Dict] = {}  # Dettagli utente condivisi tra gli ordini (vedi _intern_customer)
+        self._customer_orders: Counter = Counter()  # Ordini in memoria per ogni cliente di _customers
+        self._products: Dict[str, Product] = {}  # Prodotti degli ordini, per ripristinare lo stock negli annullamenti
+        self._cancelling: Set[str] = set()  # Ordini con un rimborso in corso
+        self._order_count = 0
+        self.journal = journal
+        self.store = store
+        self.max_cached_orders = max_cached_orders
+        
+        # Dopo un riavvio gli ordini del giornale vengono indicizzati senza tenerli in memoria
+        if journal is not None:
+            for order in journal.iter_orders():
+                self._index_order(order, cache=False)
+                self._order_count += 1
+                self.analytics.record_order(order)
+                if order["status"] == "cancelled":
+                    self.analytics.record_cancellation(order)
+            
+            # Gli ordini aggiornati arrivano dal giornale nella posizione della loro ultima versione:
+            # gli ordini di ogni cliente vengono riportati dal più vecchio al più recente
+            rank = {order_id: position for position, (_, order_id) in enumerate(self._order_ids_by_time)}
+            for order_ids in self._order_ids_by_email.values():
+                order_ids.sort(key=rank.__getitem__)
+    
+    def place_order(self, cart: ShoppingCart, user_details: Dict, payment_details: Dict,
+                    idempotency_key: Optional[str] = None) -> Dict:
+        """
+        Effettua un ordine.
+        
+        Args:
+            cart: Il carrello della spesa
+            user_details: Dettagli dell'utente
+            payment_details: Dettagli del pagamento
+            idempotency_key: Chiave scelta dal client per riconoscere i tentativi ripetuti:
+                se un ordine con la stessa chiave è già stato completato viene restituito
+                quello, senza un nuovo pagamento
             
-            # Svuota il carrello
-            cart.clear()
+        Returns:
+            Dict: Dettagli dell'ordine completato
             
+        Raises:
+            ValueError: Se il carrello è vuoto o i dettagli non sono validi
+            RuntimeError: Se il pagamento fallisce
+        """
+        if idempotency_key is None:
+            return self._place_order(cart, user_details, payment_details)
+        
+        # Un duplicato restituisce l'ordine originale; se il primo tentativo è in corso, lo attende
+        order = self.idempotency_cache.claim(idempotency_key)
+        if order is not None:
             return order
+        
+        try:
+            order = self._place_order(cart, user_details, payment_details)
+        except Exception:
+            self.idempotency_cache.complete(idempotency_key)
+            raise
+        
+        self.idempotency_cache.complete(idempotency_key, order)
+        return order
+    
+    def _place_order(self, cart: ShoppingCart, user_details: Dict, payment_details: Dict) -> Dict:
+        """Effettua un ordine senza controlli di idempotenza (vedi place_order)."""
+        self._validate_order(cart, user_details)
+        
+        # Preparare il checkout
+        checkout_items = cart.checkout()
+        total_cents = cart.get_total_cents()
+        
+        # Riserva lo stock prima del pagamento, così due acquirenti non possono comprare lo stesso pezzo
+        reservation_id = self.reservations.hold(checkout_items)
+        
+        # Elabora il pagamento, in centesimi interi
+        try:
+            if self.payment_batcher is not None:
+                payment_result = self.payment_batcher.submit(total_cents, payment_details)
+            else:
+                payment_result = self.payment_processor.process_payment(total_cents, payment_details)
+        except Exception:
+            self.reservations.release(reservation_id)
+            raise
+        
+        # Se il pagamento ha avuto successo, conferma la prenotazione e crea l'ordine
+        if payment_result["success"]:
+            self._commit_reservation(reservation_id, checkout_items, payment_result)
+            return self._create_order(cart, user_details, checkout_items, total_cents, payment_result)
         else:
             # Non dovrebbe mai arrivare qui, poiché process_payment solleva un'eccezione in caso di fallimento
+            self.reservations.release(reservation_id)
             raise RuntimeError("Pagamento fallito")
     
+    def place_orders(self, requests: Iterable[Tuple[ShoppingCart, Dict, Dict]], workers: int = 4) -> Iterator[Dict]:
+        """
+        Effettua molti ordini in parallelo su un pool di thread limitato.
+        
+        I risultati vengono restituiti man mano che gli ordini si completano, non
+        nell'ordine di ingresso. Al più `2 * workers` ordini sono in corso o in attesa
+        contemporaneamente, così anche un input molto grande non satura la memoria.
+        La correttezza dello stock è garantita dalle prenotazioni (vedi place_order).
+        
+        Args:
+            requests: Sequenza (anche un generatore) di tuple (carrello, dettagli utente, dettagli pagamento)
+            workers: Numero di thread che elaborano gli ordini
+            
+        Yields:
+            Dict: Per ogni ordine l'indice nella sequenza di ingresso ("index"), l'esito
+                ("success") e l'ordine creato ("order") oppure il messaggio di errore ("error")
+            
+        Raises:
+            ValueError: Se il numero di thread non è positivo
+        """
+        if workers <= 0:
+            raise ValueError("Il numero di thread deve essere positivo")
+        
+        numbered_requests = enumerate(requests)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight: Dict[Future, int] = {}
+            
+            def submit_next() -> None:
+                for index, (cart, user_details, payment_details) in numbered_requests:
+                    future = executor.submit(self.place_order, cart, user_details, payment_details)
+                    in_flight[future] = index
+                    return
+            
+            for _ in range(2 * workers):
+                submit_next()
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    # Un nuovo ordine entra solo quando uno è uscito (backpressure)
+                    submit_next()
+                    try:
+                        yield {"index": index, "success": True, "order": future.result(), "error": None}
+                    except Exception as e:
+                        yield {"index": index, "success": False, "order": None, "error": str(e)}
+    
     def get_order(self, order_id: str) -> Optional[Dict]:
         """
         Ottiene i dettagli di un ordine.
@@ -392,10 +2926,97 @@ class OrderService:
         Returns:
             Optional[Dict]: Dettagli dell'ordine o None se non trovato
         """
-        for order in self.orders:
-            if order["order_id"] == order_id:
-                return order
-        return None
+        order = self._orders_by_id.get(order_id)
+        if order is None and self._order_log is not None:
+            # Ordine non più in memoria (o creato da un altro processo): viene riletto dal disco
+            order = self._order_log.read(order_id)
+        return order
+    
+    def get_orders_by_customer(self, email: str) -> List[Dict]:
+        """
+        Ottiene gli ordini di un cliente.
+        
+        Args:
+            email: L'email del cliente
+            
+        Returns:
+            List[Dict]: Gli ordini del cliente, dal più vecchio al più recente
+        """
+        if self.store is not None:
+            return [self._orders_by_id.get(order["order_id"], order) for order in self.store.find_orders(email=email)]
+        return [self.get_order(order_id) for order_id in self._order_ids_by_email.get(email, [])]
+    
+    def get_orders_by_status(self, status: str) -> List[Dict]:
+        """
+        Ottiene gli ordini con un determinato stato.
+        
+        Args:
+            status: Lo stato degli ordini (ad esempio "completed" o "cancelled")
+            
+        Returns:
+            List[Dict]: Gli ordini con lo stato richiesto
+        """
+        if self.store is not None:
+            return [self._orders_by_id.get(order["order_id"], order) for order in self.store.find_orders(status=status)]
+        return [self.get_order(order_id) for order_id in list(self._order_ids_by_status.get(status, {}))]
+    
+    def iter_orders(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Scorre gli ordini in ordine di tempo, uno alla volta.
+        
+        L'intervallo viene individuato sull'indice per timestamp, senza scorrere gli altri
+        ordini; gli ordini non più in memoria vengono riletti dal disco solo quando servono.
+        
+        Args:
+            start: Timestamp minimo (incluso)
+            end: Timestamp massimo (escluso)
+            
+        Yields:
+            Dict: Gli ordini nell'intervallo
+        """
+        with self._orders_lock:
+            low = bisect.bisect_left(self._order_ids_by_time, (start, "")) if start is not None else 0
+            high = (bisect.bisect_left(self._order_ids_by_time, (end, ""))
+                    if end is not None else len(self._order_ids_by_time))
+            order_ids = [order_id for _, order_id in self._order_ids_by_time[low:high]]
+        
+        for order_id in order_ids:
+            yield self.get_order(order_id)
+    
+    def export_orders(self, file: TextIO, format: str = "csv", start: Optional[float] = None,
+                      end: Optional[float] = None) -> int:
+        """
+        Esporta gli ordini su un file di testo, una riga alla volta.
+        
+        Args:
+            file: Il file su cui scrivere (aperto in scrittura; per il CSV con newline="")
+            format: "csv" oppure "jsonl"
+            start: Timestamp minimo (incluso) degli ordini da esportare
+            end: Timestamp massimo (escluso) degli ordini da esportare
+            
+        Returns:
+            int: Il numero di ordini esportati
+            
+        Raises:
+            ValueError: Se il formato non è supportato
+        """
+        if format not in ("csv", "jsonl"):
+            raise ValueError(f"Formato di esportazione non supportato: {format}")
+        
+        if format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(["order_id", "timestamp", "email", "status", "total_cents", "items"])
+        
+        count = 0
+        for order in self.iter_orders(start, end):
+            if format == "csv":
+                items = ";".join(f"{name} x{quantity}" for name, quantity in order["items"])
+                writer.writerow([order["order_id"], order["timestamp"], order["user_details"]["email"],
+                                 order["status"], order["total_cents"], items])
+            else:
+                file.write(json.dumps(dict(order)) + "\n")
+            count += 1
+        return count
     
     def cancel_order(self, order_id: str) -> bool:
         """
@@ -409,30 +3030,485 @@ class OrderService:
             
         Raises:
             ValueError: Se l'ordine non esiste
-            RuntimeError: Se l'annullamento fallisce
+            RuntimeError: Se l'annullamento fallisce, l'ordine è già annullato o i suoi
+                prodotti non sono registrati
+        """
+        # Trova l'ordine e verifica che possa essere annullato
+        order, lines = self._claim_cancellation(order_id)
+        
+        try:
+            # Effettua il rimborso
+            refund_result = self.payment_processor.refund_payment(order["payment"]["transaction_id"])
+            
+            if not refund_result["success"]:
+                # Non dovrebbe mai arrivare qui, poiché refund_payment solleva un'eccezione in caso di fallimento
+                raise RuntimeError("Annullamento fallito")
+            
+            # Aggiorna lo stato dell'ordine e riaggiungi i prodotti allo stock
+            self._mark_cancelled(order, refund_result)
+            self.reservations.restock(lines)
+        finally:
+            self._release_cancellation(order)
+        
+        return True
+    
+    def cancel_orders(self, order_ids: Iterable[str], max_workers: int = 8, rate_limit: Optional[float] = None,
+                      checkpoint_path: Optional[str] = None, checkpoint_every: int = 100) -> Dict:
+        """
+        Annulla più ordini, con i rimborsi in parallelo e il ripristino dello stock in blocco.
+        
+        Lo stock viene restituito solo per gli ordini effettivamente rimborsati, quindi
+        un fallimento parziale non lascia lo stock incoerente.
+        
+        Con un file di checkpoint gli ordini vengono elaborati a blocchi di checkpoint_every:
+        dopo ogni blocco (rimborsi e un unico ripristino dello stock) gli ID annullati vengono
+        salvati, e rilanciando l'operazione dopo un'interruzione vengono saltati. Senza
+        checkpoint tutti gli ordini formano un unico blocco.
+        
+        Args:
+            order_ids: Gli ID degli ordini da annullare
+            max_workers: Numero massimo di rimborsi in parallelo
+            rate_limit: Numero massimo di rimborsi al secondo (la quota del gateway)
+            checkpoint_path: Il file in cui salvare gli ID degli ordini già annullati
+            checkpoint_every: Numero di ordini per blocco quando si usa il checkpoint
+            
+        Returns:
+            Dict: "cancelled" con gli ID degli ordini annullati, "failed" con ID -> motivo
+                per quelli non annullati, "skipped" con quelli già annullati secondo il
+                checkpoint, "elapsed" con la durata in secondi e "throughput" con gli
+                ordini annullati al secondo
+                
+        Raises:
+            ValueError: Se max_workers o checkpoint_every non sono positivi
+        """
+        if max_workers <= 0:
+            raise ValueError("Il numero di rimborsi in parallelo deve essere positivo")
+        if checkpoint_every <= 0:
+            raise ValueError("La dimensione dei blocchi deve essere positiva")
+        
+        # Rimborsi distribuiti uniformemente (burst di 1): la quota non viene mai superata, nemmeno all'avvio
+        limiter = RateLimiter(rate_limit, burst=1) if rate_limit is not None else None
+        done = self._read_checkpoint(checkpoint_path) if checkpoint_path is not None else set()
+        order_ids = list(dict.fromkeys(order_ids))
+        pending = [order_id for order_id in order_ids if order_id not in done]
+        batch_size = checkpoint_every if checkpoint_path is not None else max(len(pending), 1)
+        
+        report = {"cancelled": [], "failed": {}, "skipped": [order_id for order_id in order_ids if order_id in done]}
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for start in range(0, len(pending), batch_size):
+                cancelled = self._cancel_batch(pending[start:start + batch_size], executor, limiter, report["failed"])
+                report["cancelled"].extend(cancelled)
+                if checkpoint_path is not None:
+                    self._write_checkpoint(checkpoint_path, cancelled)
+        
+        report["elapsed"] = time.monotonic() - started_at
+        report["throughput"] = len(report["cancelled"]) / report["elapsed"] if report["elapsed"] > 0 else 0.0
+        return report
+    
+    def register_products(self, products: Iterable[Product]) -> None:
+        """
+        Registra i prodotti a cui restituire lo stock degli ordini annullati.
+        
+        I prodotti degli ordini effettuati da questo servizio sono registrati automaticamente;
+        serve per gli ordini letti da un giornale o da un archivio, ad esempio dopo un riavvio.
+        
+        Args:
+            products: I prodotti da registrare
+        """
+        for product in products:
+            self._products[product.product_id] = product
+    
+    def _cancel_batch(self, order_ids: List[str], executor: ThreadPoolExecutor, limiter: Optional[RateLimiter],
+                      failed: Dict[str, str]) -> List[str]:
+        """
+        Annulla un blocco di ordini: rimborsi in parallelo, poi un unico ripristino dello stock.
+        
+        Returns:
+            List[str]: Gli ID degli ordini annullati (i motivi dei fallimenti vengono aggiunti a failed)
+        """
+        claimed: Dict[str, Tuple[Dict, List[Tuple[Product, int]]]] = {}
+        for order_id in order_ids:
+            try:
+                claimed[order_id] = self._claim_cancellation(order_id)
+            except (ValueError, RuntimeError) as e:
+                failed[order_id] = str(e)
+        
+        def refund(transaction_id: str) -> Dict:
+            if limiter is not None:
+                limiter.acquire()
+            return self.payment_processor.refund_payment(transaction_id)
+        
+        cancelled: List[str] = []
+        restock_lines: List[Tuple[Product, int]] = []
+        try:
+            futures = {
+                order_id: executor.submit(refund, order["payment"]["transaction_id"])
+                for order_id, (order, _) in claimed.items()
+            }
+            
+            for order_id, future in futures.items():
+                try:
+                    refund_result = future.result()
+                except Exception as e:
+                    failed[order_id] = str(e)
+                    continue
+                if not refund_result["success"]:
+                    failed[order_id] = "Annullamento fallito"
+                    continue
+                
+                order, lines = claimed[order_id]
+                self._mark_cancelled(order, refund_result)
+                restock_lines.extend(lines)
+                cancelled.append(order_id)
+        finally:
+            try:
+                # Un solo aggiornamento dell'inventario per tutti gli ordini annullati del blocco, fatto anche
+                # se un annullamento successivo fallisce: gli ordini già segnati non riavrebbero più lo stock
+                self.reservations.restock(restock_lines)
+            finally:
+                for order, _ in claimed.values():
+                    self._release_cancellation(order)
+        
+        return cancelled
+    
+    def _read_checkpoint(self, path: str) -> Set[str]:
+        """Legge gli ID degli ordini già annullati da un file di checkpoint (vuoto se il file non esiste)."""
+        try:
+            with open(path, encoding="utf-8") as checkpoint:
+                return {line.strip() for line in checkpoint if line.strip()}
+        except FileNotFoundError:
+            return set()
+    
+    def _write_checkpoint(self, path: str, order_ids: List[str]) -> None:
+        """Aggiunge al file di checkpoint gli ID degli ordini annullati, forzandoli su disco."""
+        if not order_ids:
+            return
+        with open(path, "a", encoding="utf-8") as checkpoint:
+            checkpoint.write("".join(f"{order_id}\n" for order_id in order_ids))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+    
+    def _claim_cancellation(self, order_id: str) -> Tuple[Dict, List[Tuple[Product, int]]]:
+        """
+        Verifica che un ordine possa essere annullato e lo segna come in annullamento.
+        
+        Con un archivio SQLite l'ordine in memoria potrebbe non essere aggiornato rispetto
+        a quanto fatto da altri processi: decide quindi l'archivio, con un aggiornamento
+        condizionale dello stato (vedi SQLiteStore.claim_cancellation).
+        
+        Returns:
+            Tuple[Dict, List[Tuple[Product, int]]]: L'ordine e i prodotti da restituire allo stock
+            
+        Raises:
+            ValueError: Se l'ordine non esiste
+            RuntimeError: Se l'ordine è già annullato, in annullamento o con prodotti non registrati
         """
-        # Trova l'ordine
         order = self.get_order(order_id)
         if not order:
             raise ValueError(f"Ordine con ID {order_id} non trovato")
         
-        # Verifica che l'ordine non sia già stato annullato
-        if order["status"] == "cancelled":
-            raise RuntimeError("L'ordine è già stato annullato")
+        # I prodotti vengono risolti prima del rimborso: un ordine rimborsato deve poter tornare in stock
+        product_ids = order.get("product_ids")
+        if not product_ids or any(product_id not in self._products for product_id in product_ids):
+            raise RuntimeError(f"Impossibile ripristinare lo stock dell'ordine {order_id}: prodotti non registrati")
+        lines = [(self._products[product_id], quantity)
+                 for product_id, (_, quantity) in zip(product_ids, order["items"])]
+        
+        with self._orders_lock:
+            if order["status"] == "cancelled":
+                raise RuntimeError("L'ordine è già stato annullato")
+            # Evita due rimborsi per lo stesso ordine mentre il primo è ancora in attesa
+            if order_id in self._cancelling:
+                raise RuntimeError("L'annullamento dell'ordine è già in corso")
+            self._cancelling.add(order_id)
+        
+        if self.store is not None and not self.store.claim_cancellation(order_id):
+            self._cancelling.discard(order_id)
+            raise RuntimeError("L'ordine è già stato annullato o è in annullamento in un altro processo")
+        return order, lines
+    
+    def _release_cancellation(self, order: Dict) -> None:
+        """Rilascia un ordine preso con _claim_cancellation, annullato o meno."""
+        if self.store is not None and order["status"] != "cancelled":
+            # Rimborso fallito: l'ordine torna annullabile anche per gli altri processi
+            self.store.release_cancellation(order["order_id"])
+        self._cancelling.discard(order["order_id"])
+    
+    def _validate_order(self, cart: ShoppingCart, user_details: Dict) -> None:
+        """Verifica che il carrello non sia vuoto e che i dettagli dell'utente siano completi."""
+        # Verifica che il carrello non sia vuoto
+        if cart.get_item_count() == 0:
+            raise ValueError("Impossibile completare l'ordine: il carrello è vuoto")
         
-        # Effettua il rimborso
-        refund_result = self.payment_processor.refund_payment(order["payment"]["transaction_id"])
+        # Verifica che i dettagli dell'utente siano validi
+        required_user_fields = ["name", "email", "address"]
+        for field in required_user_fields:
+            if field not in user_details:
+                raise ValueError(f"Campo utente obbligatorio mancante: {field}")
+    
+    def _commit_reservation(self, reservation_id: str, checkout_items: List[Tuple[Product, int]],
+                            payment_result: Dict) -> None:
+        """Conferma lo stock riservato; se la prenotazione è scaduta prova a riservarlo di nuovo."""
+        if self.reservations.commit(reservation_id):
+            return
         
-        if refund_result["success"]:
-            # Aggiorna lo stato dell'ordine
-            order["status"] = "cancelled"
-            order["refund"] = refund_result
+        # La prenotazione è scaduta durante il pagamento: si riprova a riservare lo stock
+        try:
+            self.reservations.commit(self.reservations.hold(checkout_items))
+        except ValueError:
+            # Lo stock non è più disponibile: il pagamento va rimborsato
+            self.payment_processor.refund_payment(payment_result["transaction_id"])
+            raise
+    
+    def _create_order(self, cart: ShoppingCart, user_details: Dict, checkout_items: List[Tuple[Product, int]],
+                      total_cents: int, payment_result: Dict) -> Dict:
+        """Registra un ordine pagato, lo indicizza e svuota il carrello."""
+        with self._orders_lock:
+            # Crea l'ordine
+            if self.store is not None:
+                self._order_count = self.store.next_order_number()
+            else:
+                self._order_count += 1
+            order = OrderRecord(
+                order_id=f"order_{self._order_count}",
+                user_details=self._intern_customer(user_details),
+                items=[(product.name, quantity) for product, quantity in checkout_items],
+                total_cents=total_cents,
+                payment=payment_result,
+                timestamp=time.time(),
+                product_ids=[product.product_id for product, _ in checkout_items]
+            )
+            for product, _ in checkout_items:
+                self._products.setdefault(product.product_id, product)
             
-            # In uno scenario reale, qui si potrebbe anche riaggiungere i prodotti allo stock
-            return True
-        else:
-            # Non dovrebbe mai arrivare qui, poiché refund_payment solleva un'eccezione in caso di fallimento
-            raise RuntimeError("Annullamento fallito")
+            # Aggiungi l'ordine alla lista degli ordini e agli indici
+            self.orders.append(order)
+            self._index_order(order)
+            self.analytics.record_order(order)
+            if self._order_log is not None:
+                self._order_log.append(order)
+                self._evict_old_orders()
+        
+        # Svuota il carrello
+        cart.clear()
+        
+        return order
+    
+    @property
+    def _order_log(self):
+        """Restituisce il giornale o l'archivio su cui vengono salvati gli ordini, se presente."""
+        return self.journal if self.journal is not None else self.store
+    
+    def _evict_old_orders(self) -> None:
+        """Toglie dalla memoria gli ordini più vecchi, che restano leggibili dal giornale."""
+        if self.max_cached_orders is None or len(self.orders) <= self.max_cached_orders:
+            return
+        
+        # Si libera un decimo della cache alla volta, per non spostare la lista a ogni ordine
+        excess = len(self.orders) - self.max_cached_orders + max(1, self.max_cached_orders // 10)
+        for order in self.orders[:excess]:
+            del self._orders_by_id[order["order_id"]]
+            self._release_customer(order["user_details"])
+        del self.orders[:excess]
+    
+    def _mark_cancelled(self, order: Dict, refund_result: Dict) -> None:
+        """Segna un ordine come annullato e salva la nuova versione nel giornale."""
+        self._set_status(order, "cancelled")
+        order["refund"] = refund_result
+        self.analytics.record_cancellation(order)
+        if self._order_log is not None:
+            self._order_log.append(order)
+    
+    def _intern_customer(self, user_details: Dict) -> Dict:
+        """Restituisce un unico dizionario condiviso per tutti gli ordini con gli stessi dettagli utente."""
+        try:
+            key = tuple(sorted(user_details.items()))
+            customer = self._customers.setdefault(key, dict(user_details))
+        except TypeError:
+            return dict(user_details)  # Valori non confrontabili o non hashable: nessuna condivisione
+        self._customer_orders[key] += 1
+        return customer
+    
+    def _release_customer(self, user_details: Dict) -> None:
+        """Toglie un ordine tolto dalla memoria dal conteggio del cliente e dimentica il cliente senza più ordini."""
+        try:
+            key = tuple(sorted(user_details.items()))
+        except TypeError:
+            return
+        if self._customers.get(key) is not user_details:
+            return  # Dettagli non condivisi (ad esempio di un ordine riletto dal giornale)
+        self._customer_orders[key] -= 1
+        if self._customer_orders[key] <= 0:
+            del self._customers[key]
+            del self._customer_orders[key]
+    
+    def _index_order(self, order: Dict, cache: bool = True) -> None:
+        """Aggiunge un ordine agli indici per ID (solo se tenuto in memoria), email del cliente e stato."""
+        order_id = order["order_id"]
+        if cache:
+            self._orders_by_id[order_id] = order
+        self._order_ids_by_email.setdefault(order["user_details"]["email"], []).append(order_id)
+        self._order_ids_by_status.setdefault(order["status"], {})[order_id] = None
+        # Gli ordini arrivano quasi sempre in ordine di tempo: insort inserisce in fondo
+        bisect.insort(self._order_ids_by_time, (order["timestamp"], order_id))
+    
+    def _set_status(self, order: Dict, status: str) -> None:
+        """Aggiorna lo stato di un ordine mantenendo allineato l'indice per stato."""
+        order_id = order["order_id"]
+        with self._orders_lock:
+            self._order_ids_by_status.get(order["status"], {}).pop(order_id, None)
+            order["status"] = status
+            self._order_ids_by_status.setdefault(status, {})[order_id] = None
+
+
+class AsyncOrderService(OrderService):
+    """Gestisce gli ordini su un event loop, con molti pagamenti in corso contemporaneamente."""
+    
+    def __init__(self, payment_processor: PaymentProcessor, reservations: Optional[StockReservationManager] = None,
+                 journal: Optional[OrderJournal] = None, max_cached_orders: Optional[int] = None,
+                 store: Optional[SQLiteStore] = None):
+        """
+        Inizializza un nuovo servizio ordini asincrono.
+        
+        Args:
+            payment_processor: Il processore di pagamenti da utilizzare (con metodi *_async)
+            reservations: Il gestore delle prenotazioni di stock (condivisibile tra più servizi)
+            journal: Il giornale su cui salvare gli ordini
+            max_cached_orders: Numero massimo di ordini recenti tenuti in memoria
+            store: L'archivio SQLite su cui salvare gli ordini
+        """
+        super().__init__(payment_processor, reservations, journal=journal, max_cached_orders=max_cached_orders,
+                         store=store)
+    
+    async def place_order(self, cart: ShoppingCart, user_details: Dict, payment_details: Dict) -> Dict:
+        """
+        Effettua un ordine senza bloccare l'event loop durante il pagamento.
+        
+        Lo stock viene riservato prima di attendere il pagamento, così gli ordini in
+        attesa non possono vendere la stessa merce due volte; se il pagamento fallisce
+        lo stock viene ripristinato.
+        
+        Args:
+            cart: Il carrello della spesa
+            user_details: Dettagli dell'utente
+            payment_details: Dettagli del pagamento
+            
+        Returns:
+            Dict: Dettagli dell'ordine completato
+            
+        Raises:
+            ValueError: Se il carrello è vuoto, i dettagli non sono validi o lo stock non basta
+            RuntimeError: Se il pagamento fallisce
+        """
+        self._validate_order(cart, user_details)
+        
+        # Preparare il checkout
+        checkout_items = cart.checkout()
+        total_cents = cart.get_total_cents()
+        
+        # Riserva lo stock prima di attendere il pagamento
+        reservation_id = self.reservations.hold(checkout_items)
+        
+        # Elabora il pagamento
+        try:
+            payment_result = await self.payment_processor.process_payment_async(total_cents, payment_details)
+        except Exception:
+            self.reservations.release(reservation_id)
+            raise
+        
+        if not payment_result["success"]:
+            self.reservations.release(reservation_id)
+            raise RuntimeError("Pagamento fallito")
+        
+        if not self.reservations.commit(reservation_id):
+            # La prenotazione è scaduta durante il pagamento: si riprova a riservare lo stock
+            try:
+                self.reservations.commit(self.reservations.hold(checkout_items))
+            except ValueError:
+                await self.payment_processor.refund_payment_async(payment_result["transaction_id"])
+                raise
+        
+        return self._create_order(cart, user_details, checkout_items, total_cents, payment_result)
+    
+    async def place_orders(self, requests: Iterable[Tuple[ShoppingCart, Dict, Dict]],
+                           workers: int = 4) -> AsyncIterator[Dict]:
+        """
+        Effettua molti ordini contemporaneamente sull'event loop.
+        
+        Versione asincrona di OrderService.place_orders, da usare con `async for`: al più
+        `workers` ordini sono in corso insieme e i risultati vengono restituiti man mano
+        che si completano. Se l'iterazione viene interrotta, gli ordini ancora in corso
+        vengono annullati.
+        
+        Args:
+            requests: Sequenza (anche un generatore) di tuple (carrello, dettagli utente, dettagli pagamento)
+            workers: Numero massimo di ordini in corso contemporaneamente
+            
+        Yields:
+            Dict: Per ogni ordine l'indice nella sequenza di ingresso ("index"), l'esito
+                ("success") e l'ordine creato ("order") oppure il messaggio di errore ("error")
+            
+        Raises:
+            ValueError: Se il numero di ordini contemporanei non è positivo
+        """
+        if workers <= 0:
+            raise ValueError("Il numero di ordini contemporanei deve essere positivo")
+        
+        numbered_requests = enumerate(requests)
+        in_flight: Dict[asyncio.Task, int] = {}
+        
+        def submit_next() -> None:
+            for index, (cart, user_details, payment_details) in numbered_requests:
+                task = asyncio.ensure_future(self.place_order(cart, user_details, payment_details))
+                in_flight[task] = index
+                return
+        
+        for _ in range(workers):
+            submit_next()
+        
+        try:
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = in_flight.pop(task)
+                    # Un nuovo ordine entra solo quando uno è uscito (backpressure)
+                    submit_next()
+                    if task.exception() is None:
+                        yield {"index": index, "success": True, "order": task.result(), "error": None}
+                    else:
+                        yield {"index": index, "success": False, "order": None, "error": str(task.exception())}
+        finally:
+            for task in in_flight:
+                task.cancel()
+    
+    async def cancel_order(self, order_id: str) -> bool:
+        """
+        Annulla un ordine senza bloccare l'event loop durante il rimborso.
+        
+        Args:
+            order_id: L'ID dell'ordine da annullare
+            
+        Returns:
+            bool: True se l'ordine è stato annullato con successo
+            
+        Raises:
+            ValueError: Se l'ordine non esiste
+            RuntimeError: Se l'ordine è già annullato, i suoi prodotti non sono registrati
+                o il rimborso fallisce
+        """
+        order, lines = self._claim_cancellation(order_id)
+        try:
+            refund_result = await self.payment_processor.refund_payment_async(order["payment"]["transaction_id"])
+            
+            if not refund_result["success"]:
+                raise RuntimeError("Annullamento fallito")
+            
+            self._mark_cancelled(order, refund_result)
+            self.reservations.restock(lines)
+        finally:
+            self._release_cancellation(order)
+        return True
 
 
 # Esempio di utilizzo
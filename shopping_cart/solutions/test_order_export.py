@@ -0,0 +1,109 @@
+"""
+Test unitari per l'esportazione degli ordini e per la classe OrderAnalytics
+"""
+import csv
+import io
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+from main import OrderService, OrderAnalytics, PaymentProcessor, ShoppingCart, Product
+
+
+class TestOrderExport(unittest.TestCase):
+    """Test per iter_orders ed export_orders di OrderService."""
+    
+    def setUp(self):
+        """Inizializza un servizio con un processore mock e tre ordini in ore diverse."""
+        self.mock_processor = MagicMock(spec=PaymentProcessor)
+        self.mock_processor.process_payment.return_value = {
+            "success": True, "transaction_id": "txn_123456", "amount": 10.0, "timestamp": 1234567890
+        }
+        self.mock_processor.refund_payment.return_value = {
+            "success": True, "refund_id": "ref_123456", "transaction_id": "txn_123456", "timestamp": 1234567890
+        }
+        self.service = OrderService(self.mock_processor)
+        self.laptop = Product("p1", "Laptop", 1000.0, 100)
+        self.mouse = Product("p2", "Mouse", 20.0, 100)
+        self.payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+        
+        # Ordini alle 10:00, 10:30 e 12:00 (timestamp simulati)
+        for timestamp, product, quantity in [(36000, self.laptop, 1), (37800, self.mouse, 3), (43200, self.mouse, 1)]:
+            self.place(timestamp, product, quantity)
+    
+    def place(self, timestamp, product, quantity):
+        """Effettua un ordine con un timestamp simulato."""
+        cart = ShoppingCart()
+        cart.add_product(product, quantity)
+        user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+        with patch('time.time', return_value=timestamp):
+            return self.service.place_order(cart, user_details, self.payment_details)
+    
+    def test_iter_orders_time_range(self):
+        """Verifica che l'intervallo di tempo selezioni gli ordini giusti, in ordine di tempo."""
+        self.assertEqual([order["order_id"] for order in self.service.iter_orders()],
+                         ["order_1", "order_2", "order_3"])
+        self.assertEqual([order["order_id"] for order in self.service.iter_orders(start=37800, end=43200)],
+                         ["order_2"])
+        self.assertEqual(list(self.service.iter_orders(start=50000)), [])
+    
+    def test_iter_orders_is_lazy(self):
+        """Verifica che gli ordini vengano letti solo quando servono."""
+        with patch.object(self.service, "get_order", wraps=self.service.get_order) as get_order:
+            orders = self.service.iter_orders()
+            next(orders)
+        
+        get_order.assert_called_once_with("order_1")
+    
+    def test_export_csv(self):
+        """Verifica l'esportazione in CSV."""
+        output = io.StringIO(newline="")
+        
+        self.assertEqual(self.service.export_orders(output, "csv", start=37800), 2)
+        
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0], ["order_id", "timestamp", "email", "status", "total_cents", "items"])
+        self.assertEqual(rows[1], ["order_2", "37800", "mario@example.com", "completed", "6000", "Mouse x3"])
+        self.assertEqual(len(rows), 3)
+    
+    def test_export_jsonl(self):
+        """Verifica l'esportazione in JSON Lines, un ordine per riga."""
+        output = io.StringIO()
+        
+        self.assertEqual(self.service.export_orders(output, "jsonl"), 3)
+        
+        orders = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([order["order_id"] for order in orders], ["order_1", "order_2", "order_3"])
+    
+    def test_export_invalid_format(self):
+        """Verifica che un formato non supportato sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            self.service.export_orders(io.StringIO(), "xml")
+    
+    def test_analytics_updated_by_orders(self):
+        """Verifica che le statistiche vengano aggiornate da ordini e annullamenti."""
+        analytics = self.service.analytics
+        self.assertEqual(analytics.revenue_by_hour(), {36000: 106000, 43200: 2000})
+        self.assertEqual(analytics.top_products(1), [("Mouse", 4)])
+        self.assertEqual(analytics.cancellation_rate(), 0)
+        
+        self.service.cancel_order("order_1")
+        
+        self.assertEqual(analytics.revenue_by_hour(), {36000: 6000, 43200: 2000})
+        self.assertEqual(analytics.top_products(), [("Mouse", 4)])
+        self.assertAlmostEqual(analytics.cancellation_rate(), 1 / 3)
+
+
+class TestOrderAnalytics(unittest.TestCase):
+    """Test per la classe OrderAnalytics."""
+    
+    def test_empty(self):
+        """Verifica le statistiche senza ordini."""
+        analytics = OrderAnalytics()
+        
+        self.assertEqual(analytics.revenue_by_hour(), {})
+        self.assertEqual(analytics.top_products(), [])
+        self.assertEqual(analytics.cancellation_rate(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
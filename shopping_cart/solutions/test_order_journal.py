@@ -0,0 +1,193 @@
+"""
+Test unitari per la classe OrderJournal e per la persistenza degli ordini in OrderService
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from main import OrderJournal, OrderService, PaymentProcessor, ShoppingCart, Product
+
+
+class TestOrderJournal(unittest.TestCase):
+    """Test per la classe OrderJournal."""
+    
+    def setUp(self):
+        """Crea una cartella temporanea per i segmenti del giornale."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = self.tmp.name
+    
+    def make_order(self, number, status="completed"):
+        """Crea un ordine minimale da salvare nel giornale."""
+        return {"order_id": f"order_{number}", "user_details": {"email": "a@b.it"}, "status": status}
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            OrderJournal(self.directory, segment_size=0)
+        with self.assertRaises(ValueError):
+            OrderJournal(self.directory, fsync_every=0)
+    
+    def test_append_and_read(self):
+        """Verifica che un ordine salvato venga riletto, anche prima dell'fsync."""
+        journal = OrderJournal(self.directory, fsync_every=1000)
+        self.addCleanup(journal.close)
+        journal.append(self.make_order(1))
+        
+        self.assertEqual(journal.read("order_1")["status"], "completed")
+        self.assertIsNone(journal.read("order_2"))
+        self.assertEqual(len(journal), 1)
+    
+    def test_read_latest_version(self):
+        """Verifica che venga letta l'ultima versione di un ordine aggiornato."""
+        journal = OrderJournal(self.directory)
+        self.addCleanup(journal.close)
+        journal.append(self.make_order(1))
+        journal.append(self.make_order(1, status="cancelled"))
+        
+        self.assertEqual(journal.read("order_1")["status"], "cancelled")
+        self.assertEqual(len(journal), 1)
+    
+    def test_rotation(self):
+        """Verifica che al superamento della dimensione si passi a un nuovo segmento."""
+        journal = OrderJournal(self.directory, segment_size=200)
+        self.addCleanup(journal.close)
+        for number in range(1, 11):
+            journal.append(self.make_order(number))
+        
+        # Verifichiamo che siano stati creati più segmenti e che tutti gli ordini siano leggibili
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        for number in range(1, 11):
+            self.assertEqual(journal.read(f"order_{number}")["order_id"], f"order_{number}")
+    
+    def test_recovery_after_restart(self):
+        """Verifica che riaprendo il giornale l'indice venga ricostruito e una riga incompleta scartata."""
+        journal = OrderJournal(self.directory, segment_size=200)
+        for number in range(1, 6):
+            journal.append(self.make_order(number))
+        journal.close()
+        
+        # Simuliamo una scrittura interrotta in fondo all'ultimo segmento
+        last_segment = os.path.join(self.directory, sorted(os.listdir(self.directory))[-1])
+        with open(last_segment, "ab") as segment_file:
+            segment_file.write(b'{"order_id": "order_6", "sta')
+        
+        reopened = OrderJournal(self.directory, segment_size=200)
+        self.addCleanup(reopened.close)
+        
+        self.assertEqual(len(reopened), 5)
+        self.assertIsNone(reopened.read("order_6"))
+        self.assertEqual([order["order_id"] for order in reopened.iter_orders()],
+                         [f"order_{number}" for number in range(1, 6)])
+        
+        # Verifichiamo che le nuove scritture seguano l'ultima riga valida
+        reopened.append(self.make_order(6))
+        self.assertEqual(reopened.read("order_6")["order_id"], "order_6")
+
+
+class TestOrderServiceJournal(unittest.TestCase):
+    """Test per la persistenza degli ordini di OrderService su un OrderJournal."""
+    
+    def setUp(self):
+        """Inizializza un processore mock, un prodotto e una cartella per il giornale."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        
+        self.mock_processor = MagicMock(spec=PaymentProcessor)
+        self.mock_processor.process_payment.return_value = {
+            "success": True, "transaction_id": "txn_123456", "amount": 10.0, "timestamp": 1234567890
+        }
+        self.mock_processor.refund_payment.return_value = {
+            "success": True, "refund_id": "ref_123456", "transaction_id": "txn_123456", "timestamp": 1234567890
+        }
+        self.product = Product("P001", "Test Product", 10.0, 100)
+        self.user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+        self.payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+    
+    def open_service(self, **kwargs):
+        """Crea un servizio ordini su un giornale nella cartella temporanea."""
+        journal = OrderJournal(self.tmp.name)
+        self.addCleanup(journal.close)
+        return OrderService(self.mock_processor, journal=journal, **kwargs)
+    
+    def place(self, service):
+        """Effettua un ordine di un prodotto."""
+        cart = ShoppingCart()
+        cart.add_product(self.product, 1)
+        return service.place_order(cart, self.user_details, self.payment_details)
+    
+    def test_max_cached_orders_requires_journal(self):
+        """Verifica che max_cached_orders senza giornale sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            OrderService(self.mock_processor, max_cached_orders=10)
+    
+    def test_eviction_and_lazy_read(self):
+        """Verifica che gli ordini più vecchi lascino la memoria ma restino leggibili dal disco."""
+        service = self.open_service(max_cached_orders=10)
+        for _ in range(25):
+            self.place(service)
+        
+        self.assertLessEqual(len(service.orders), 10)
+        self.assertEqual(service.get_order("order_1")["order_id"], "order_1")
+        self.assertEqual(len(service.get_orders_by_customer("mario@example.com")), 25)
+        self.assertEqual(len(service.get_orders_by_status("completed")), 25)
+    
+    def test_eviction_forgets_customers(self):
+        """Verifica che i dettagli condivisi di un cliente lascino la memoria con i suoi ultimi ordini."""
+        service = self.open_service(max_cached_orders=10)
+        self.place(service)
+        self.assertEqual(len(service._customers), 1)
+        
+        # Gli ordini successivi sono di un altro cliente: il primo esce dalla cache insieme al suo ordine
+        self.user_details = {"name": "Anna Bianchi", "email": "anna@example.com", "address": "Via Po 2"}
+        for _ in range(15):
+            self.place(service)
+        
+        self.assertEqual([key for key in service._customers], [tuple(sorted(self.user_details.items()))])
+        self.assertEqual(service._customer_orders[tuple(sorted(self.user_details.items()))], len(service.orders))
+    
+    def test_restart_restores_orders(self):
+        """Verifica che dopo un riavvio gli ordini e gli indici vengano ripristinati dal giornale."""
+        service = self.open_service()
+        self.place(service)
+        self.place(service)
+        self.assertTrue(service.cancel_order("order_1"))
+        service.journal.close()
+        
+        restarted = self.open_service()
+        
+        self.assertEqual(restarted.get_order("order_1")["status"], "cancelled")
+        self.assertEqual([order["order_id"] for order in restarted.get_orders_by_status("completed")], ["order_2"])
+        self.assertEqual(restarted.analytics.cancellation_rate(), 0.5)
+        
+        # Verifichiamo che la numerazione riprenda senza riutilizzare gli ID
+        self.assertEqual(self.place(restarted)["order_id"], "order_3")
+    
+    def test_restart_reads_each_segment_once(self):
+        """Verifica che al riavvio i segmenti vengano letti una sola volta e gli ordini dei clienti restino in ordine."""
+        journal = OrderJournal(self.tmp.name, segment_size=1000)
+        service = OrderService(self.mock_processor, journal=journal)
+        for _ in range(12):
+            self.place(service)
+        self.assertTrue(service.cancel_order("order_1"))
+        journal.close()
+        segments = len(os.listdir(self.tmp.name))
+        self.assertGreater(segments, 1)
+        
+        restarted_journal = OrderJournal(self.tmp.name, segment_size=1000)
+        self.addCleanup(restarted_journal.close)
+        with patch("builtins.open", wraps=open) as opened:
+            orders = list(restarted_journal.iter_orders())
+        # Al più un'apertura per segmento (uno con sole versioni superate non viene nemmeno aperto)
+        self.assertLessEqual(opened.call_count, segments)
+        self.assertEqual(len(orders), 12)
+        self.assertEqual(orders[-1]["status"], "cancelled")
+        
+        # Verifichiamo che l'ordine annullato resti il primo del cliente
+        restarted = OrderService(self.mock_processor, journal=restarted_journal)
+        self.assertEqual([order["order_id"] for order in restarted.get_orders_by_customer("mario@example.com")],
+                         [f"order_{number}" for number in range(1, 13)])
+
+
+if __name__ == '__main__':
+    unittest.main()
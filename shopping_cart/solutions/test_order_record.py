@@ -0,0 +1,91 @@
+"""
+Test unitari per la classe OrderRecord
+"""
+import json
+import unittest
+from unittest.mock import MagicMock
+from main import OrderRecord, OrderService, PaymentProcessor, ShoppingCart, Product
+
+
+class TestOrderRecord(unittest.TestCase):
+    """Test per la classe OrderRecord."""
+    
+    def setUp(self):
+        """Inizializza un ordine compatto."""
+        self.payment = {"success": True, "transaction_id": "txn_123456", "amount": 59.97, "timestamp": 1234567890}
+        self.order = OrderRecord("order_1", {"email": "mario@example.com"}, [("Mouse", 2), ("Penna", 1)],
+                                 5997, self.payment, 1234567890.0)
+    
+    def test_dict_view(self):
+        """Verifica che l'ordine si legga come il dizionario che sostituisce."""
+        self.assertEqual(self.order["order_id"], "order_1")
+        self.assertEqual(self.order["items"], [("Mouse", 2), ("Penna", 1)])
+        self.assertEqual(self.order["total_amount"], 59.97)
+        self.assertEqual(self.order["total_cents"], 5997)
+        self.assertEqual(self.order["payment"]["transaction_id"], "txn_123456")
+        self.assertEqual(self.order["status"], "completed")
+        self.assertEqual(self.order.get("refund"), None)
+        self.assertNotIn("refund", self.order)
+        with self.assertRaises(KeyError):
+            self.order["color"]
+    
+    def test_setitem(self):
+        """Verifica che solo stato e rimborso siano modificabili."""
+        self.order["status"] = "cancelled"
+        self.order["refund"] = {"success": True, "refund_id": "ref_1"}
+        
+        self.assertEqual(self.order["status"], "cancelled")
+        self.assertIn("refund", self.order)
+        self.assertEqual(len(self.order), 10)
+        with self.assertRaises(KeyError):
+            self.order["total_cents"] = 0
+    
+    def test_serialization(self):
+        """Verifica che dict(order) produca un dizionario serializzabile in JSON, uguale all'ordine."""
+        data = json.loads(json.dumps(dict(self.order)))
+        
+        self.assertEqual(data["items"], [["Mouse", 2], ["Penna", 1]])
+        self.assertEqual(dict(self.order), {**data, "items": [("Mouse", 2), ("Penna", 1)]})
+    
+    def test_slots(self):
+        """Verifica che l'ordine non abbia un __dict__."""
+        self.assertFalse(hasattr(self.order, "__dict__"))
+    
+    def test_service_shares_customers(self):
+        """Verifica che gli ordini dello stesso cliente condividano un unico dizionario dei dettagli utente."""
+        mock_processor = MagicMock(spec=PaymentProcessor)
+        mock_processor.process_payment.return_value = self.payment
+        service = OrderService(mock_processor)
+        product = Product("p1", "Mouse", 19.99, 10)
+        payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+        
+        orders = []
+        for _ in range(2):
+            cart = ShoppingCart()
+            cart.add_product(product, 1)
+            user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+            orders.append(service.place_order(cart, user_details, payment_details))
+        
+        self.assertIsInstance(orders[0], OrderRecord)
+        self.assertIs(orders[0]["user_details"], orders[1]["user_details"])
+    
+    
+    def test_standard_payment_is_compact(self):
+        """Verifica che il pagamento di PaymentProcessor venga ricostruito dai campi dell'ordine."""
+        payment = {"success": True, "transaction_id": "txn_1", "amount": 59.97, "amount_cents": 5997,
+                   "timestamp": 1234567890.5}
+        order = OrderRecord("order_2", {}, [("Mouse", 2)], 5997, payment, 1234567890.0, product_ids=["p1"])
+        
+        # Verifichiamo che non venga tenuto il dizionario, ma che la lettura sia identica
+        self.assertIsNone(order._payment)
+        self.assertEqual(order["payment"], payment)
+        self.assertEqual(order["product_ids"], ["p1"])
+        self.assertEqual(order["items"], [("Mouse", 2)])
+        
+        # Un pagamento con una forma diversa resta com'è
+        self.assertIs(self.order["payment"], self.payment)
+        self.assertEqual(self.order["product_ids"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
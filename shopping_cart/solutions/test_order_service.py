@@ -1,9 +1,16 @@
 """
 Test unitari e di integrazione per la classe OrderService
 """
+import asyncio
+import os
+import tempfile
+import threading
+import time
 import unittest
+from collections.abc import Mapping
 from unittest.mock import patch, MagicMock
-from main import OrderService, PaymentProcessor, ShoppingCart, Product
+from main import (OrderService, AsyncOrderService, PaymentProcessor, ShoppingCart, Product,
+                  StockReservationManager, IdempotencyCache)
 
 
 class TestOrderService(unittest.TestCase):
@@ -90,6 +97,7 @@ class TestOrderService(unittest.TestCase):
         
         # Calcoliamo il totale atteso
         expected_total = self.cart.get_total()
+        expected_cents = self.cart.get_total_cents()
         
         # Configuriamo il mock per simulare un successo di pagamento
         self.mock_payment_processor.process_payment.return_value = {
@@ -102,8 +110,8 @@ class TestOrderService(unittest.TestCase):
         # Eseguiamo l'ordine
         order = self.order_service.place_order(self.cart, self.valid_user_details, self.valid_payment_details)
         
-        # Verifichiamo che il processo di pagamento sia stato chiamato con i parametri corretti
-        self.mock_payment_processor.process_payment.assert_called_once_with(expected_total, self.valid_payment_details)
+        # Verifichiamo che il processo di pagamento sia stato chiamato con l'importo in centesimi interi
+        self.mock_payment_processor.process_payment.assert_called_once_with(expected_cents, self.valid_payment_details)
         
         # Verifichiamo che l'ordine sia stato creato correttamente
         self.assertIn("order_id", order)
@@ -258,6 +266,335 @@ class TestOrderService(unittest.TestCase):
         order = self.order_service.get_order(order_id)
         self.assertEqual(order["status"], "completed")
         self.assertNotIn("refund", order)
+    
+    def test_get_orders_by_customer_and_status(self):
+        """Verifica che gli indici per cliente e stato seguano ordini e annullamenti."""
+        # Configuriamo i mock per simulare successo di pagamento e rimborso
+        self.mock_payment_processor.process_payment.return_value = {
+            "success": True,
+            "transaction_id": "txn_123456",
+            "amount": 999.99,
+            "timestamp": 1234567890
+        }
+        self.mock_payment_processor.refund_payment.return_value = {
+            "success": True,
+            "refund_id": "ref_123456",
+            "transaction_id": "txn_123456",
+            "timestamp": 1234567890
+        }
+        
+        # Due ordini di Mario e uno di un altro cliente
+        other_user_details = dict(self.valid_user_details, email="anna.bianchi@example.com")
+        orders = []
+        for user_details in (self.valid_user_details, other_user_details, self.valid_user_details):
+            self.cart.add_product(self.product2, 1)
+            orders.append(self.order_service.place_order(self.cart, user_details, self.valid_payment_details))
+        
+        # Ricerca per cliente
+        mario_orders = self.order_service.get_orders_by_customer("mario.rossi@example.com")
+        self.assertEqual(mario_orders, [orders[0], orders[2]])
+        self.assertEqual(self.order_service.get_orders_by_customer("nessuno@example.com"), [])
+        
+        # Annulliamo un ordine: l'indice per stato viene aggiornato
+        self.order_service.cancel_order(orders[0]["order_id"])
+        self.assertEqual(self.order_service.get_orders_by_status("completed"), [orders[1], orders[2]])
+        self.assertEqual(self.order_service.get_orders_by_status("cancelled"), [orders[0]])
+    
+    def test_expired_reservation_refunds_payment(self):
+        """Verifica che se la prenotazione scade e lo stock finisce, il pagamento venga rimborsato."""
+        order_service = OrderService(self.mock_payment_processor, StockReservationManager(ttl=0.001))
+        self.cart.add_product(self.product1, 1)
+        
+        def slow_payment(amount, payment_details):
+            # Durante il pagamento la prenotazione scade e un altro cliente compra tutto lo stock
+            time.sleep(0.01)
+            order_service.reservations.hold([(self.product1, 5)], ttl=60)
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        self.mock_payment_processor.process_payment.side_effect = slow_payment
+        
+        with self.assertRaises(ValueError):
+            order_service.place_order(self.cart, self.valid_user_details, self.valid_payment_details)
+        
+        # Il pagamento è stato rimborsato e nessun ordine è stato creato
+        self.mock_payment_processor.refund_payment.assert_called_once_with("txn_123456")
+        self.assertEqual(len(order_service.orders), 0)
+        self.assertEqual(self.product1.stock, 0)
+    
+    def test_place_order_batch_window(self):
+        """Verifica che gli ordini effettuati nella stessa finestra paghino con un solo lotto."""
+        order_service = OrderService(self.mock_payment_processor, batch_window=0.2)
+        self.mock_payment_processor.process_payments.side_effect = lambda batch: [
+            {"success": True, "transaction_id": f"txn_{index}", "amount": amount, "timestamp": 1234567890}
+            for index, (amount, _) in enumerate(batch)
+        ]
+        
+        carts = []
+        for _ in range(3):
+            cart = ShoppingCart()
+            cart.add_product(self.product2, 1)
+            carts.append(cart)
+        
+        start = threading.Barrier(3)
+        
+        def buyer(cart):
+            start.wait()
+            order_service.place_order(cart, self.valid_user_details, self.valid_payment_details)
+        
+        threads = [threading.Thread(target=buyer, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Tre ordini completati con una sola chiamata al gateway
+        self.assertEqual(len(order_service.orders), 3)
+        self.mock_payment_processor.process_payments.assert_called_once()
+        self.mock_payment_processor.process_payment.assert_not_called()
+        self.assertEqual(self.product2.stock, 17)
+    
+    def test_place_orders_thread_pool(self):
+        """Verifica che place_orders elabori gli ordini in parallelo senza vendere più dello stock."""
+        def slow_payment(amount, payment_details):
+            time.sleep(0.01)
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        self.mock_payment_processor.process_payment.side_effect = slow_payment
+        
+        # Dieci ordini da un Laptop ciascuno, ma lo stock è di soli 5 pezzi
+        requests = []
+        for _ in range(10):
+            cart = ShoppingCart()
+            cart.add_product(self.product1, 1)
+            requests.append((cart, self.valid_user_details, self.valid_payment_details))
+        
+        results = list(self.order_service.place_orders(iter(requests), workers=4))
+        
+        # Ogni ordine ha il suo risultato
+        self.assertEqual(sorted(result["index"] for result in results), list(range(10)))
+        successes = [result for result in results if result["success"]]
+        self.assertEqual(len(successes), 5)
+        self.assertEqual(self.product1.stock, 0)
+        self.assertEqual(len(self.order_service.orders), 5)
+        
+        # Gli ordini falliti riportano il motivo
+        failures = [result for result in results if not result["success"]]
+        self.assertTrue(all(result["error"] for result in failures))
+    
+    def test_place_orders_invalid_workers(self):
+        """Verifica che un numero di thread non valido sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            list(self.order_service.place_orders([], workers=0))
+    
+    def test_place_order_idempotency_key(self):
+        """Verifica che un tentativo ripetuto con la stessa chiave non paghi due volte."""
+        self.cart.add_product(self.product1, 1)
+        self.mock_payment_processor.process_payment.return_value = {
+            "success": True,
+            "transaction_id": "txn_123456",
+            "amount": self.cart.get_total(),
+            "timestamp": 1234567890
+        }
+        
+        order = self.order_service.place_order(self.cart, self.valid_user_details, self.valid_payment_details,
+                                               idempotency_key="req-1")
+        
+        # Il client riprova con un nuovo carrello ma la stessa chiave
+        retry_cart = ShoppingCart()
+        retry_cart.add_product(self.product1, 1)
+        retry = self.order_service.place_order(retry_cart, self.valid_user_details, self.valid_payment_details,
+                                               idempotency_key="req-1")
+        
+        # Viene restituito l'ordine originale, senza un secondo pagamento né altro stock
+        self.assertIs(retry, order)
+        self.mock_payment_processor.process_payment.assert_called_once()
+        self.assertEqual(len(self.order_service.orders), 1)
+        self.assertEqual(self.product1.stock, 4)
+    
+    def test_place_order_idempotency_key_after_failure(self):
+        """Verifica che dopo un tentativo fallito la stessa chiave possa essere riutilizzata."""
+        self.cart.add_product(self.product1, 1)
+        self.mock_payment_processor.process_payment.side_effect = [
+            RuntimeError("Pagamento fallito: la transazione è stata rifiutata"),
+            {"success": True, "transaction_id": "txn_123456", "amount": 999.99, "timestamp": 1234567890}
+        ]
+        
+        with self.assertRaises(RuntimeError):
+            self.order_service.place_order(self.cart, self.valid_user_details, self.valid_payment_details,
+                                           idempotency_key="req-1")
+        
+        order = self.order_service.place_order(self.cart, self.valid_user_details, self.valid_payment_details,
+                                               idempotency_key="req-1")
+        self.assertEqual(order["status"], "completed")
+        self.assertEqual(self.mock_payment_processor.process_payment.call_count, 2)
+    
+    def test_place_order_idempotency_in_flight(self):
+        """Verifica che un duplicato arrivato durante il pagamento attenda il primo tentativo."""
+        payment_started = threading.Event()
+        
+        def slow_payment(amount, payment_details):
+            payment_started.set()
+            time.sleep(0.05)
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        self.mock_payment_processor.process_payment.side_effect = slow_payment
+        self.cart.add_product(self.product1, 1)
+        results = []
+        
+        first = threading.Thread(target=lambda: results.append(self.order_service.place_order(
+            self.cart, self.valid_user_details, self.valid_payment_details, idempotency_key="req-1")))
+        first.start()
+        payment_started.wait()
+        
+        # Il duplicato arriva mentre il primo pagamento è ancora in corso
+        retry_cart = ShoppingCart()
+        retry_cart.add_product(self.product1, 1)
+        retry = self.order_service.place_order(retry_cart, self.valid_user_details, self.valid_payment_details,
+                                               idempotency_key="req-1")
+        first.join()
+        
+        self.assertIs(retry, results[0])
+        self.mock_payment_processor.process_payment.assert_called_once()
+    
+    def place_paid_orders(self, count):
+        """Effettua alcuni ordini di un laptop con pagamenti simulati."""
+        self.mock_payment_processor.process_payment.side_effect = [
+            {"success": True, "transaction_id": f"txn_{i}", "amount": 999.99, "timestamp": 1234567890}
+            for i in range(count)
+        ]
+        orders = []
+        for _ in range(count):
+            cart = ShoppingCart()
+            cart.add_product(self.product1, 1)
+            orders.append(self.order_service.place_order(cart, self.valid_user_details, self.valid_payment_details))
+        return orders
+    
+    def test_cancel_order_restocks(self):
+        """Verifica che l'annullamento restituisca allo stock i prodotti dell'ordine."""
+        self.mock_payment_processor.refund_payment.return_value = {"success": True, "refund_id": "ref_1"}
+        order = self.place_paid_orders(1)[0]
+        self.assertEqual(self.product1.stock, 4)
+        
+        self.order_service.cancel_order(order["order_id"])
+        
+        self.assertEqual(self.product1.stock, 5)
+    
+    def test_cancel_order_refund_failure_keeps_stock(self):
+        """Verifica che se il rimborso fallisce lo stock non venga restituito."""
+        self.mock_payment_processor.refund_payment.side_effect = RuntimeError("Rimborso fallito")
+        order = self.place_paid_orders(1)[0]
+        
+        with self.assertRaises(RuntimeError):
+            self.order_service.cancel_order(order["order_id"])
+        
+        self.assertEqual(self.product1.stock, 4)
+    
+    def test_cancel_order_unregistered_products(self):
+        """Verifica che un ordine con prodotti non registrati non venga rimborsato finché non si registrano."""
+        self.mock_payment_processor.refund_payment.return_value = {"success": True, "refund_id": "ref_1"}
+        order = self.place_paid_orders(1)[0]
+        self.order_service._products.clear()  # Come dopo un riavvio
+        
+        with self.assertRaises(RuntimeError):
+            self.order_service.cancel_order(order["order_id"])
+        self.mock_payment_processor.refund_payment.assert_not_called()
+        
+        self.order_service.register_products([self.product1])
+        self.assertTrue(self.order_service.cancel_order(order["order_id"]))
+        self.assertEqual(self.product1.stock, 5)
+    
+    def test_cancel_orders_partial_failure(self):
+        """Verifica che cancel_orders restituisca lo stock solo degli ordini rimborsati, in un'unica operazione."""
+        orders = self.place_paid_orders(4)
+        self.assertEqual(self.product1.stock, 1)
+        
+        def refund(transaction_id):
+            if transaction_id == "txn_1":
+                raise RuntimeError("Rimborso fallito")
+            return {"success": True, "refund_id": f"ref_{transaction_id}"}
+        
+        self.mock_payment_processor.refund_payment.side_effect = refund
+        self.order_service.cancel_order(orders[3]["order_id"])
+        
+        with patch.object(self.order_service.reservations, "restock",
+                          wraps=self.order_service.reservations.restock) as restock:
+            report = self.order_service.cancel_orders([order["order_id"] for order in orders] + ["order_99"])
+        
+        # Verifichiamo il resoconto: annullati, rimborso fallito, già annullato, inesistente
+        self.assertEqual(report["cancelled"], ["order_1", "order_3"])
+        self.assertEqual(set(report["failed"]), {"order_2", "order_4", "order_99"})
+        
+        # Verifichiamo che lo stock sia stato restituito una sola volta, solo per gli ordini rimborsati
+        restock.assert_called_once()
+        self.assertEqual(self.product1.stock, 4)
+        self.assertEqual(orders[1]["status"], "completed")
+    
+    def test_cancel_orders_restocks_marked_orders_on_error(self):
+        """Verifica che se un annullamento solleva un'eccezione gli ordini già annullati riabbiano lo stock."""
+        orders = self.place_paid_orders(3)
+        self.mock_payment_processor.refund_payment.return_value = {"success": True, "refund_id": "ref_1"}
+        mark_cancelled = self.order_service._mark_cancelled
+        
+        def fail_on_second(order, refund_result):
+            if order["order_id"] == "order_2":
+                raise OSError("Disco pieno")
+            mark_cancelled(order, refund_result)
+        
+        with patch.object(self.order_service, "_mark_cancelled", side_effect=fail_on_second):
+            with self.assertRaises(OSError):
+                self.order_service.cancel_orders([order["order_id"] for order in orders])
+        
+        # Verifichiamo che il primo ordine sia annullato e il suo stock restituito, e che nessuna richiesta resti aperta
+        self.assertEqual(orders[0]["status"], "cancelled")
+        self.assertEqual(self.product1.stock, 3)
+        self.assertEqual(self.order_service._cancelling, set())
+    
+    def test_cancel_orders_report_and_rate_limit(self):
+        """Verifica che cancel_orders rispetti la quota di rimborsi e riporti durata e throughput."""
+        orders = self.place_paid_orders(5)
+        self.mock_payment_processor.refund_payment.return_value = {"success": True, "refund_id": "ref_1"}
+        
+        report = self.order_service.cancel_orders([order["order_id"] for order in orders], max_workers=5,
+                                                  rate_limit=50)
+        
+        self.assertEqual(len(report["cancelled"]), 5)
+        self.assertEqual(report["skipped"], [])
+        # 5 rimborsi a 50 al secondo (il primo senza attesa): almeno 0.08 secondi
+        self.assertGreaterEqual(report["elapsed"], 0.07)
+        self.assertAlmostEqual(report["throughput"], 5 / report["elapsed"])
+        self.assertEqual(self.product1.stock, 5)
+    
+    def test_cancel_orders_resume_from_checkpoint(self):
+        """Verifica che un annullamento interrotto riprenda dal checkpoint senza rimborsare due volte."""
+        orders = self.place_paid_orders(5)
+        order_ids = [order["order_id"] for order in orders]
+        refunded = []
+        
+        def refund(transaction_id):
+            # Il gateway si interrompe al quarto rimborso
+            if len(refunded) == 3:
+                raise KeyboardInterrupt
+            refunded.append(transaction_id)
+            return {"success": True, "refund_id": f"ref_{transaction_id}"}
+        
+        self.mock_payment_processor.refund_payment.side_effect = refund
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_path = os.path.join(directory, "cancel.checkpoint")
+            
+            with self.assertRaises(KeyboardInterrupt):
+                self.order_service.cancel_orders(order_ids, max_workers=1, checkpoint_path=checkpoint_path,
+                                                 checkpoint_every=2)
+            
+            # Un servizio riavviato non sa che il primo blocco è già annullato: lo dice il checkpoint
+            refunded.clear()
+            for order in orders:
+                order["status"] = "completed"
+            report = self.order_service.cancel_orders(order_ids, max_workers=1, checkpoint_path=checkpoint_path,
+                                                      checkpoint_every=2)
+        
+        self.assertEqual(report["skipped"], ["order_1", "order_2"])
+        self.assertEqual(report["cancelled"], ["order_3", "order_4", "order_5"])
+        self.assertEqual(refunded, ["txn_2", "txn_3", "txn_4"])
 
 
 class TestOrderServiceIntegration(unittest.TestCase):
@@ -369,5 +706,157 @@ class TestOrderServiceIntegration(unittest.TestCase):
         self.assertEqual(len(self.order_service.orders), 0)
 
 
+class TestAsyncOrderService(unittest.IsolatedAsyncioTestCase):
+    """Test per la classe AsyncOrderService."""
+    
+    def setUp(self):
+        """Inizializza un servizio ordini asincrono con un mock del processore."""
+        self.mock_payment_processor = MagicMock(spec=PaymentProcessor)
+        self.order_service = AsyncOrderService(self.mock_payment_processor)
+        self.product = Product("p1", "Laptop", 999.99, 3)
+        
+        self.valid_user_details = {
+            "name": "Mario Rossi",
+            "email": "mario.rossi@example.com",
+            "address": "Via Roma 123, Milano"
+        }
+        self.valid_payment_details = {
+            "card_number": "4111111111111111",
+            "expiry": "12/25",
+            "cvv": "123"
+        }
+    
+    async def test_concurrent_orders_do_not_oversell(self):
+        """Verifica che ordini concorrenti in attesa di pagamento non vendano più dello stock."""
+        async def slow_payment(amount, payment_details):
+            # Tutti i pagamenti restano in sospeso contemporaneamente
+            await asyncio.sleep(0.01)
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        self.mock_payment_processor.process_payment_async.side_effect = slow_payment
+        
+        # Cinque clienti provano a comprare l'ultimo stock (3 pezzi) nello stesso momento
+        carts = []
+        for _ in range(5):
+            cart = ShoppingCart()
+            cart.add_product(self.product, 1)
+            carts.append(cart)
+        
+        results = await asyncio.gather(
+            *(self.order_service.place_order(cart, self.valid_user_details, self.valid_payment_details) for cart in carts),
+            return_exceptions=True
+        )
+        
+        # Solo tre ordini vanno a buon fine, gli altri falliscono per stock insufficiente
+        orders = [result for result in results if isinstance(result, Mapping)]
+        errors = [result for result in results if isinstance(result, ValueError)]
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(len({order["order_id"] for order in orders}), 3)
+        
+        # I pagamenti sono stati avviati solo per gli ordini con stock riservato
+        self.assertEqual(self.mock_payment_processor.process_payment_async.await_count, 3)
+    
+    async def test_payment_failure_releases_stock(self):
+        """Verifica che un pagamento fallito restituisca lo stock riservato."""
+        self.mock_payment_processor.process_payment_async.side_effect = RuntimeError("Pagamento fallito")
+        
+        cart = ShoppingCart()
+        cart.add_product(self.product, 2)
+        
+        with self.assertRaises(RuntimeError):
+            await self.order_service.place_order(cart, self.valid_user_details, self.valid_payment_details)
+        
+        # Lo stock torna al valore iniziale e il carrello non viene svuotato
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(cart.get_item_count(), 2)
+        self.assertEqual(len(self.order_service.orders), 0)
+    
+    async def test_cancel_order(self):
+        """Verifica che l'annullamento asincrono rimborsi l'ordine una sola volta."""
+        self.mock_payment_processor.process_payment_async.return_value = {
+            "success": True, "transaction_id": "txn_123456", "amount": 999.99, "timestamp": 1234567890
+        }
+        self.mock_payment_processor.refund_payment_async.return_value = {
+            "success": True, "refund_id": "ref_123456", "transaction_id": "txn_123456", "timestamp": 1234567890
+        }
+        
+        cart = ShoppingCart()
+        cart.add_product(self.product, 1)
+        order = await self.order_service.place_order(cart, self.valid_user_details, self.valid_payment_details)
+        
+        self.assertTrue(await self.order_service.cancel_order(order["order_id"]))
+        self.assertEqual(order["status"], "cancelled")
+        self.assertEqual(self.order_service.get_orders_by_status("cancelled"), [order])
+        
+        with self.assertRaises(RuntimeError):
+            await self.order_service.cancel_order(order["order_id"])
+        self.mock_payment_processor.refund_payment_async.assert_awaited_once_with("txn_123456")
+    
+    async def test_place_orders(self):
+        """Verifica che place_orders restituisca i risultati degli ordini e non coroutine da attendere."""
+        running = 0
+        peak = 0
+        
+        async def slow_payment(amount, payment_details):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        self.mock_payment_processor.process_payment_async.side_effect = slow_payment
+        
+        # Cinque ordini da un Laptop ciascuno, ma lo stock è di soli 3 pezzi
+        requests = []
+        for _ in range(5):
+            cart = ShoppingCart()
+            cart.add_product(self.product, 1)
+            requests.append((cart, self.valid_user_details, self.valid_payment_details))
+        
+        results = [result async for result in self.order_service.place_orders(iter(requests), workers=2)]
+        
+        # Ogni ordine ha il suo risultato, con al più due pagamenti in corso insieme
+        self.assertEqual(sorted(result["index"] for result in results), list(range(5)))
+        successes = [result for result in results if result["success"]]
+        self.assertEqual(len(successes), 3)
+        self.assertTrue(all(isinstance(result["order"], Mapping) for result in successes))
+        self.assertTrue(all(result["error"] for result in results if not result["success"]))
+        self.assertEqual(self.product.stock, 0)
+        self.assertLessEqual(peak, 2)
+        
+        with self.assertRaises(ValueError):
+            [result async for result in self.order_service.place_orders([], workers=0)]
+
+
+class TestIdempotencyCache(unittest.TestCase):
+    """Test per la classe IdempotencyCache."""
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            IdempotencyCache(max_size=0)
+        with self.assertRaises(ValueError):
+            IdempotencyCache(ttl=0)
+    
+    def test_eviction_and_expiry(self):
+        """Verifica che la cache scarti le chiavi meno recenti e quelle scadute."""
+        cache = IdempotencyCache(max_size=2, ttl=0.05)
+        for key in ("a", "b", "c"):
+            self.assertIsNone(cache.claim(key))
+            cache.complete(key, {"order_id": key})
+        
+        # "a" è stata scartata perché la cache contiene al più due chiavi
+        self.assertEqual(cache.claim("c"), {"order_id": "c"})
+        self.assertIsNone(cache.claim("a"))
+        cache.complete("a")
+        
+        # Dopo la scadenza anche "c" non è più valida
+        time.sleep(0.06)
+        self.assertIsNone(cache.claim("c"))
+
+
 if __name__ == '__main__':
     unittest.main()
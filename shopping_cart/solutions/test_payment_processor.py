@@ -2,10 +2,11 @@
 Test unitari per la classe PaymentProcessor
 """
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import threading
 import time
 import random
-from main import PaymentProcessor
+from main import OrderService, PaymentProcessor, PaymentBatcher, Product, ShoppingCart
 
 
 class TestPaymentProcessor(unittest.TestCase):
@@ -35,12 +36,13 @@ class TestPaymentProcessor(unittest.TestCase):
         mock_sleep.return_value = None  # Evita di attendere durante i test
         
         # Eseguiamo il pagamento
-        result = self.processor.process_payment(100.0, self.valid_payment_details)
+        result = self.processor.process_payment(10000, self.valid_payment_details)
         
         # Verifichiamo che il risultato sia corretto
         self.assertTrue(result["success"])
         self.assertIn("transaction_id", result)
         self.assertEqual(result["amount"], 100.0)
+        self.assertEqual(result["amount_cents"], 10000)
         self.assertIn("timestamp", result)
         
         # Verifichiamo che time.sleep sia stato chiamato
@@ -56,7 +58,7 @@ class TestPaymentProcessor(unittest.TestCase):
         
         # Verifichiamo che venga sollevata un'eccezione
         with self.assertRaises(RuntimeError):
-            self.processor.process_payment(100.0, self.valid_payment_details)
+            self.processor.process_payment(10000, self.valid_payment_details)
         
         # Verifichiamo che time.sleep sia stato chiamato
         mock_sleep.assert_called_once_with(0.5)
@@ -72,7 +74,13 @@ class TestPaymentProcessor(unittest.TestCase):
         
         # Verifichiamo che venga sollevata un'eccezione
         with self.assertRaises(ValueError):
-            self.processor.process_payment(100.0, incomplete_details)
+            self.processor.process_payment(10000, incomplete_details)
+    
+    def test_process_payment_requires_integer_cents(self):
+        """Verifica che un importo non espresso in centesimi interi positivi sollevi un'eccezione."""
+        for amount in (100.0, 0, -500, True):
+            with self.assertRaises(ValueError):
+                self.processor.process_payment(amount, self.valid_payment_details)
     
     @patch('time.sleep')  # Mock per evitare il ritardo durante i test
     @patch('random.random')  # Mock per controllare la simulazione di successo/fallimento
@@ -123,7 +131,7 @@ class TestPaymentProcessor(unittest.TestCase):
             with patch('time.sleep'):
                 with patch('random.random', return_value=0.5):
                     # Eseguiamo il pagamento
-                    self.processor.process_payment(100.0, self.valid_payment_details)
+                    self.processor.process_payment(10000, self.valid_payment_details)
                     
                     # Verifichiamo che print sia stato chiamato con il messaggio corretto
                     mock_print.assert_called_once_with("Elaborazione pagamento di €100.00...")
@@ -140,6 +148,155 @@ class TestPaymentProcessor(unittest.TestCase):
                     
                     # Verifichiamo che print sia stato chiamato con il messaggio corretto
                     mock_print.assert_called_once_with("Elaborazione rimborso per la transazione txn_123456...")
+    
+    @patch('builtins.print')  # Evita l'output durante i test
+    @patch('time.sleep')  # Mock per evitare il ritardo durante i test
+    @patch('random.random')  # Mock per controllare la simulazione di successo/fallimento
+    def test_process_payments_batch(self, mock_random, mock_sleep, mock_print):
+        """Verifica che process_payments paghi la latenza una sola volta e dia un risultato per elemento."""
+        # Il secondo pagamento valido fallisce
+        mock_random.side_effect = [0.5, 0.95]
+        
+        results = self.processor.process_payments([
+            (10000, self.valid_payment_details),
+            (5000, {"card_number": "4111111111111111"}),  # Dettagli incompleti
+            (2500, self.valid_payment_details),
+        ])
+        
+        # Una sola chiamata simulata per tutto il lotto
+        mock_sleep.assert_called_once_with(0.5)
+        
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[0]["amount"], 100.0)
+        self.assertFalse(results[1]["success"])
+        self.assertIn("expiry", results[1]["error"])
+        self.assertFalse(results[2]["success"])
+        self.assertEqual(results[2]["amount_cents"], 2500)
+
+
+class TestPaymentProcessorAsync(unittest.IsolatedAsyncioTestCase):
+    """Test per i metodi asincroni della classe PaymentProcessor."""
+    
+    def setUp(self):
+        """Inizializza un processore di pagamenti prima di ogni test."""
+        self.processor = PaymentProcessor(api_key="test_api_key")
+        self.valid_payment_details = {
+            "card_number": "4111111111111111",
+            "expiry": "12/25",
+            "cvv": "123"
+        }
+    
+    @patch('builtins.print')  # Evita l'output durante i test
+    @patch('asyncio.sleep', new_callable=AsyncMock)  # Mock per evitare il ritardo durante i test
+    @patch('random.random')  # Mock per controllare la simulazione di successo/fallimento
+    async def test_process_payment_async_success(self, mock_random, mock_sleep, mock_print):
+        """Verifica che process_payment_async attenda la latenza senza bloccare e restituisca il risultato."""
+        mock_random.return_value = 0.5  # Valore inferiore a 0.9 per il successo
+        
+        result = await self.processor.process_payment_async(10000, self.valid_payment_details)
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["amount"], 100.0)
+        mock_sleep.assert_awaited_once_with(0.5)
+    
+    @patch('builtins.print')  # Evita l'output durante i test
+    @patch('asyncio.sleep', new_callable=AsyncMock)  # Mock per evitare il ritardo durante i test
+    @patch('random.random')  # Mock per controllare la simulazione di successo/fallimento
+    async def test_async_failures(self, mock_random, mock_sleep, mock_print):
+        """Verifica che i metodi asincroni sollevino le stesse eccezioni di quelli sincroni."""
+        mock_random.return_value = 0.99  # Valore che fa fallire sia pagamenti che rimborsi
+        
+        with self.assertRaises(RuntimeError):
+            await self.processor.process_payment_async(10000, self.valid_payment_details)
+        with self.assertRaises(RuntimeError):
+            await self.processor.refund_payment_async("txn_123456")
+        with self.assertRaises(ValueError):
+            await self.processor.process_payment_async(10000, {"card_number": "4111111111111111"})
+        with self.assertRaises(ValueError):
+            await self.processor.refund_payment_async("invalid_id")
+
+
+class TestPaymentBatcher(unittest.TestCase):
+    """Test per la classe PaymentBatcher."""
+    
+    def setUp(self):
+        """Inizializza un mock del processore che approva tutti i pagamenti tranne quelli da 13 euro."""
+        self.mock_processor = MagicMock(spec=PaymentProcessor)
+        self.mock_processor.process_payments.side_effect = lambda batch: [
+            {"success": amount != 13.0, "transaction_id": f"txn_{index}", "amount": amount, "error": "rifiutato"}
+            for index, (amount, _) in enumerate(batch)
+        ]
+        self.payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            PaymentBatcher(self.mock_processor, window=-1)
+        with self.assertRaises(ValueError):
+            PaymentBatcher(self.mock_processor, max_batch_size=0)
+    
+    def test_concurrent_payments_share_one_batch(self):
+        """Verifica che i pagamenti richiesti nella stessa finestra vengano inviati insieme."""
+        batcher = PaymentBatcher(self.mock_processor, window=0.2)
+        results = {}
+        start = threading.Barrier(5)
+        
+        def pay(amount):
+            start.wait()
+            try:
+                results[amount] = batcher.submit(amount, self.payment_details)
+            except RuntimeError as e:
+                results[amount] = e
+        
+        threads = [threading.Thread(target=pay, args=(float(amount),)) for amount in (10, 11, 12, 13, 14)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Una sola chiamata al gateway con tutti e cinque i pagamenti
+        self.mock_processor.process_payments.assert_called_once()
+        self.assertEqual(len(self.mock_processor.process_payments.call_args[0][0]), 5)
+        
+        # Ogni thread riceve il proprio risultato; il pagamento rifiutato solleva un'eccezione
+        self.assertEqual(results[10.0]["amount"], 10.0)
+        self.assertIsInstance(results[13.0], RuntimeError)
+    
+    def test_max_batch_size(self):
+        """Verifica che un lotto pieno venga inviato senza attendere la fine della finestra."""
+        batcher = PaymentBatcher(self.mock_processor, window=5, max_batch_size=1)
+        
+        result = batcher.submit(10.0, self.payment_details)
+        
+        self.assertTrue(result["success"])
+        self.mock_processor.process_payments.assert_called_once_with([(10.0, self.payment_details)])
+    
+    def test_gateway_error_fails_whole_batch(self):
+        """Verifica che un errore del gateway faccia fallire i pagamenti del lotto."""
+        self.mock_processor.process_payments.side_effect = RuntimeError("Gateway non raggiungibile")
+        batcher = PaymentBatcher(self.mock_processor, window=0)
+        
+        with self.assertRaises(RuntimeError):
+            batcher.submit(10.0, self.payment_details)
+    
+    
+    def test_invalid_details_raise_value_error(self):
+        """Verifica che dettagli di pagamento non validi sollevino ValueError come senza raggruppamento."""
+        batcher = PaymentBatcher(PaymentProcessor(), window=0)
+        
+        with self.assertRaises(ValueError):
+            batcher.submit(10.0, {"card_number": "4111111111111111", "cvv": "123"})
+        
+        # Verifichiamo che anche place_order mantenga il contratto e restituisca lo stock riservato
+        product = Product("p1", "Mouse", 10.0, 5)
+        cart = ShoppingCart()
+        cart.add_product(product, 1)
+        service = OrderService(PaymentProcessor(), batch_window=0)
+        user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+        with self.assertRaises(ValueError):
+            service.place_order(cart, user_details, {"card_number": "4111111111111111", "cvv": "123"})
+        self.assertEqual(product.stock, 5)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+"""
+Test unitari per la classe PriceEngine
+"""
+import unittest
+import main
+from main import PriceEngine, ShoppingCart, Product, ProductCatalog
+
+
+class TestPriceEngine(unittest.TestCase):
+    """Test per la classe PriceEngine, con il calcolo in puro Python."""
+    
+    use_numpy = False
+    
+    def setUp(self):
+        """Inizializza un motore dei prezzi e un carrello con alcune righe."""
+        self.engine = PriceEngine(use_numpy=self.use_numpy)
+        self.products = [Product(f"p{i}", f"Articolo {i}", 0.99 + i * 1.37, 1000) for i in range(200)]
+        self.cart = ShoppingCart()
+        for i, product in enumerate(self.products):
+            self.cart.add_product(product, i % 7 + 1)
+    
+    def test_line_totals(self):
+        """Verifica che i totali delle righe siano prezzo per quantità, in centesimi."""
+        totals = self.engine.line_totals_cents(self.cart)
+        
+        expected = [product.price_cents * quantity for product, quantity in self.cart.items.values()]
+        self.assertEqual(totals, expected)
+    
+    def test_cart_total_matches_cart(self):
+        """Verifica che il totale ricalcolato coincida con quello del carrello, con e senza sconto."""
+        self.assertEqual(self.engine.cart_total_cents(self.cart), self.cart.get_total_cents())
+        
+        self.cart.apply_discount(17.5)
+        self.assertEqual(self.engine.cart_total_cents(self.cart), self.cart.get_total_cents())
+    
+    def test_reprice(self):
+        """Verifica che il riprezzamento arrotondi come lo sconto del carrello."""
+        expected = [main.discount_cents(product.price_cents, 12.5) for product in self.products]
+        
+        self.engine.reprice(self.products, 12.5)
+        
+        self.assertEqual([product.price_cents for product in self.products], expected)
+    
+    def test_reprice_invalid(self):
+        """Verifica che percentuali non valide sollevino un'eccezione senza modificare i prezzi."""
+        for percent in (-1, 100, 10.005):
+            with self.assertRaises(ValueError):
+                self.engine.reprice(self.products, percent)
+        self.assertEqual(self.products[0].price_cents, 99)
+    
+    def test_reprice_keeps_price_positive(self):
+        """Verifica che uno sconto molto alto non porti un prezzo a zero."""
+        cheap = Product("c1", "Caramella", 0.01, 1)
+        
+        self.engine.reprice([cheap], 99.99)
+        
+        self.assertEqual(cheap.price_cents, 1)
+    
+    def test_reprice_catalog(self):
+        """Verifica che il riprezzamento del catalogo aggiorni l'array dei prezzi, anche per categoria."""
+        catalog = ProductCatalog()
+        for i in range(300):
+            catalog.add_product(f"k{i}", f"Articolo {i}", 0.99 + i * 1.37, 10, category="libri" if i % 3 else "musica")
+        catalog.add_product("k-min", "Caramella", 0.01, 10, category="musica")
+        before = [product.price_cents for product in catalog]
+        
+        self.assertEqual(self.engine.reprice_catalog(catalog, 20, category="musica"), 101)
+        expected = [main.discount_cents(price, 20) if i % 3 == 0 else price for i, price in enumerate(before[:300])]
+        self.assertEqual([product.price_cents for product in catalog][:300], expected)
+        self.assertEqual(catalog.get_product("k-min").price_cents, 1)
+        
+        # Tutto il catalogo, e il catalogo può ancora crescere dopo il riprezzamento
+        self.assertEqual(self.engine.reprice_catalog(catalog, 10), 301)
+        self.assertEqual(catalog.get_product("k1").price_cents, main.discount_cents(before[1], 10))
+        catalog.add_product("k-new", "Nuovo", 5.0, 1)
+        self.assertEqual(catalog.get_product("k-new").price_cents, 500)
+        
+        with self.assertRaises(ValueError):
+            self.engine.reprice_catalog(catalog, 100)
+    
+    def test_reprice_catalog_products(self):
+        """Verifica che riprezzare una lista di prodotti dello stesso catalogo dia gli stessi prezzi di reprice."""
+        catalog = ProductCatalog()
+        products = [catalog.add_product(f"k{i}", f"Articolo {i}", 0.99 + i * 1.37, 10) for i in range(50)]
+        expected = [main.discount_cents(product.price_cents, 12.5) for product in products[::2]]
+        
+        self.engine.reprice(products[::2], 12.5)
+        
+        self.assertEqual([product.price_cents for product in products[::2]], expected)
+        self.assertEqual(products[1].price_cents, 99 + 137)
+    
+    def test_reprice_refreshes_open_carts(self):
+        """Verifica che un carrello aperto usi i nuovi prezzi, come il motore."""
+        total = self.cart.get_total_cents()
+        
+        self.engine.reprice(self.products, 50)
+        
+        expected = sum(product.price_cents * quantity for product, quantity in self.cart.items.values())
+        self.assertEqual(self.cart.get_total_cents(), expected)
+        self.assertEqual(self.engine.cart_total_cents(self.cart), expected)
+        self.assertLess(expected, total)
+
+
+@unittest.skipUnless(main.np is not None, "NumPy non è installato")
+class TestPriceEngineNumpy(TestPriceEngine):
+    """Ripete i test di PriceEngine con il calcolo vettoriale di NumPy."""
+    
+    use_numpy = True
+
+
+class TestPriceEngineWithoutNumpy(unittest.TestCase):
+    """Test per PriceEngine quando NumPy non è disponibile."""
+    
+    def test_numpy_required(self):
+        """Verifica che richiedere NumPy quando manca sollevi un'eccezione e che il default ripieghi sul puro Python."""
+        original = main.np
+        main.np = None
+        try:
+            with self.assertRaises(ImportError):
+                PriceEngine(use_numpy=True)
+            self.assertFalse(PriceEngine().use_numpy)
+        finally:
+            main.np = original
+
+
+if __name__ == '__main__':
+    unittest.main()
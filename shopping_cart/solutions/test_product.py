@@ -30,6 +30,13 @@ class TestProduct(unittest.TestCase):
         # Prezzo negativo
         with self.assertRaises(ValueError):
             Product("p3", "Tastiera", -10.99, 10)
+        
+        # Prezzo positivo ma arrotondato a zero centesimi
+        with self.assertRaises(ValueError):
+            Product("p4", "Graffetta", 0.004, 10)
+        with self.assertRaises(ValueError):
+            self.product.price = 0.004
+        self.assertEqual(self.product.price_cents, 99999)
     
     def test_init_invalid_stock(self):
         """Verifica che l'inizializzazione sollevi un'eccezione con stock negativo."""
@@ -106,6 +113,22 @@ class TestProduct(unittest.TestCase):
         
         # Verifichiamo che lo stock non sia cambiato
         self.assertEqual(self.product.stock, 5)
+    
+    def test_price_cents(self):
+        """Verifica che il prezzo venga conservato in centesimi interi, arrotondati al centesimo."""
+        self.assertEqual(self.product.price_cents, 99999)
+        self.assertEqual(Product("p2", "Gomma", 0.285, 1).price_cents, 29)  # 0.285 come float vale 0.28499...
+        
+        # Verifichiamo che modificando il prezzo in euro si aggiornino i centesimi
+        self.product.price = 19.9
+        self.assertEqual(self.product.price_cents, 1990)
+        self.assertEqual(self.product.price, 19.9)
+    
+    def test_slots(self):
+        """Verifica che i prodotti non abbiano un __dict__ e rifiutino attributi non previsti."""
+        self.assertFalse(hasattr(self.product, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.product.color = "nero"
 
 
 if __name__ == '__main__':
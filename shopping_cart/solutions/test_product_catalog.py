@@ -0,0 +1,206 @@
+"""
+Test unitari per le classi ProductCatalog e CatalogProduct
+"""
+import sys
+import threading
+import unittest
+from main import ProductCatalog, CatalogProduct, ShoppingCart, StockReservationManager
+
+
+class TestProductCatalog(unittest.TestCase):
+    """Test per la classe ProductCatalog."""
+    
+    def setUp(self):
+        """Inizializza un catalogo con due prodotti."""
+        self.catalog = ProductCatalog()
+        self.laptop = self.catalog.add_product("p1", "Laptop", 999.99, 5, category="informatica")
+        self.mouse = self.catalog.add_product("p2", "Mouse", 29.99, 20)
+    
+    def test_add_and_get(self):
+        """Verifica che i prodotti aggiunti siano recuperabili per ID."""
+        self.assertEqual(len(self.catalog), 2)
+        self.assertIn("p1", self.catalog)
+        self.assertNotIn("p9", self.catalog)
+        self.assertIsNone(self.catalog.get_product("p9"))
+        
+        product = self.catalog.get_product("p1")
+        self.assertEqual(product, self.laptop)
+        self.assertEqual(product.name, "Laptop")
+        self.assertEqual(product.price, 999.99)
+        self.assertEqual(product.price_cents, 99999)
+        self.assertEqual(product.stock, 5)
+        self.assertEqual(product.category, "informatica")
+        self.assertEqual([product.product_id for product in self.catalog], ["p1", "p2"])
+    
+    def test_add_invalid(self):
+        """Verifica che prodotti duplicati o non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            self.catalog.add_product("p1", "Laptop", 999.99)
+        with self.assertRaises(ValueError):
+            self.catalog.add_product("p3", "Gratis", 0)
+        with self.assertRaises(ValueError):
+            self.catalog.add_product("p3", "Quasi gratis", 0.004)
+        self.assertNotIn("p3", self.catalog)
+        with self.assertRaises(ValueError):
+            self.catalog.add_product("p3", "Negativo", 1.0, -1)
+    
+    def test_handles_share_arrays(self):
+        """Verifica che le modifiche fatte da un riferimento siano viste da tutti gli altri."""
+        self.laptop.reserve(2)
+        self.catalog.get_product("p1").restock(1)
+        self.mouse.price = 24.5
+        
+        self.assertEqual(self.catalog.get_product("p1").stock, 4)
+        self.assertEqual(self.catalog.get_product("p2").price_cents, 2450)
+        self.assertFalse(self.laptop.is_available(5))
+        with self.assertRaises(ValueError):
+            self.laptop.reserve(5)
+    
+    def test_handles_are_compact(self):
+        """Verifica che i riferimenti non abbiano un __dict__."""
+        self.assertIsInstance(self.laptop, CatalogProduct)
+        self.assertFalse(hasattr(self.laptop, "__dict__"))
+    
+    def test_works_with_cart_and_reservations(self):
+        """Verifica che i prodotti del catalogo si comportino come Product in carrello e prenotazioni."""
+        cart = ShoppingCart()
+        cart.add_product(self.laptop, 2)
+        cart.add_product(self.catalog.get_product("p1"), 1)
+        self.assertEqual(cart.get_item_count(), 3)
+        self.assertEqual(cart.get_total_cents(), 3 * 99999)
+        
+        reservations = StockReservationManager()
+        reservation_id = reservations.hold(cart.checkout())
+        self.assertEqual(self.laptop.stock, 2)
+        reservations.release(reservation_id)
+        self.assertEqual(self.laptop.stock, 5)
+    
+    def test_concurrent_hold_and_reserve_many(self):
+        """Verifica che prenotazioni del gestore e reserve_many concorrenti non perdano aggiornamenti dello stock."""
+        product = self.catalog.add_product("p9", "Cavo", 1.0, 200_000)
+        reservations = StockReservationManager()
+        
+        def hold_many():
+            for _ in range(20_000):
+                reservations.commit(reservations.hold([(product, 1)]))
+        
+        def reserve_many():
+            for _ in range(20_000):
+                self.catalog.reserve_many({"p9": 1})
+        
+        # Cambi di thread molto frequenti, per far intrecciare letture e scritture dello stock
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=hold_many), threading.Thread(target=reserve_many)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        
+        self.assertEqual(product.stock, 200_000 - 40_000)
+    
+    def test_catalog_product_reserve_is_atomic(self):
+        """Verifica che reserve e restock di un CatalogProduct controllino e aggiornino lo stock insieme."""
+        with self.assertRaises(ValueError):
+            self.laptop.reserve(6)
+        self.assertEqual(self.laptop.stock, 5)
+        self.assertTrue(self.laptop.reserve(5))
+        self.assertEqual(self.laptop.restock(2), 2)
+        with self.assertRaises(ValueError):
+            self.laptop.restock(-1)
+    
+    def test_restock_many(self):
+        """Verifica che il rifornimento in blocco aggiorni tutti i prodotti."""
+        self.assertEqual(self.catalog.restock_many({"p1": 3, "p2": 10}), {})
+        
+        self.assertEqual(self.laptop.stock, 8)
+        self.assertEqual(self.mouse.stock, 30)
+    
+    def test_restock_many_all_or_nothing(self):
+        """Verifica che un solo prodotto non valido annulli tutto il rifornimento e venga segnalato."""
+        failures = self.catalog.restock_many({"p1": 3, "p2": -1, "p9": 1})
+        
+        self.assertEqual(set(failures), {"p2", "p9"})
+        self.assertEqual(self.laptop.stock, 5)
+        self.assertEqual(self.mouse.stock, 20)
+    
+    def test_reserve_many(self):
+        """Verifica che la prenotazione in blocco sia "tutto o niente" e segnali i prodotti non disponibili."""
+        failures = self.catalog.reserve_many({"p1": 6, "p2": 5})
+        self.assertEqual(list(failures), ["p1"])
+        self.assertIn("disponibili 5", failures["p1"])
+        self.assertEqual(self.mouse.stock, 20)
+        
+        self.assertEqual(self.catalog.reserve_many({"p1": 5, "p2": 5}), {})
+        self.assertEqual(self.laptop.stock, 0)
+        self.assertEqual(self.mouse.stock, 15)
+    
+    def test_bulk_on_empty_catalog(self):
+        """Verifica che su un catalogo vuoto tutti i prodotti vengano segnalati come mancanti."""
+        self.assertEqual(list(ProductCatalog().reserve_many({"p1": 1})), ["p1"])
+
+
+class TestProductCatalogLowStock(unittest.TestCase):
+    """Test per l'indice di scorta bassa e le notifiche di soglia di ProductCatalog."""
+    
+    def setUp(self):
+        """Inizializza un catalogo con indice di scorta bassa e alcuni prodotti."""
+        self.catalog = ProductCatalog(low_stock_limit=10)
+        self.products = [self.catalog.add_product(f"p{i}", f"Articolo {i}", 1.0, stock)
+                         for i, stock in enumerate([50, 3, 8, 0, 12])]
+        self.events = []
+    
+    def record(self, product, old, new):
+        """Registra una notifica di soglia."""
+        self.events.append((product.product_id, old, new))
+    
+    def test_init_invalid(self):
+        """Verifica che un limite non positivo sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            ProductCatalog(low_stock_limit=0)
+    
+    def test_get_low_stock(self):
+        """Verifica che vengano restituiti solo i prodotti sotto la soglia, dallo stock più basso."""
+        self.assertEqual([product.product_id for product in self.catalog.get_low_stock(5)], ["p3", "p1"])
+        self.assertEqual([product.product_id for product in self.catalog.get_low_stock(10)], ["p3", "p1", "p2"])
+        
+        with self.assertRaises(ValueError):
+            self.catalog.get_low_stock(11)
+        with self.assertRaises(ValueError):
+            ProductCatalog().get_low_stock(1)
+    
+    def test_index_follows_stock_changes(self):
+        """Verifica che l'indice segua reserve, restock e le operazioni in blocco."""
+        self.products[0].reserve(45)  # 50 -> 5
+        self.products[1].restock(20)  # 3 -> 23
+        self.catalog.reserve_many({"p4": 10})  # 12 -> 2
+        
+        self.assertEqual([product.product_id for product in self.catalog.get_low_stock(10)], ["p3", "p4", "p0", "p2"])
+    
+    def test_threshold_listener(self):
+        """Verifica che le notifiche arrivino solo quando lo stock attraversa la soglia."""
+        self.catalog.add_threshold_listener(5, self.record)
+        
+        self.products[0].reserve(40)  # 50 -> 10: nessun attraversamento
+        self.products[0].reserve(6)   # 10 -> 4: scende sotto 5
+        self.products[0].reserve(1)   # 4 -> 3: già sotto
+        self.catalog.restock_many({"p0": 2, "p1": 1})  # 3 -> 5 torna alla soglia, 3 -> 4 no
+        
+        self.assertEqual(self.events, [("p0", 10, 4), ("p0", 3, 5)])
+    
+    def test_multiple_thresholds_crossed(self):
+        """Verifica che una sola variazione notifichi tutte le soglie attraversate."""
+        self.catalog.add_threshold_listener(5, self.record)
+        self.catalog.add_threshold_listener(20, self.record)
+        self.catalog.add_threshold_listener(100, self.record)
+        
+        self.products[0].reserve(48)  # 50 -> 2
+        
+        self.assertEqual(self.events, [("p0", 50, 2), ("p0", 50, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+"""
+Test unitari per le promozioni e per la classe PromotionEngine
+"""
+import unittest
+from unittest.mock import patch
+from main import (Promotion, PromotionEngine, PercentagePromotion, BuyXGetYPromotion, TieredPromotion,
+                  ShoppingCart, Product)
+
+
+class TestPromotions(unittest.TestCase):
+    """Test per le singole regole promozionali."""
+    
+    def setUp(self):
+        """Inizializza alcuni prodotti di categorie diverse."""
+        self.laptop = Product("p1", "Laptop", 1000.0, 10, category="informatica")
+        self.mouse = Product("p2", "Mouse", 20.0, 100, category="informatica")
+        self.pen = Product("p3", "Penna", 1.5, 100, category="cancelleria")
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            PercentagePromotion("Senza gruppo", 10)
+        with self.assertRaises(ValueError):
+            PercentagePromotion("Troppo", 150, category="informatica")
+        with self.assertRaises(ValueError):
+            BuyXGetYPromotion("Nulla", 0, 1, product_ids=["p3"])
+        with self.assertRaises(ValueError):
+            TieredPromotion("Vuota", [], category="cancelleria")
+    
+    def test_incomplete_rule_fails_on_construction(self):
+        """Verifica che una regola senza discount_cents non si possa nemmeno creare."""
+        class WithoutDiscount(Promotion):
+            pass
+        
+        with self.assertRaises(TypeError):
+            WithoutDiscount("Incompleta", category="cancelleria")
+        with self.assertRaises(TypeError):
+            Promotion("Astratta", category="cancelleria")
+    
+    def test_applies_to(self):
+        """Verifica che una promozione si applichi ai prodotti indicati e a quelli della categoria."""
+        promotion = PercentagePromotion("Back to school", 10, product_ids=["p2"], category="cancelleria")
+        
+        self.assertTrue(promotion.applies_to(self.mouse))
+        self.assertTrue(promotion.applies_to(self.pen))
+        self.assertFalse(promotion.applies_to(self.laptop))
+    
+    def test_percentage(self):
+        """Verifica lo sconto percentuale sul subtotale del gruppo."""
+        promotion = PercentagePromotion("Informatica -10%", 10, category="informatica")
+        
+        self.assertEqual(promotion.discount_cents([(self.laptop, 1), (self.mouse, 2)]), 10400)
+    
+    def test_buy_x_get_y(self):
+        """Verifica che ogni buy + get unità, get siano gratuite."""
+        promotion = BuyXGetYPromotion("3x2", 2, 1, product_ids=["p3"])
+        
+        self.assertEqual(promotion.discount_cents([(self.pen, 2)]), 0)
+        self.assertEqual(promotion.discount_cents([(self.pen, 7)]), 300)  # 2 penne gratis
+    
+    def test_tiered(self):
+        """Verifica che si applichi lo scaglione più alto raggiunto dalla quantità totale."""
+        promotion = TieredPromotion("Scaglioni", [(10, 5), (50, 10)], category="cancelleria")
+        
+        self.assertEqual(promotion.discount_cents([(self.pen, 9)]), 0)
+        self.assertEqual(promotion.discount_cents([(self.pen, 10)]), 75)
+        self.assertEqual(promotion.discount_cents([(self.pen, 50)]), 750)
+
+
+class TestPromotionEngine(unittest.TestCase):
+    """Test per la classe PromotionEngine e per il suo uso in ShoppingCart."""
+    
+    def setUp(self):
+        """Inizializza un motore con più promozioni e un carrello che lo usa."""
+        self.laptop = Product("p1", "Laptop", 1000.0, 10, category="informatica")
+        self.mouse = Product("p2", "Mouse", 20.0, 100, category="informatica")
+        self.pen = Product("p3", "Penna", 1.5, 100, category="cancelleria")
+        self.engine = PromotionEngine([
+            PercentagePromotion("Laptop -5%", 5, product_ids=["p1"]),
+            PercentagePromotion("Informatica -10%", 10, category="informatica"),
+            BuyXGetYPromotion("Penne 3x2", 2, 1, product_ids=["p3"]),
+        ])
+        self.cart = ShoppingCart(promotion_engine=self.engine)
+    
+    def test_rules_for(self):
+        """Verifica che l'indice trovi le promozioni per ID e per categoria, senza ripetizioni."""
+        self.assertEqual(self.engine.rules_for(self.laptop), [0, 1])
+        self.assertEqual(self.engine.rules_for(self.mouse), [1])
+        self.assertEqual(self.engine.rules_for(Product("p9", "Altro", 1.0)), [])
+    
+    def test_cart_total_with_promotions(self):
+        """Verifica che il totale del carrello includa gli sconti di tutte le promozioni applicabili."""
+        self.cart.add_product(self.laptop, 1)  # 100000 - 5000 - 10000
+        self.cart.add_product(self.mouse, 1)   # 2000 - 200
+        self.cart.add_product(self.pen, 3)     # 450 - 150
+        
+        self.assertEqual(self.cart.get_total_cents(), 100000 + 2000 + 450 - 5000 - 10200 - 150)
+        
+        # Verifichiamo che lo sconto del carrello si applichi dopo le promozioni
+        self.cart.apply_discount(10)
+        self.assertEqual(self.cart.get_total_cents(), 78390)
+    
+    def test_incremental_updates(self):
+        """Verifica che una modifica ricalcoli solo le promozioni del prodotto modificato."""
+        self.cart.add_product(self.laptop, 1)
+        self.cart.add_product(self.pen, 2)
+        
+        with patch.object(BuyXGetYPromotion, "discount_cents", return_value=0) as pen_rule, \
+                patch.object(PercentagePromotion, "discount_cents", return_value=0) as percent_rules:
+            self.cart.add_product(self.mouse, 1)
+        
+        pen_rule.assert_not_called()
+        percent_rules.assert_called_once()  # Solo "Informatica -10%"
+    
+    def test_remove_and_clear(self):
+        """Verifica che rimuovere prodotti o svuotare il carrello aggiorni gli sconti."""
+        self.cart.add_product(self.pen, 3)
+        self.assertEqual(self.cart.get_total_cents(), 300)
+        
+        self.cart.remove_product("p3", 1)
+        self.assertEqual(self.cart.get_total_cents(), 300)
+        self.assertEqual(self.cart.explain_promotions(), [])
+        
+        self.cart.add_product(self.laptop, 1)
+        self.cart.clear()
+        self.assertEqual(self.cart.get_total_cents(), 0)
+        self.assertEqual(self.cart.explain_promotions(), [])
+    
+    def test_explain(self):
+        """Verifica che explain descriva le promozioni applicate e i prodotti interessati."""
+        self.cart.add_product(self.laptop, 1)
+        self.cart.add_product(self.mouse, 2)
+        
+        self.assertEqual(self.cart.explain_promotions(), [
+            {"promotion": "Laptop -5%", "discount_cents": 5000, "product_ids": ["p1"]},
+            {"promotion": "Informatica -10%", "discount_cents": 10400, "product_ids": ["p1", "p2"]},
+        ])
+    
+    def test_overlapping_rules_capped_per_line(self):
+        """Verifica che promozioni sovrapposte non scontino una riga più del suo subtotale."""
+        shoes = Product("a", "Scarpe", 100.0, 10, category="moda")
+        book = Product("b", "Libro", 100.0, 10)
+        engine = PromotionEngine([
+            PercentagePromotion("Scarpe -50%", 50, product_ids=["a"]),
+            PercentagePromotion("Moda -60%", 60, category="moda"),
+        ])
+        cart = ShoppingCart(promotion_engine=engine)
+        cart.add_product(shoes, 1)
+        cart.add_product(book, 1)
+        
+        # Il 110% di sconto sulle scarpe si ferma al loro prezzo: il libro resta a prezzo pieno
+        self.assertEqual(cart.get_total_cents(), 10000)
+        
+        # Verifichiamo che il limite segua le modifiche del carrello
+        cart.add_product(shoes, 1)
+        self.assertEqual(cart.get_total_cents(), 10000)
+        cart.remove_product("a", 2)
+        self.assertEqual(cart.get_total_cents(), 10000)
+        self.assertEqual(cart.promotions.discount_cents, 0)
+    
+    def test_capped_discount_matches_full_recalculation(self):
+        """Verifica che lo sconto incrementale coincida con quello ricalcolato da zero dopo molte modifiche."""
+        products = [Product(f"q{i}", f"Articolo {i}", 1.0 + i * 0.73, 1000, category="c" if i % 2 else "d")
+                    for i in range(12)]
+        engine = PromotionEngine([
+            PercentagePromotion("Pari -70%", 70, product_ids=[f"q{i}" for i in range(0, 12, 2)]),
+            TieredPromotion("Categoria c", [(3, 40), (6, 60)], category="c"),
+            TieredPromotion("Categoria d", [(2, 45)], category="d"),
+            BuyXGetYPromotion("2x1", 1, 1, product_ids=["q0", "q1", "q2", "q3"]),
+        ])
+        cart = ShoppingCart(promotion_engine=engine)
+        for step in range(60):
+            product = products[step * 5 % 12]
+            if step % 4 == 3 and product.product_id in cart.items:
+                cart.remove_product(product.product_id, 1)
+            else:
+                cart.add_product(product, step % 3 + 1)
+            
+            # Ricalcolo da zero: somma degli sconti di ogni prodotto, limitata al subtotale della riga
+            lines = list(cart.items.values())
+            per_product = {}
+            for promotion in engine.promotions:
+                group = [(p, q) for p, q in lines if promotion.applies_to(p)]
+                for product_id, discount in promotion.line_discounts(group).items():
+                    per_product[product_id] = per_product.get(product_id, 0) + discount
+            expected = sum(min(per_product.get(p.product_id, 0), p.price_cents * q) for p, q in lines)
+            self.assertEqual(cart.promotions.discount_cents, expected)
+    
+    def test_cart_without_engine(self):
+        """Verifica che un carrello senza motore non abbia promozioni."""
+        cart = ShoppingCart()
+        cart.add_product(self.laptop, 1)
+        
+        self.assertEqual(cart.explain_promotions(), [])
+        self.assertEqual(cart.get_total_cents(), 100000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Test unitari per la classe RateLimiter
+"""
+import threading
+import time
+import unittest
+from main import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test per la classe RateLimiter."""
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+        with self.assertRaises(ValueError):
+            RateLimiter(10, burst=0)
+    
+    def test_burst_does_not_wait(self):
+        """Verifica che le chiamate entro il burst non attendano."""
+        limiter = RateLimiter(1, burst=5)
+        
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        
+        self.assertLess(time.monotonic() - start, 0.1)
+    
+    def test_rate_is_respected_across_threads(self):
+        """Verifica che più thread insieme non superino la quota."""
+        limiter = RateLimiter(100, burst=1)
+        
+        def call_many():
+            for _ in range(5):
+                limiter.acquire()
+        
+        start = time.monotonic()
+        threads = [threading.Thread(target=call_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # 20 chiamate a 100 al secondo, la prima senza attesa: almeno 0.19 secondi
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+Test unitari per la classe ResilientPaymentProcessor
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from main import OrderService, PaymentProcessor, PaymentTimeoutError, Product, ResilientPaymentProcessor, ShoppingCart
+
+
+class TestResilientPaymentProcessor(unittest.TestCase):
+    """Test per la classe ResilientPaymentProcessor."""
+    
+    def setUp(self):
+        """Inizializza un mock del processore e dei dettagli di pagamento validi."""
+        self.mock_processor = MagicMock(spec=PaymentProcessor)
+        self.success = {"success": True, "transaction_id": "txn_123456", "amount": 100.0, "timestamp": 1234567890}
+        self.valid_payment_details = {
+            "card_number": "4111111111111111",
+            "expiry": "12/25",
+            "cvv": "123"
+        }
+    
+    def test_init_invalid(self):
+        """Verifica che parametri non validi sollevino un'eccezione."""
+        with self.assertRaises(ValueError):
+            ResilientPaymentProcessor(self.mock_processor, timeout=0)
+        with self.assertRaises(ValueError):
+            ResilientPaymentProcessor(self.mock_processor, max_retries=-1)
+        with self.assertRaises(ValueError):
+            ResilientPaymentProcessor(self.mock_processor, max_concurrency=0)
+    
+    def test_retry_until_success(self):
+        """Verifica che i fallimenti temporanei vengano ripetuti."""
+        self.mock_processor.process_payment.side_effect = [
+            RuntimeError("Pagamento fallito: la transazione è stata rifiutata"),
+            RuntimeError("Pagamento fallito: la transazione è stata rifiutata"),
+            self.success
+        ]
+        processor = ResilientPaymentProcessor(self.mock_processor, base_delay=0)
+        
+        result = processor.process_payment(100.0, self.valid_payment_details)
+        
+        self.assertEqual(result, self.success)
+        self.assertEqual(self.mock_processor.process_payment.call_count, 3)
+        metrics = processor.get_metrics()
+        self.assertEqual(metrics["retries"], 2)
+        self.assertEqual(metrics["failures"], 2)
+        self.assertEqual(metrics["successes"], 1)
+        self.assertEqual(metrics["breaker_state"], "closed")
+    
+    def test_retries_exhausted(self):
+        """Verifica che dopo l'ultimo tentativo l'errore venga propagato."""
+        self.mock_processor.refund_payment.side_effect = RuntimeError("Rimborso fallito")
+        processor = ResilientPaymentProcessor(self.mock_processor, max_retries=2, base_delay=0)
+        
+        with self.assertRaises(RuntimeError):
+            processor.refund_payment("txn_123456")
+        self.assertEqual(self.mock_processor.refund_payment.call_count, 3)
+    
+    def test_value_error_not_retried(self):
+        """Verifica che gli errori di validazione non vengano ripetuti né aprano il circuito."""
+        self.mock_processor.process_payment.side_effect = ValueError("Campo obbligatorio mancante: cvv")
+        processor = ResilientPaymentProcessor(self.mock_processor, failure_threshold=1, base_delay=0)
+        
+        with self.assertRaises(ValueError):
+            processor.process_payment(100.0, {})
+        self.mock_processor.process_payment.assert_called_once()
+        self.assertEqual(processor.get_metrics()["breaker_state"], "closed")
+    
+    def test_circuit_breaker_opens_and_recovers(self):
+        """Verifica che il circuito si apra dopo troppi fallimenti e si richiuda dopo il tempo di reset."""
+        self.mock_processor.process_payment.side_effect = RuntimeError("Gateway degradato")
+        processor = ResilientPaymentProcessor(self.mock_processor, max_retries=0, failure_threshold=2,
+                                              reset_timeout=0.05)
+        
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                processor.process_payment(100.0, self.valid_payment_details)
+        self.assertEqual(processor.get_metrics()["breaker_state"], "open")
+        
+        # A circuito aperto le chiamate vengono rifiutate senza contattare il gateway
+        with self.assertRaises(RuntimeError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        self.assertEqual(self.mock_processor.process_payment.call_count, 2)
+        self.assertEqual(processor.get_metrics()["rejected"], 1)
+        
+        # Dopo il tempo di reset una chiamata di prova riuscita richiude il circuito
+        time.sleep(0.06)
+        self.mock_processor.process_payment.side_effect = None
+        self.mock_processor.process_payment.return_value = self.success
+        self.assertEqual(processor.process_payment(100.0, self.valid_payment_details), self.success)
+        self.assertEqual(processor.get_metrics()["breaker_state"], "closed")
+    
+    def test_timeout(self):
+        """Verifica che una chiamata troppo lenta fallisca per timeout senza essere ripetuta."""
+        self.mock_processor.process_payment.side_effect = lambda amount, details: time.sleep(0.2)
+        processor = ResilientPaymentProcessor(self.mock_processor, timeout=0.02, base_delay=0)
+        
+        with self.assertRaises(RuntimeError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        
+        metrics = processor.get_metrics()
+        self.assertEqual(metrics["timeouts"], 1)
+        self.assertEqual(metrics["retries"], 0)
+        self.assertGreaterEqual(metrics["max_latency"], 0.02)
+    
+    def test_concurrency_limit_sheds_load(self):
+        """Verifica che oltre il limite di concorrenza le chiamate vengano rifiutate subito."""
+        release = threading.Event()
+        
+        def blocked_payment(amount, details):
+            release.wait()
+            return self.success
+        
+        self.mock_processor.process_payment.side_effect = blocked_payment
+        processor = ResilientPaymentProcessor(self.mock_processor, max_concurrency=1)
+        
+        worker = threading.Thread(target=processor.process_payment, args=(100.0, self.valid_payment_details))
+        worker.start()
+        while self.mock_processor.process_payment.call_count == 0:
+            time.sleep(0.001)
+        
+        # Il gateway è occupato: la seconda chiamata viene rifiutata
+        with self.assertRaises(RuntimeError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        
+        release.set()
+        worker.join()
+        self.assertEqual(processor.get_metrics()["rejected"], 1)
+    
+    def test_timed_out_call_keeps_slot_until_gateway_returns(self):
+        """Verifica che dopo un timeout nessuna chiamata arrivi al gateway dopo essere stata data per fallita."""
+        calls = []
+        
+        def slow_payment(amount, details):
+            calls.append(time.monotonic())
+            time.sleep(0.3)
+            return self.success
+        
+        self.mock_processor.process_payment.side_effect = slow_payment
+        processor = ResilientPaymentProcessor(self.mock_processor, timeout=0.1, max_concurrency=1)
+        
+        # La prima chiamata va in timeout ma il gateway la sta ancora elaborando
+        with self.assertRaises(RuntimeError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        
+        # La seconda viene rifiutata subito invece di restare in coda dietro la prima
+        failed_at = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        
+        # Il gateway non riceve mai la seconda chiamata, nemmeno dopo la fine della prima
+        time.sleep(0.4)
+        self.assertEqual(len(calls), 1)
+        self.assertLess(calls[0], failed_at)
+        self.assertEqual(processor.get_metrics()["rejected"], 1)
+        
+        # Terminata la chiamata lenta, lo slot torna libero
+        self.mock_processor.process_payment.side_effect = None
+        self.mock_processor.process_payment.return_value = self.success
+        self.assertEqual(processor.process_payment(100.0, self.valid_payment_details), self.success)
+    
+    
+    def test_late_payment_is_refunded(self):
+        """Verifica che un pagamento addebitato dopo il timeout venga rimborsato e l'ordine non venga creato."""
+        def slow_payment(amount, details):
+            time.sleep(0.1)
+            return self.success
+        
+        self.mock_processor.process_payment.side_effect = slow_payment
+        self.mock_processor.refund_payment.return_value = {"success": True, "refund_id": "ref_1"}
+        service = OrderService(ResilientPaymentProcessor(self.mock_processor, timeout=0.05))
+        product = Product("p1", "Mouse", 10.0, 5)
+        cart = ShoppingCart()
+        cart.add_product(product, 1)
+        user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+        
+        with self.assertRaises(PaymentTimeoutError):
+            service.place_order(cart, user_details, self.valid_payment_details)
+        self.assertEqual(service.orders, [])
+        self.assertEqual(product.stock, 5)
+        
+        # Verifichiamo che l'addebito arrivato in ritardo venga rimborsato
+        deadline = time.monotonic() + 1
+        while not self.mock_processor.refund_payment.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.mock_processor.refund_payment.assert_called_once_with("txn_123456")
+        self.assertEqual(service.payment_processor.get_metrics()["late_payments"], 1)
+    
+    def test_late_payment_hook(self):
+        """Verifica che on_late_payment riceva l'addebito tardivo al posto del rimborso automatico."""
+        late = []
+        done = threading.Event()
+        
+        def reconcile(result):
+            late.append(result)
+            done.set()
+        
+        self.mock_processor.process_payment.side_effect = lambda amount, details: time.sleep(0.1) or self.success
+        processor = ResilientPaymentProcessor(self.mock_processor, timeout=0.05, on_late_payment=reconcile)
+        
+        with self.assertRaises(PaymentTimeoutError):
+            processor.process_payment(100.0, self.valid_payment_details)
+        self.assertTrue(done.wait(1))
+        self.assertEqual(late, [self.success])
+        self.mock_processor.refund_payment.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
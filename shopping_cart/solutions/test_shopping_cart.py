@@ -2,7 +2,7 @@
 Test unitari per la classe ShoppingCart
 """
 import unittest
-from main import ShoppingCart, Product
+from main import ShoppingCart, Product, PriceEngine, PromotionEngine, PercentagePromotion
 
 
 class TestShoppingCart(unittest.TestCase):
@@ -277,6 +277,71 @@ class TestShoppingCart(unittest.TestCase):
         # Il checkout dovrebbe fallire perché lo stock è cambiato
         with self.assertRaises(ValueError):
             self.cart.checkout()
+    
+    def test_totals_after_many_changes(self):
+        """Verifica che i totali incrementali coincidano con quelli ricalcolati dopo molte modifiche."""
+        products = [Product(f"b{i}", f"Articolo {i}", 0.1 + i * 0.37, 1000) for i in range(50)]
+        for _ in range(3):
+            for product in products:
+                self.cart.add_product(product, 3)
+        for product in products[::2]:
+            self.cart.remove_product(product.product_id, 2)
+        self.cart.apply_discount(12.5)
+        
+        # Verifichiamo che il totale sia quello calcolato riga per riga
+        expected = sum(product.price * quantity for product, quantity in self.cart.items.values())
+        self.assertEqual(self.cart.get_total(), round(expected * (1 - 12.5 / 100), 2))
+        self.assertEqual(self.cart.get_item_count(), sum(quantity for _, quantity in self.cart.items.values()))
+        
+        # Verifichiamo che svuotando il carrello riga per riga i totali tornino esattamente a zero
+        for product_id, (_, quantity) in list(self.cart.items.items()):
+            self.cart.remove_product(product_id, quantity)
+        self.assertEqual(self.cart.get_total(), 0)
+        self.assertEqual(self.cart.get_item_count(), 0)
+    
+    def test_get_total_cents(self):
+        """Verifica che il totale in centesimi sia esatto, anche dove il calcolo in float sbaglia di un centesimo."""
+        pencil = Product("p4", "Matita", 0.15, 10)
+        self.cart.add_product(pencil, 1)
+        self.cart.apply_discount(50)
+        
+        # 0.15 * 0.5 in float vale 0.07499..., ma la metà di 15 centesimi si arrotonda a 8
+        self.assertEqual(self.cart.get_total_cents(), 8)
+        self.assertEqual(self.cart.get_total(), 0.08)
+        
+        # Verifichiamo che molte righe con prezzi non rappresentabili in binario non accumulino errori
+        self.cart.clear()
+        for i in range(1000):
+            self.cart.add_product(Product(f"c{i}", "Caramella", 0.1, 1), 1)
+        self.assertEqual(self.cart.get_total_cents(), 10000)
+    
+    def test_price_change_in_open_cart(self):
+        """Verifica che subtotale, promozioni e totale usino tutti i prezzi attuali dopo un cambio di prezzo."""
+        book = Product("p5", "Libro", 10.0, 10)
+        self.cart.add_product(book, 2)
+        
+        # Il prezzo scende del 20% mentre il libro è nel carrello
+        PriceEngine(use_numpy=False).reprice([book], 20)
+        self.assertEqual(book.price_cents, 800)
+        self.assertEqual(self.cart.get_total_cents(), 1600)
+        
+        # Verifichiamo che ogni unità rimossa valga il prezzo attuale e che la riga si svuoti esattamente
+        self.cart.remove_product("p5", 1)
+        self.assertEqual(self.cart.get_total_cents(), 800)
+        book.price = 10.01
+        self.cart.add_product(book, 2)
+        self.assertEqual(self.cart.get_total_cents(), 3 * 1001)
+        self.cart.remove_product("p5", 3)
+        self.assertEqual(self.cart.get_total_cents(), 0)
+        
+        # Una promozione del 50% resta del 50% anche dopo il cambio di prezzo
+        cart = ShoppingCart(PromotionEngine([PercentagePromotion("Metà prezzo", 50, product_ids=["p5"])]))
+        cart.add_product(book, 1)
+        book.price = 1.0
+        cart.add_product(book, 1)
+        self.assertEqual(cart.get_total_cents(), 100)
+        self.assertEqual(PriceEngine(use_numpy=False).cart_total_cents(cart), 100)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,227 @@
+"""
+Test unitari e di stress per la classe SQLiteStore
+"""
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import MagicMock
+from main import (SQLiteStore, StockReservationManager, OrderService, PaymentProcessor, ShoppingCart,
+                  Product)
+
+
+def buy_from_process(path, attempts):
+    """Tenta più acquisti di un'unità da un processo separato e restituisce quanti riescono."""
+    store = SQLiteStore(path, pool_size=1)
+    product = Product("P001", "Test Product", 10.0, 0)
+    store.register_product(product)
+    reservations = StockReservationManager(inventory=store)
+    
+    bought = 0
+    for _ in range(attempts):
+        try:
+            reservations.commit(reservations.hold([(product, 1)]))
+            bought += 1
+        except ValueError:
+            pass
+    store.close()
+    return bought
+
+
+class TestSQLiteStore(unittest.TestCase):
+    """Test per la classe SQLiteStore."""
+    
+    def setUp(self):
+        """Crea un archivio in una cartella temporanea e vi registra due prodotti."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "shop.db")
+        self.store = SQLiteStore(self.path)
+        self.addCleanup(self.store.close)
+        
+        self.product1 = Product("P001", "Test Product 1", 10.0, 5)
+        self.product2 = Product("P002", "Test Product 2", 20.0, 1)
+        self.store.register_product(self.product1)
+        self.store.register_product(self.product2)
+    
+    def test_init_invalid(self):
+        """Verifica che un pool vuoto sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            SQLiteStore(self.path, pool_size=0)
+    
+    def test_register_existing_product(self):
+        """Verifica che un prodotto già registrato adotti lo stock condiviso."""
+        other = Product("P001", "Test Product 1", 10.0, 100)
+        
+        self.assertEqual(self.store.register_product(other), 5)
+        self.assertEqual(other.stock, 5)
+        self.assertIsNone(self.store.get_stock("P999"))
+    
+    def test_price_stored_in_cents(self):
+        """Verifica che il prezzo venga salvato in centesimi interi."""
+        with self.store._connection() as connection:
+            row = connection.execute("SELECT price_cents FROM products WHERE product_id = 'P002'").fetchone()
+        self.assertEqual(row[0], 2000)
+        self.assertIsInstance(row[0], int)
+    
+    def test_reserve_all_or_nothing(self):
+        """Verifica che la prenotazione di più prodotti sia "tutto o niente"."""
+        self.assertFalse(self.store.reserve([(self.product1, 2), (self.product2, 2)]))
+        self.assertEqual(self.store.get_stock("P001"), 5)
+        self.assertEqual(self.store.get_stock("P002"), 1)
+        
+        self.assertTrue(self.store.reserve([(self.product1, 2), (self.product2, 1)]))
+        self.assertEqual(self.store.get_stock("P001"), 3)
+        # Verifichiamo che lo stock locale venga allineato a quello condiviso
+        self.assertEqual(self.product1.stock, 3)
+        self.assertEqual(self.product2.stock, 0)
+    
+    def test_restock(self):
+        """Verifica che il rifornimento incrementi lo stock condiviso."""
+        self.store.restock([(self.product2, 4)])
+        
+        self.assertEqual(self.store.get_stock("P002"), 5)
+        self.assertEqual(self.product2.stock, 5)
+    
+    def test_orders(self):
+        """Verifica il salvataggio, l'aggiornamento e la ricerca degli ordini."""
+        self.store.append({"order_id": "order_1", "user_details": {"email": "a@b.it"}, "status": "completed"})
+        self.store.append({"order_id": "order_2", "user_details": {"email": "c@d.it"}, "status": "completed"})
+        self.store.append({"order_id": "order_1", "user_details": {"email": "a@b.it"}, "status": "cancelled"})
+        
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.read("order_1")["status"], "cancelled")
+        self.assertIsNone(self.store.read("order_3"))
+        self.assertEqual([order["order_id"] for order in self.store.find_orders(email="a@b.it")], ["order_1"])
+        self.assertEqual([order["order_id"] for order in self.store.find_orders(status="completed")], ["order_2"])
+        self.assertEqual([order["order_id"] for order in self.store.iter_orders()], ["order_1", "order_2"])
+    
+    def test_next_order_number_concurrent(self):
+        """Verifica che thread concorrenti ricevano numeri d'ordine distinti."""
+        numbers = []
+        lock = threading.Lock()
+        
+        def allocate():
+            for _ in range(20):
+                number = self.store.next_order_number()
+                with lock:
+                    numbers.append(number)
+        
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sorted(numbers), list(range(1, 161)))
+    
+    def test_no_overselling_across_processes(self):
+        """Test di stress: processi diversi sullo stesso inventario non vendono più dello stock."""
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            bought = sum(executor.map(buy_from_process, [self.path] * 4, [5] * 4))
+        
+        self.assertEqual(bought, 5)
+        self.assertEqual(self.store.get_stock("P001"), 0)
+
+
+class TestOrderServiceSQLiteStore(unittest.TestCase):
+    """Test per OrderService con ordini e inventario su un SQLiteStore."""
+    
+    def setUp(self):
+        """Inizializza un processore mock e il percorso di un archivio temporaneo."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "shop.db")
+        
+        self.mock_processor = MagicMock(spec=PaymentProcessor)
+        self.mock_processor.process_payment.return_value = {
+            "success": True, "transaction_id": "txn_123456", "amount": 10.0, "timestamp": 1234567890
+        }
+        self.user_details = {"name": "Mario Rossi", "email": "mario@example.com", "address": "Via Roma 1"}
+        self.payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+    
+    def open_service(self):
+        """Crea un servizio ordini (come farebbe un altro processo) su una nuova connessione all'archivio."""
+        store = SQLiteStore(self.path)
+        self.addCleanup(store.close)
+        product = Product("P001", "Test Product", 10.0, 3)
+        store.register_product(product)
+        return OrderService(self.mock_processor, StockReservationManager(inventory=store), store=store), product
+    
+    def place(self, service, product):
+        """Effettua un ordine di un prodotto."""
+        cart = ShoppingCart()
+        cart.add_product(product, 1)
+        return service.place_order(cart, self.user_details, self.payment_details)
+    
+    def test_init_invalid(self):
+        """Verifica che giornale e archivio non possano essere usati insieme."""
+        store = SQLiteStore(self.path)
+        self.addCleanup(store.close)
+        with self.assertRaises(ValueError):
+            OrderService(self.mock_processor, journal=MagicMock(), store=store)
+    
+    def test_shared_inventory_and_orders(self):
+        """Verifica che due servizi sullo stesso archivio condividano stock, numerazione e ordini."""
+        service1, product1 = self.open_service()
+        service2, product2 = self.open_service()
+        
+        self.assertEqual(self.place(service1, product1)["order_id"], "order_1")
+        self.assertEqual(self.place(service2, product2)["order_id"], "order_2")
+        self.assertEqual(self.place(service1, product1)["order_id"], "order_3")
+        
+        # Verifichiamo che lo stock esaurito da un servizio sia visto anche dall'altro
+        product2.stock = 1  # Stock locale non aggiornato: decide l'inventario condiviso
+        with self.assertRaises(ValueError):
+            self.place(service2, product2)
+        
+        # Verifichiamo che gli ordini di un servizio siano visibili dall'altro
+        self.assertEqual(service2.get_order("order_1")["order_id"], "order_1")
+        self.assertEqual(len(service2.get_orders_by_customer("mario@example.com")), 3)
+        self.assertEqual(len(service1.get_orders_by_status("completed")), 3)
+    
+    def test_cancel_claimed_in_store(self):
+        """Verifica che un ordine annullato da un servizio non venga rimborsato di nuovo da un altro."""
+        self.mock_processor.refund_payment.return_value = {
+            "success": True, "refund_id": "ref_123456", "transaction_id": "txn_123456", "timestamp": 1234567890
+        }
+        service1, product1 = self.open_service()
+        service2, product2 = self.open_service()
+        service1.register_products([product1])
+        
+        # service2 crea l'ordine e lo tiene in memoria come completato
+        order = self.place(service2, product2)
+        
+        # service1 lo annulla leggendolo dall'archivio
+        self.assertTrue(service1.cancel_order(order["order_id"]))
+        self.assertEqual(service1.store.read(order["order_id"])["status"], "cancelled")
+        
+        # Per service2 l'ordine è ancora completato, ma l'archivio rifiuta il secondo annullamento
+        self.assertEqual(order["status"], "completed")
+        with self.assertRaises(RuntimeError):
+            service2.cancel_order(order["order_id"])
+        self.mock_processor.refund_payment.assert_called_once_with("txn_123456")
+    
+    def test_failed_cancel_releases_claim(self):
+        """Verifica che un rimborso fallito lasci l'ordine annullabile anche dagli altri servizi."""
+        service1, product1 = self.open_service()
+        service2, product2 = self.open_service()
+        service2.register_products([product2])
+        order = self.place(service1, product1)
+        
+        self.mock_processor.refund_payment.side_effect = RuntimeError("Rimborso fallito")
+        with self.assertRaises(RuntimeError):
+            service1.cancel_order(order["order_id"])
+        self.assertEqual(service1.store.find_orders(status="completed")[0]["order_id"], order["order_id"])
+        
+        self.mock_processor.refund_payment.side_effect = None
+        self.mock_processor.refund_payment.return_value = {
+            "success": True, "refund_id": "ref_123456", "transaction_id": "txn_123456", "timestamp": 1234567890
+        }
+        self.assertTrue(service2.cancel_order(order["order_id"]))
+        self.assertEqual(service1.store.find_orders(status="cancelled")[0]["order_id"], order["order_id"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Test unitari per la classe StockReservationManager
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from main import StockReservationManager, OrderService, PaymentProcessor, ShoppingCart, Product
+
+
+class TestStockReservationManager(unittest.TestCase):
+    """Test per la classe StockReservationManager."""
+    
+    def setUp(self):
+        """Inizializza un gestore delle prenotazioni e alcuni prodotti prima di ogni test."""
+        self.reservations = StockReservationManager(ttl=60)
+        self.product1 = Product("p1", "Laptop", 999.99, 5)
+        self.product2 = Product("p2", "Mouse", 29.99, 20)
+    
+    def test_init_invalid_ttl(self):
+        """Verifica che una durata non positiva sollevi un'eccezione."""
+        with self.assertRaises(ValueError):
+            StockReservationManager(ttl=0)
+    
+    def test_hold_and_commit(self):
+        """Verifica che una prenotazione confermata lasci lo stock ridotto."""
+        reservation_id = self.reservations.hold([(self.product1, 2), (self.product2, 3)])
+        
+        # Lo stock è già riservato
+        self.assertEqual(self.product1.stock, 3)
+        self.assertEqual(self.product2.stock, 17)
+        
+        # Dopo la conferma la prenotazione non può più essere annullata
+        self.assertTrue(self.reservations.commit(reservation_id))
+        self.assertFalse(self.reservations.release(reservation_id))
+        self.assertEqual(self.product1.stock, 3)
+    
+    def test_hold_and_release(self):
+        """Verifica che annullare una prenotazione restituisca lo stock."""
+        reservation_id = self.reservations.hold([(self.product1, 2)])
+        
+        self.assertTrue(self.reservations.release(reservation_id))
+        self.assertEqual(self.product1.stock, 5)
+        self.assertFalse(self.reservations.commit(reservation_id))
+    
+    def test_hold_is_all_or_nothing(self):
+        """Verifica che se un prodotto non basta, nessuno stock venga riservato."""
+        with self.assertRaises(ValueError):
+            self.reservations.hold([(self.product2, 3), (self.product1, 6)])
+        
+        self.assertEqual(self.product1.stock, 5)
+        self.assertEqual(self.product2.stock, 20)
+    
+    def test_hold_merges_same_product(self):
+        """Verifica che le quantità dello stesso prodotto vengano sommate."""
+        with self.assertRaises(ValueError):
+            self.reservations.hold([(self.product1, 3), (self.product1, 3)])
+        
+        self.reservations.hold([(self.product1, 2), (self.product1, 3)])
+        self.assertEqual(self.product1.stock, 0)
+    
+    def test_expired_hold_is_released(self):
+        """Verifica che le prenotazioni scadute restituiscano lo stock."""
+        reservation_id = self.reservations.hold([(self.product1, 4)], ttl=0.01)
+        time.sleep(0.02)
+        
+        self.assertEqual(self.reservations.release_expired(), 1)
+        self.assertEqual(self.product1.stock, 5)
+        self.assertFalse(self.reservations.commit(reservation_id))
+
+
+class TestConcurrentCheckout(unittest.TestCase):
+    """Test di stress: molti thread comprano contemporaneamente lo stesso prodotto."""
+    
+    def test_no_oversell_under_concurrency(self):
+        """Verifica che con pagamenti lenti e molti acquirenti lo stock non vada mai in negativo."""
+        product = Product("p1", "Laptop", 999.99, 5)
+        
+        # Un pagamento lento che lascia molti ordini in sospeso contemporaneamente
+        payment_processor = MagicMock(spec=PaymentProcessor)
+        
+        def slow_payment(amount, payment_details):
+            time.sleep(0.01)
+            return {"success": True, "transaction_id": "txn_123456", "amount": amount, "timestamp": 1234567890}
+        
+        payment_processor.process_payment.side_effect = slow_payment
+        order_service = OrderService(payment_processor)
+        
+        user_details = {"name": "Mario Rossi", "email": "mario.rossi@example.com", "address": "Via Roma 123, Milano"}
+        payment_details = {"card_number": "4111111111111111", "expiry": "12/25", "cvv": "123"}
+        
+        results = []
+        start = threading.Barrier(20)
+        
+        def buyer():
+            cart = ShoppingCart()
+            cart.add_product(product, 1)
+            start.wait()  # Tutti gli acquirenti partono nello stesso momento
+            try:
+                order_service.place_order(cart, user_details, payment_details)
+                results.append("ok")
+            except ValueError:
+                results.append("esaurito")
+        
+        threads = [threading.Thread(target=buyer) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Esattamente 5 ordini vanno a buon fine e lo stock è esaurito, mai negativo
+        self.assertEqual(results.count("ok"), 5)
+        self.assertEqual(results.count("esaurito"), 15)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(len(order_service.orders), 5)
+        self.assertEqual(len({order["order_id"] for order in order_service.orders}), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()